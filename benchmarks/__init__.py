@@ -0,0 +1,3 @@
+"""
+Нагрузочные стенды бота
+"""
@@ -0,0 +1,575 @@
+"""
+Замеры методов Database на наполненной базе
+
+Каждый метод вызывается для выборки обычных пользователей и для
+мега-аккаунтов (пользователей с наибольшим числом смет), глобальные
+методы фоновых задач - без пользователя. Для каждого метода собираются
+распределение задержек и планы его запросов EXPLAIN (ANALYZE, BUFFERS).
+Сводка сравнивается с сохраненной базовой: рост задержки выше порога
+считается регрессией, изменение формы плана - предупреждением.
+
+Методы записи работают с копией сметы пользователя (clone_estimate),
+которая удаляется после замера, поэтому повторные прогоны идут на тех же
+данных. Планы запросов записи снимаются после вызова, в откатываемой
+транзакции.
+
+Запуск:
+    python -m benchmarks.seed --preset full
+    python -m benchmarks.methods --save-baseline benchmarks/baseline.json
+    python -m benchmarks.methods --baseline benchmarks/baseline.json
+"""
+import argparse
+import asyncio
+import json
+import logging
+import random
+import sys
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import asyncpg
+
+from bot.database.codecs import register_codecs
+from bot.database.database import Database
+from benchmarks.replay import percentile
+from benchmarks.seed import WORKS, get_benchmark_dsn
+
+logger = logging.getLogger("benchmarks.methods")
+
+# Сдвиг дат, после которого копия сметы попадает под архивацию и очистку
+# только она: данные наполнения не старше двух лет
+BACKDATE = "200 years"
+ARCHIVE_PROBE_MONTHS = 12 * 150
+PURGE_PROBE_WINDOW = 150 * 365 * 86400.0
+
+# Запросы, для которых снимается план
+EXPLAINABLE = ("SELECT", "WITH", "INSERT", "UPDATE", "DELETE")
+
+# Регрессия не засчитывается, если задержка выросла меньше чем на столько миллисекунд
+MIN_REGRESSION_MS = 0.5
+
+# Запросы метода, выполняемого сейчас
+captured_queries: ContextVar[Optional[List[Any]]] = ContextVar("captured_queries", default=None)
+
+
+def _capture_query(record: Any) -> None:
+    queries = captured_queries.get()
+    if queries is not None and record.exception is None:
+        queries.append(record)
+
+
+async def _init_connection(conn: asyncpg.Connection) -> None:
+    await register_codecs(conn)
+    conn.add_query_logger(_capture_query)
+
+
+class CapturingDatabase(Database):
+    """Database, запоминающая запросы для EXPLAIN"""
+
+    @staticmethod
+    async def _create_pool(dsn: str, min_size: int, max_size: int) -> asyncpg.Pool:
+        return await asyncpg.create_pool(
+            dsn,
+            min_size=min_size,
+            max_size=max_size,
+            command_timeout=None,
+            init=_init_connection
+        )
+
+
+@dataclass
+class Fixture:
+    """Пользователь и его записи, на которых вызываются методы"""
+    user_id: int
+    telegram_id: int
+    estimate_id: int
+    item_id: int
+    template_id: int
+    bundle_id: int
+
+
+@dataclass
+class Case:
+    """
+    Замер метода
+
+    setup готовит данные и возвращает контекст вызова, run - замеряемый
+    вызов, teardown получает контекст и результат run и убирает за собой.
+    """
+    name: str
+    run: Callable[[Database, Fixture, Any], Awaitable[Any]]
+    setup: Optional[Callable[[Database, Fixture], Awaitable[Any]]] = None
+    teardown: Optional[Callable[[Database, Fixture, Any, Any], Awaitable[None]]] = None
+    # Для методов фоновых задач замеры идут без выборки пользователей
+    is_global: bool = False
+    iterations: Optional[int] = None
+
+
+@dataclass
+class Scratch:
+    """Копия сметы пользователя для методов записи"""
+    estimate_id: int
+    item_ids: List[int] = field(default_factory=list)
+    extra_id: Optional[int] = None
+
+
+class SkipCase(Exception):
+    """Замер невозможен на этой базе"""
+
+
+# === ПОДГОТОВКА ДАННЫХ ===
+
+async def make_scratch(db: Database, fx: Fixture) -> Scratch:
+    estimate_id = await db.clone_estimate(fx.estimate_id, fx.user_id)
+    item_ids = await db.pool.fetchval("""
+        SELECT COALESCE(array_agg(id ORDER BY sort_order, id), '{}')
+        FROM estimate_items WHERE estimate_id = $1
+    """, estimate_id)
+    return Scratch(estimate_id, list(item_ids))
+
+
+async def drop_estimate(db: Database, estimate_id: Optional[int]) -> None:
+    if estimate_id:
+        await db.pool.execute("DELETE FROM estimates WHERE id = $1", estimate_id)
+
+
+async def drop_scratch(db: Database, fx: Fixture, scratch: Scratch, result: Any) -> None:
+    await drop_estimate(db, scratch.estimate_id)
+
+
+async def deleted_scratch(db: Database, fx: Fixture) -> Scratch:
+    scratch = await make_scratch(db, fx)
+    await db.delete_estimate(scratch.estimate_id, fx.user_id)
+    return scratch
+
+
+async def backdated_scratch(db: Database, fx: Fixture) -> Scratch:
+    scratch = await make_scratch(db, fx)
+    try:
+        async with db.pool.acquire() as conn:
+            async with conn.transaction():
+                # Иначе триггер вернет updated_at к текущему времени
+                await conn.execute("SET LOCAL session_replication_role = replica")
+                await conn.execute(
+                    f"UPDATE estimates SET updated_at = updated_at - interval '{BACKDATE}' WHERE id = $1",
+                    scratch.estimate_id
+                )
+    except asyncpg.InsufficientPrivilegeError:
+        await drop_estimate(db, scratch.estimate_id)
+        raise SkipCase("сдвиг updated_at требует прав суперпользователя")
+    return scratch
+
+
+async def archived_scratch(db: Database, fx: Fixture) -> Scratch:
+    scratch = await backdated_scratch(db, fx)
+    await db.archive_inactive_estimates(ARCHIVE_PROBE_MONTHS)
+    return scratch
+
+
+async def purgeable_scratch(db: Database, fx: Fixture) -> Scratch:
+    scratch = await deleted_scratch(db, fx)
+    await db.pool.execute(
+        f"UPDATE estimates SET deleted_at = deleted_at - interval '{BACKDATE}' WHERE id = $1",
+        scratch.estimate_id
+    )
+    return scratch
+
+
+async def snapshotted_scratch(db: Database, fx: Fixture) -> Scratch:
+    scratch = await make_scratch(db, fx)
+    await db.snapshot_estimate(scratch.estimate_id, fx.user_id)
+    if scratch.item_ids:
+        await db.update_estimate_item(scratch.item_ids[0], fx.user_id, cost=100000)
+    return scratch
+
+
+async def bundle_scratch(db: Database, fx: Fixture) -> Scratch:
+    scratch = await make_scratch(db, fx)
+    scratch.extra_id = await db.create_template_bundle(fx.user_id, "Набор для замера", [(fx.template_id, 100)])
+    return scratch
+
+
+async def drop_bundle_scratch(db: Database, fx: Fixture, scratch: Scratch, result: Any) -> None:
+    await db.delete_template_bundle(scratch.extra_id, fx.user_id)
+    await drop_estimate(db, scratch.estimate_id)
+
+
+async def new_template(db: Database, fx: Fixture) -> int:
+    return await db.create_work_template(fx.user_id, "Шаблон для замера", "", "Backend", 800, 1600000)
+
+
+async def new_bundle(db: Database, fx: Fixture) -> int:
+    return await db.create_template_bundle(fx.user_id, "Набор для замера", [(fx.template_id, 100)])
+
+
+async def buffered_usage(db: Database, fx: Fixture) -> None:
+    for _ in range(50):
+        await db.increment_template_usage(fx.template_id)
+
+
+def bulk_items(count: int) -> List[Dict]:
+    return [
+        {'name': WORKS[index % len(WORKS)], 'duration': 400, 'cost': 800000}
+        for index in range(count)
+    ]
+
+
+def import_records(count: int, category: Optional[str] = None) -> List[tuple]:
+    return [
+        (index, WORKS[index % len(WORKS)], "", 400, 800000, 100, "шт", category)
+        for index in range(1, count + 1)
+    ]
+
+
+async def drop_templates(db: Database, fx: Fixture, ctx: Any, templates: List[Any]) -> None:
+    await db.pool.execute("DELETE FROM work_templates WHERE id = ANY($1::int[])", [t.id for t in templates])
+
+
+# === ЗАМЕРЫ ===
+
+CASES: List[Case] = [
+    # Пользователи и настройки
+    Case("get_user_by_telegram_id", lambda db, fx, ctx: db.get_user_by_telegram_id(fx.telegram_id)),
+    Case("create_user", lambda db, fx, ctx: db.create_user(fx.telegram_id, first_name="Seed")),
+    Case("get_hourly_rate", lambda db, fx, ctx: db.get_hourly_rate(fx.user_id)),
+    Case("set_hourly_rate", lambda db, fx, ctx: db.set_hourly_rate(fx.user_id, 250000)),
+    Case("get_user_stats", lambda db, fx, ctx: db.get_user_stats(fx.user_id)),
+    # Сметы
+    Case("get_user_estimates", lambda db, fx, ctx: db.get_user_estimates(fx.user_id)),
+    Case("get_estimate_by_id", lambda db, fx, ctx: db.get_estimate_by_id(fx.estimate_id, fx.user_id)),
+    Case("create_estimate", lambda db, fx, ctx: db.create_estimate(fx.user_id, "Смета для замера"),
+         teardown=lambda db, fx, ctx, estimate_id: drop_estimate(db, estimate_id)),
+    Case("update_estimate_title",
+         lambda db, fx, scratch: db.update_estimate_title(scratch.estimate_id, fx.user_id, "Новое название"),
+         setup=make_scratch, teardown=drop_scratch),
+    Case("delete_estimate", lambda db, fx, scratch: db.delete_estimate(scratch.estimate_id, fx.user_id),
+         setup=make_scratch, teardown=drop_scratch),
+    Case("restore_estimate",
+         lambda db, fx, scratch: db.restore_estimate(scratch.estimate_id, fx.user_id, 3600),
+         setup=deleted_scratch, teardown=drop_scratch),
+    Case("clone_estimate", lambda db, fx, ctx: db.clone_estimate(fx.estimate_id, fx.user_id),
+         teardown=lambda db, fx, ctx, estimate_id: drop_estimate(db, estimate_id)),
+    Case("search_estimates", lambda db, fx, ctx: db.search_estimates(fx.user_id, "магазин")),
+    # Позиции
+    Case("get_estimate_items", lambda db, fx, ctx: db.get_estimate_items(fx.estimate_id)),
+    Case("get_estimate_item", lambda db, fx, ctx: db.get_estimate_item(fx.item_id, fx.user_id)),
+    Case("add_estimate_item",
+         lambda db, fx, scratch: db.add_estimate_item(scratch.estimate_id, "Позиция для замера", "", 400, 800000),
+         setup=make_scratch, teardown=drop_scratch),
+    Case("add_estimate_items",
+         lambda db, fx, scratch: db.add_estimate_items(scratch.estimate_id, bulk_items(20)),
+         setup=make_scratch, teardown=drop_scratch),
+    Case("import_estimate_items",
+         lambda db, fx, scratch: db.import_estimate_items(scratch.estimate_id, import_records(200)),
+         setup=make_scratch, teardown=drop_scratch),
+    Case("update_estimate_item",
+         lambda db, fx, scratch: db.update_estimate_item(scratch.item_ids[0], fx.user_id, cost=900000),
+         setup=make_scratch, teardown=drop_scratch),
+    Case("delete_estimate_item",
+         lambda db, fx, scratch: db.delete_estimate_item(scratch.item_ids[0], fx.user_id),
+         setup=make_scratch, teardown=drop_scratch),
+    Case("reorder_estimate_items",
+         lambda db, fx, scratch: db.reorder_estimate_items(
+             scratch.estimate_id, fx.user_id, scratch.item_ids[::-1]),
+         setup=make_scratch, teardown=drop_scratch),
+    Case("reprice_estimates",
+         lambda db, fx, scratch: db.reprice_estimates(fx.user_id, 250000, [scratch.estimate_id]),
+         setup=make_scratch, teardown=drop_scratch),
+    # Копии, версии и архив
+    Case("snapshot_estimate", lambda db, fx, scratch: db.snapshot_estimate(scratch.estimate_id, fx.user_id),
+         setup=make_scratch, teardown=drop_scratch),
+    Case("get_estimate_snapshots",
+         lambda db, fx, scratch: db.get_estimate_snapshots(scratch.estimate_id, fx.user_id),
+         setup=snapshotted_scratch, teardown=drop_scratch),
+    Case("diff_estimate_snapshots",
+         lambda db, fx, scratch: db.diff_estimate_snapshots(scratch.estimate_id, fx.user_id, 1),
+         setup=snapshotted_scratch, teardown=drop_scratch),
+    Case("archive_inactive_estimates", lambda db, fx, scratch: db.archive_inactive_estimates(ARCHIVE_PROBE_MONTHS),
+         setup=backdated_scratch, teardown=drop_scratch),
+    Case("unarchive_estimate", lambda db, fx, scratch: db.unarchive_estimate(scratch.estimate_id, fx.user_id),
+         setup=archived_scratch, teardown=drop_scratch),
+    Case("purge_deleted_estimates", lambda db, fx, scratch: db.purge_deleted_estimates(PURGE_PROBE_WINDOW),
+         setup=purgeable_scratch, teardown=drop_scratch),
+    # Шаблоны и наборы
+    Case("get_user_templates", lambda db, fx, ctx: db.get_user_templates(fx.user_id)),
+    Case("search_user_templates", lambda db, fx, ctx: db.search_user_templates(fx.user_id, "настр")),
+    Case("get_template_by_id", lambda db, fx, ctx: db.get_template_by_id(fx.template_id)),
+    Case("create_work_template", lambda db, fx, ctx: new_template(db, fx),
+         teardown=lambda db, fx, ctx, template_id: db.delete_template(template_id, fx.user_id)),
+    Case("import_templates", lambda db, fx, ctx: db.import_templates(fx.user_id, import_records(50, "Backend")),
+         teardown=drop_templates),
+    Case("delete_template", lambda db, fx, template_id: db.delete_template(template_id, fx.user_id),
+         setup=new_template),
+    Case("flush_template_usage", lambda db, fx, ctx: db.flush_template_usage(), setup=buffered_usage),
+    Case("get_user_bundles", lambda db, fx, ctx: db.get_user_bundles(fx.user_id)),
+    Case("get_bundle_items", lambda db, fx, ctx: db.get_bundle_items(fx.bundle_id, fx.user_id)),
+    Case("create_template_bundle", lambda db, fx, ctx: new_bundle(db, fx),
+         teardown=lambda db, fx, ctx, bundle_id: db.delete_template_bundle(bundle_id, fx.user_id)),
+    Case("delete_template_bundle", lambda db, fx, bundle_id: db.delete_template_bundle(bundle_id, fx.user_id),
+         setup=new_bundle),
+    Case("apply_template_bundle",
+         lambda db, fx, scratch: db.apply_template_bundle(scratch.extra_id, fx.user_id, scratch.estimate_id),
+         setup=bundle_scratch, teardown=drop_bundle_scratch),
+    # Фоновые задачи и загрузка индекса подсказок
+    Case("decay_template_popularity", lambda db, fx, ctx: db.decay_template_popularity(),
+         is_global=True, iterations=3),
+    Case("get_indexable_templates", lambda db, fx, ctx: db.get_indexable_templates(),
+         is_global=True, iterations=3),
+    Case("get_items_history", lambda db, fx, ctx: db.get_items_history(),
+         is_global=True, iterations=3),
+]
+
+
+# === ВЫБОРКА ПОЛЬЗОВАТЕЛЕЙ ===
+
+async def load_fixtures(db: Database, rng: random.Random, users: int, mega_accounts: int) -> Dict[str, List[Fixture]]:
+    """Обычные пользователи и мега-аккаунты с их записями"""
+    rows = await db.pool.fetch("""
+        SELECT s.user_id FROM user_stats s
+        WHERE s.estimates_count > 0
+          -- Методам шаблонов и наборов нужен хотя бы один шаблон пользователя
+          AND EXISTS (SELECT 1 FROM work_templates t WHERE t.user_id = s.user_id)
+        ORDER BY s.estimates_count DESC, s.user_id
+    """)
+    ranked = [row['user_id'] for row in rows]
+    mega = ranked[:mega_accounts]
+    regular = sorted(ranked[mega_accounts:])
+    regular = rng.sample(regular, min(users, len(regular)))
+
+    profiles = {'regular': [], 'mega': []}
+    for profile, user_ids, per_user in (('regular', regular, 1), ('mega', mega, max(1, users // max(1, len(mega))))):
+        for user_id in user_ids:
+            estimate_ids = [row['id'] for row in await db.pool.fetch("""
+                SELECT e.id FROM estimates e
+                WHERE e.user_id = $1 AND e.deleted_at IS NULL AND e.status <> 'archived'
+                  AND EXISTS (SELECT 1 FROM estimate_items i WHERE i.estimate_id = e.id)
+                ORDER BY e.id
+            """, user_id)]
+            if not estimate_ids:
+                continue
+            user = await db.pool.fetchrow("""
+                SELECT u.telegram_id,
+                       (SELECT t.id FROM work_templates t WHERE t.user_id = u.id ORDER BY t.id LIMIT 1)
+                           AS template_id,
+                       (SELECT b.id FROM template_bundles b WHERE b.user_id = u.id ORDER BY b.id LIMIT 1)
+                           AS bundle_id
+                FROM users u WHERE u.id = $1
+            """, user_id)
+            for estimate_id in rng.sample(estimate_ids, min(per_user, len(estimate_ids))):
+                item_id = await db.pool.fetchval("""
+                    SELECT id FROM estimate_items WHERE estimate_id = $1 ORDER BY sort_order, id LIMIT 1
+                """, estimate_id)
+                profiles[profile].append(Fixture(
+                    user_id=user_id,
+                    telegram_id=user['telegram_id'],
+                    estimate_id=estimate_id,
+                    item_id=item_id,
+                    template_id=user['template_id'],
+                    bundle_id=user['bundle_id'] or 0
+                ))
+    return profiles
+
+
+# === ПЛАНЫ ЗАПРОСОВ ===
+
+def plan_shape(node: Dict[str, Any]) -> List[str]:
+    """Узлы плана сверху вниз: тип, таблица и индекс"""
+    label = node['Node Type']
+    if 'Relation Name' in node:
+        label += f" on {node['Relation Name']}"
+    if 'Index Name' in node:
+        label += f" using {node['Index Name']}"
+    shape = [label]
+    for child in node.get('Plans', []):
+        shape.extend(plan_shape(child))
+    return shape
+
+
+async def explain(db: Database, queries: List[Any]) -> List[Dict[str, Any]]:
+    """EXPLAIN (ANALYZE, BUFFERS) запросов метода в откатываемой транзакции"""
+    plans = []
+    async with db.pool.acquire() as conn:
+        for record in queries:
+            query = record.query.strip()
+            if not query.upper().startswith(EXPLAINABLE):
+                continue
+            summary = {'query': " ".join(query.split())[:200]}
+            transaction = conn.transaction()
+            await transaction.start()
+            try:
+                result = await conn.fetchval(
+                    "EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + query, *record.args
+                )
+                plan = (json.loads(result) if isinstance(result, str) else result)[0]
+                summary.update({
+                    'shape': plan_shape(plan['Plan']),
+                    'execution_ms': plan.get('Execution Time'),
+                    'planning_ms': plan.get('Planning Time'),
+                    'shared_hit': plan['Plan'].get('Shared Hit Blocks'),
+                    'shared_read': plan['Plan'].get('Shared Read Blocks'),
+                    'plan': plan,
+                })
+            except asyncpg.PostgresError as e:
+                # Например, запрос к временной таблице, удаленной с концом транзакции
+                summary['error'] = str(e)
+            finally:
+                await transaction.rollback()
+            plans.append(summary)
+    return plans
+
+
+# === ПРОГОН ===
+
+async def measure(db: Database, case: Case, fixtures: List[Fixture], iterations: int,
+                  rng: random.Random) -> Dict[str, Any]:
+    """Задержки метода и планы его запросов"""
+    latencies = []
+    for _ in range(iterations):
+        fx = rng.choice(fixtures)
+        ctx = await case.setup(db, fx) if case.setup else None
+        started = time.perf_counter()
+        result = await case.run(db, fx, ctx)
+        latencies.append(time.perf_counter() - started)
+        if case.teardown:
+            await case.teardown(db, fx, ctx, result)
+
+    # Отдельный вызов для снятия запросов
+    fx = fixtures[0]
+    ctx = await case.setup(db, fx) if case.setup else None
+    queries: List[Any] = []
+    token = captured_queries.set(queries)
+    try:
+        result = await case.run(db, fx, ctx)
+    finally:
+        captured_queries.reset(token)
+    # Запросы пишутся в лог после выполнения через call_soon
+    await asyncio.sleep(0)
+    plans = await explain(db, queries)
+    if case.teardown:
+        await case.teardown(db, fx, ctx, result)
+
+    return {
+        'iterations': iterations,
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+        'max_ms': round(max(latencies) * 1000, 3),
+        'queries': len(queries),
+        'plans': plans,
+    }
+
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> Dict[str, List[str]]:
+    """Регрессии задержек и изменения планов относительно базовой сводки"""
+    regressions, plan_changes = [], []
+    for key, current in report['cases'].items():
+        previous = baseline.get('cases', {}).get(key)
+        if previous is None:
+            continue
+        for metric in ('p50_ms', 'p95_ms'):
+            before, after = previous[metric], current[metric]
+            if after > before * (1 + threshold) and after - before > MIN_REGRESSION_MS:
+                regressions.append(f"{key}: {metric} {before} -> {after} мс (+{(after / before - 1) * 100:.0f}%)"
+                                   if before else f"{key}: {metric} {before} -> {after} мс")
+        old_shapes = [plan.get('shape') for plan in previous.get('plans', [])]
+        new_shapes = [plan.get('shape') for plan in current.get('plans', [])]
+        if old_shapes != new_shapes:
+            plan_changes.append(key)
+    return {'regressions': regressions, 'plan_changes': plan_changes}
+
+
+def print_report(report: Dict[str, Any], comparison: Optional[Dict[str, List[str]]]) -> None:
+    print(f"{'Метод':<44} {'N':>5} {'p50':>9} {'p95':>9} {'p99':>9} {'max':>9} {'SQL':>4}")
+    for key, row in report['cases'].items():
+        print(f"{key[:44]:<44} {row['iterations']:>5} {row['p50_ms']:>9} {row['p95_ms']:>9} "
+              f"{row['p99_ms']:>9} {row['max_ms']:>9} {row['queries']:>4}")
+        for plan in row['plans']:
+            if 'error' in plan:
+                continue
+            if any(node.startswith("Seq Scan") for node in plan['shape']):
+                print(f"    ⚠️ Seq Scan: {plan['query'][:100]}")
+
+    if comparison is None:
+        return
+    print()
+    if comparison['plan_changes']:
+        print("Изменились планы: " + ", ".join(comparison['plan_changes']))
+    if comparison['regressions']:
+        print("Регрессии:")
+        for line in comparison['regressions']:
+            print(f"    {line}")
+    else:
+        print("Регрессий нет")
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    rng = random.Random(args.seed)
+    db = CapturingDatabase(get_benchmark_dsn(args.dsn), logger, pool_min_size=2, pool_max_size=4)
+    await db.init_db()
+    try:
+        fixtures = await load_fixtures(db, rng, args.users, args.mega_accounts)
+        fixtures['global'] = fixtures['regular'][:1]
+        if not fixtures['regular']:
+            raise SystemExit("В базе нет смет с позициями, сначала выполните python -m benchmarks.seed")
+
+        report: Dict[str, Any] = {'cases': {}}
+        for case in CASES:
+            if args.only and case.name not in args.only:
+                continue
+            profiles = ('global',) if case.is_global else ('regular', 'mega')
+            for profile in profiles:
+                if not fixtures[profile]:
+                    continue
+                key = f"{case.name}/{profile}"
+                started = time.perf_counter()
+                try:
+                    report['cases'][key] = await measure(
+                        db, case, fixtures[profile], case.iterations or args.iterations, rng
+                    )
+                except SkipCase as e:
+                    logger.warning(f"{key} пропущен: {e}")
+                    continue
+                logger.info(f"{key}: {time.perf_counter() - started:.1f} с")
+        return report
+    finally:
+        await db.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Замеры методов Database на наполненной базе")
+    parser.add_argument("--dsn", default="", help="База для замеров (по умолчанию BENCHMARK_DATABASE_URL)")
+    parser.add_argument("--iterations", type=int, default=30, help="Вызовов метода на профиль")
+    parser.add_argument("--users", type=int, default=200, help="Обычных пользователей в выборке")
+    parser.add_argument("--mega-accounts", type=int, default=5, help="Сколько крупнейших аккаунтов замерять отдельно")
+    parser.add_argument("--seed", type=int, default=0, help="Seed выборки пользователей")
+    parser.add_argument("--only", nargs="*", help="Замерить только эти методы")
+    parser.add_argument("--json", dest="json_path", help="Сохранить сводку с полными планами в JSON")
+    parser.add_argument("--baseline", help="Базовая сводка для сравнения")
+    parser.add_argument("--save-baseline", help="Сохранить сводку как базовую")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="Допустимый рост задержки относительно базовой (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    report = asyncio.run(run(args))
+
+    comparison = None
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as file:
+            comparison = compare(report, json.load(file), args.threshold)
+        report['comparison'] = comparison
+    print_report(report, comparison)
+
+    for path in (args.json_path, args.save_baseline):
+        if path:
+            with open(path, 'w', encoding='utf-8') as file:
+                json.dump(report, file, ensure_ascii=False, indent=2, default=str)
+
+    if comparison and comparison['regressions']:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
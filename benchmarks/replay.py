@@ -0,0 +1,294 @@
+"""
+Нагрузочное воспроизведение обновлений
+
+Обновления подаются в Dispatcher.feed_update с теми же middleware,
+роутерами и зависимостями, что и в боте. Bot API подменен сессией без
+сети (benchmarks/session.py), база - отдельная локальная PostgreSQL
+из BENCHMARK_DATABASE_URL или --dsn, DATABASE_URL бота не используется.
+Обновления одного пользователя идут по порядку, пользователи - параллельно.
+
+Запуск:
+    python -m benchmarks.replay --synthetic-users 200 --concurrency 50 --cleanup
+    python -m benchmarks.replay --updates updates.jsonl --json report.json
+"""
+import argparse
+import asyncio
+import json
+import logging
+import math
+import os
+import time
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, asdict
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Awaitable
+
+# Бот не ходит в Telegram и к ИИ, а воспроизведение не пишется в запись
+os.environ.setdefault("BOT_TOKEN", "42:replay-benchmark")
+os.environ.setdefault("AI_ENABLED", "false")
+os.environ["UPDATE_RECORD_PATH"] = ""
+
+import asyncpg
+from aiogram import BaseMiddleware, Bot, Dispatcher
+from aiogram.fsm.storage.memory import MemoryStorage
+from aiogram.types import TelegramObject, Update
+
+from bot.config import Config, setup_logging
+from bot.database.codecs import register_codecs
+from bot.database.database import Database
+from bot.main import setup_dispatcher
+from benchmarks.scenarios import build_synthetic_updates, load_recorded_updates, resolve_entities
+from benchmarks.seed import get_benchmark_dsn
+from benchmarks.session import ReplaySession
+
+logger = logging.getLogger("benchmarks.replay")
+
+
+@dataclass
+class UpdateStats:
+    """Замеры обработки одного обновления"""
+    handler: str = "(не обработано)"
+    elapsed: float = 0.0
+    queries: int = 0
+    pool_wait: float = 0.0
+    errors: int = 0
+
+
+# Замеры обновления, которое сейчас обрабатывается
+current_stats: ContextVar[Optional[UpdateStats]] = ContextVar("current_stats", default=None)
+
+
+def _count_query(record: Any) -> None:
+    stats = current_stats.get()
+    if stats is not None:
+        stats.queries += 1
+
+
+async def _init_connection(conn: asyncpg.Connection) -> None:
+    await register_codecs(conn)
+    conn.add_query_logger(_count_query)
+
+
+class InstrumentedDatabase(Database):
+    """Database, считающая запросы и ожидание соединения из пула"""
+
+    @staticmethod
+    async def _create_pool(dsn: str, min_size: int, max_size: int) -> asyncpg.Pool:
+        return await asyncpg.create_pool(
+            dsn,
+            min_size=min_size,
+            max_size=max_size,
+            command_timeout=60,
+            init=_init_connection
+        )
+
+    @asynccontextmanager
+    async def _acquire(self, read: bool = False) -> AsyncIterator[asyncpg.Connection]:
+        started = time.perf_counter()
+        async with super()._acquire(read) as conn:
+            stats = current_stats.get()
+            if stats is not None:
+                stats.pool_wait += time.perf_counter() - started
+            yield conn
+
+
+class HandlerProbe(BaseMiddleware):
+    """Запоминает, какой обработчик выбран для обновления"""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        stats = current_stats.get()
+        if stats is not None:
+            stats.handler = data['handler'].callback.__name__
+        return await handler(event, data)
+
+
+class ErrorCounter(logging.Handler):
+    """Ошибки, которые обработчики перехватили и записали в лог"""
+
+    def __init__(self):
+        super().__init__(level=logging.ERROR)
+
+    def emit(self, record: logging.LogRecord) -> None:
+        stats = current_stats.get()
+        if stats is not None:
+            stats.errors += 1
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Перцентиль по методу ближайшего ранга"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(q * len(ordered)) - 1)]
+
+
+async def replay_user(updates: List[Dict[str, Any]], dp: Dispatcher, bot: Bot, db: Database,
+                      samples: List[UpdateStats], limit: asyncio.Semaphore) -> None:
+    """Обновления одного пользователя по порядку"""
+    async with limit:
+        for raw in updates:
+            # ID сущностей подставляются до замера, запросы не попадают в статистику
+            await resolve_entities(raw, db.pool)
+            update = Update.model_validate(raw, context={"bot": bot})
+
+            stats = UpdateStats()
+            token = current_stats.set(stats)
+            started = time.perf_counter()
+            try:
+                await dp.feed_update(bot, update)
+            except Exception as e:
+                stats.errors += 1
+                logger.debug(f"Ошибка обновления {update.update_id}: {e}")
+            finally:
+                stats.elapsed = time.perf_counter() - started
+                current_stats.reset(token)
+            samples.append(stats)
+
+
+async def cleanup(db: Database, telegram_ids: List[int]) -> None:
+    """Удаление данных пользователей стенда"""
+    users = "SELECT id FROM users WHERE telegram_id = ANY($1::bigint[])"
+    async with db.pool.acquire() as conn:
+        async with conn.transaction():
+            for table in ("estimates", "work_templates", "template_bundles", "user_stats"):
+                await conn.execute(f"DELETE FROM {table} WHERE user_id IN ({users})", telegram_ids)
+            await conn.execute("DELETE FROM users WHERE telegram_id = ANY($1::bigint[])", telegram_ids)
+
+
+def build_report(samples: List[UpdateStats], wall: float, calls: Dict[str, int]) -> Dict[str, Any]:
+    """Сводка замеров: пропускная способность, задержки по обработчикам, запросы и пул"""
+    by_handler: Dict[str, List[UpdateStats]] = defaultdict(list)
+    for stats in samples:
+        by_handler[stats.handler].append(stats)
+
+    def latency(values: List[float]) -> Dict[str, float]:
+        return {
+            'p50_ms': round(percentile(values, 0.50) * 1000, 2),
+            'p95_ms': round(percentile(values, 0.95) * 1000, 2),
+            'p99_ms': round(percentile(values, 0.99) * 1000, 2),
+            'max_ms': round(max(values, default=0.0) * 1000, 2),
+        }
+
+    return {
+        'updates': len(samples),
+        'seconds': round(wall, 3),
+        'updates_per_second': round(len(samples) / wall, 1) if wall else 0.0,
+        'queries_per_update': round(sum(s.queries for s in samples) / len(samples), 2) if samples else 0.0,
+        'pool_wait': latency([s.pool_wait for s in samples]),
+        'errors': sum(s.errors for s in samples),
+        'handlers': {
+            name: {
+                'count': len(group),
+                **latency([s.elapsed for s in group]),
+                'queries': round(sum(s.queries for s in group) / len(group), 2),
+            }
+            for name, group in sorted(by_handler.items(), key=lambda pair: -len(pair[1]))
+        },
+        'bot_api_calls': dict(sorted(calls.items(), key=lambda pair: -pair[1])),
+    }
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    """Вывод сводки в консоль"""
+    print(f"Обновлений: {report['updates']} за {report['seconds']} с "
+          f"({report['updates_per_second']} обновлений/с)")
+    print(f"Запросов к базе на обновление: {report['queries_per_update']}")
+    wait = report['pool_wait']
+    print(f"Ожидание пула: p50 {wait['p50_ms']} мс, p95 {wait['p95_ms']} мс, "
+          f"p99 {wait['p99_ms']} мс, max {wait['max_ms']} мс")
+    print(f"Ошибок: {report['errors']}")
+    print()
+    print(f"{'Обработчик':<40} {'N':>6} {'p50':>9} {'p95':>9} {'p99':>9} {'max':>9} {'SQL':>6}")
+    for name, row in report['handlers'].items():
+        print(f"{name[:40]:<40} {row['count']:>6} {row['p50_ms']:>9} {row['p95_ms']:>9} "
+              f"{row['p99_ms']:>9} {row['max_ms']:>9} {row['queries']:>6}")
+    print()
+    print("Вызовы Bot API: " + ", ".join(f"{name} {count}" for name, count in report['bot_api_calls'].items()))
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    """Воспроизведение и сбор замеров"""
+    config = Config.from_env()
+    # Прогон создает пользователей, сметы и шаблоны - только в базе стенда
+    config.database_url = get_benchmark_dsn(args.dsn)
+    config.database_read_url = ""
+    if args.updates:
+        users = load_recorded_updates(args.updates)
+    else:
+        users = build_synthetic_updates(args.synthetic_users, args.seed)
+
+    bot = Bot(config.bot_token, session=ReplaySession())
+    dp = Dispatcher(storage=MemoryStorage())
+    db = InstrumentedDatabase(
+        config.database_url,
+        logger,
+        pool_min_size=config.db_pool_min_size,
+        pool_max_size=config.db_pool_max_size,
+        read_after_write_window=config.read_after_write_window
+    )
+    errors = ErrorCounter()
+    logging.getLogger().addHandler(errors)
+    try:
+        await db.init_db()
+        await setup_dispatcher(dp, config, db)
+        for observer in (dp.message, dp.callback_query, dp.inline_query):
+            observer.middleware(HandlerProbe())
+        await dp.emit_startup(bot=bot, **dp.workflow_data)
+
+        samples: List[UpdateStats] = []
+        limit = asyncio.Semaphore(args.concurrency)
+        started = time.perf_counter()
+        await asyncio.gather(*(
+            replay_user(updates, dp, bot, db, samples, limit) for updates in users.values()
+        ))
+        wall = time.perf_counter() - started
+
+        await dp.emit_shutdown(bot=bot, **dp.workflow_data)
+        if args.cleanup:
+            await cleanup(db, list(users))
+        return build_report(samples, wall, bot.session.calls)
+    finally:
+        logging.getLogger().removeHandler(errors)
+        await db.close()
+        await bot.session.close()
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Нагрузочное воспроизведение обновлений бота")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--updates", help="Файл записи UPDATE_RECORD_PATH (JSON Lines)")
+    source.add_argument("--synthetic-users", type=int, default=100,
+                        help="Число синтетических пользователей (по умолчанию 100)")
+    parser.add_argument("--seed", type=int, default=0, help="Seed синтетических сценариев")
+    parser.add_argument("--concurrency", type=int, default=50,
+                        help="Сколько пользователей обрабатывается одновременно")
+    parser.add_argument("--dsn", default="", help="База стенда (по умолчанию BENCHMARK_DATABASE_URL)")
+    parser.add_argument("--cleanup", action="store_true", help="Удалить данные пользователей стенда после прогона")
+    parser.add_argument("--json", dest="json_path", help="Сохранить сводку в JSON")
+    parser.add_argument("--log-level", default="CRITICAL", help="Уровень логов бота во время прогона")
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    setup_logging(args.log_level)
+    # Ошибки считаются, даже если уровень логов в консоли выше
+    root = logging.getLogger()
+    for handler in root.handlers:
+        handler.setLevel(root.level)
+    root.setLevel(min(root.level, logging.ERROR))
+    report = asyncio.run(run(args))
+    print_report(report)
+    if args.json_path:
+        with open(args.json_path, 'w', encoding='utf-8') as file:
+            json.dump(report, file, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
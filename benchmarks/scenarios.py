@@ -0,0 +1,292 @@
+"""
+Синтетические и записанные сценарии для воспроизведения обновлений
+"""
+import json
+import random
+import re
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from bot.services.dispatch import get_raw_update_user
+from benchmarks.session import BOT_USER
+
+# Telegram ID синтетических пользователей начинаются отсюда
+SYNTHETIC_USER_BASE = 10_000_000
+
+# Сценарий пользователя: шаги (тип обновления, текст или данные кнопки).
+# {rate}, {hours} и т.п. заполняются при генерации, {estimate}, {item},
+# {template}, {bundle} и {deleted} - при воспроизведении по данным базы
+SCENARIO: Tuple[Tuple[str, str], ...] = (
+    ('message', '/start'),
+    ('callback', 'main_menu'),
+    ('callback', 'settings'),
+    ('callback', 'set_hourly_rate'),
+    ('message', '{rate}'),
+    # Шаблоны
+    ('callback', 'work_templates'),
+    ('callback', 'create_template'),
+    ('message', '{template_name}'),
+    ('message', '⏭️ Пропустить'),
+    ('message', '{hours}'),
+    ('message', '{cost}'),
+    ('message', '{category}'),
+    ('callback', 'my_templates'),
+    ('callback', 'show_template:{template}'),
+    # Смета и позиции
+    ('callback', 'create_estimate'),
+    ('message', '{title}'),
+    ('message', '⏭️ Пропустить'),
+    ('callback', 'add_item:{estimate}'),
+    ('callback', 'add_manual:{estimate}'),
+    ('message', '{item_name}'),
+    ('message', '{hours}'),
+    ('message', '{cost}'),
+    ('callback', 'add_bulk:{estimate}'),
+    ('message', '{bulk}'),
+    ('callback', 'add_from_template:{estimate}'),
+    ('callback', 'use_template:{estimate}:{template}'),
+    ('callback', 'show_estimate:{estimate}'),
+    # Редактирование
+    ('callback', 'edit_estimate:{estimate}'),
+    ('callback', 'edit_item:{item}'),
+    ('callback', 'edit_item_field:{item}:duration'),
+    ('message', '{hours}'),
+    ('callback', 'move_item:{item}:down'),
+    ('callback', 'rename_estimate:{estimate}'),
+    ('message', '{title}'),
+    ('callback', 'reprice_estimate:{estimate}'),
+    ('callback', 'confirm_reprice_estimate:{estimate}'),
+    # Версии
+    ('callback', 'snapshot_estimate:{estimate}'),
+    ('callback', 'estimate_versions:{estimate}'),
+    # Наборы шаблонов
+    ('callback', 'template_bundles'),
+    ('callback', 'create_bundle'),
+    ('message', '{bundle_name}'),
+    ('callback', 'bundle_add:{template}'),
+    ('callback', 'bundle_save'),
+    ('callback', 'add_from_bundle:{estimate}'),
+    ('callback', 'apply_bundle:{estimate}:{bundle}'),
+    # Списки, поиск и статистика
+    ('callback', 'clone_estimate:{estimate}'),
+    ('callback', 'my_estimates'),
+    ('callback', 'active_estimates'),
+    ('callback', 'search_estimates'),
+    ('message', '{query}'),
+    ('message', '/search {query}'),
+    ('callback', 'user_stats'),
+    # Удаление и восстановление
+    ('callback', 'delete_item:{item}'),
+    ('callback', 'confirm_delete_item:{item}'),
+    ('callback', 'delete_estimate:{estimate}'),
+    ('callback', 'confirm_delete:estimate:{estimate}'),
+    ('callback', 'restore_estimate:{deleted}'),
+    ('message', '/help'),
+)
+
+CATEGORIES = ("Frontend", "Backend", "DevOps", "Design", "Analytics", "Testing", "Mobile", "Database")
+
+WORKS = (
+    "Верстка главной страницы", "Настройка окружения", "Авторизация OAuth", "Интеграция платежей",
+    "Каталог товаров", "Корзина магазина", "Админ-панель", "Push-уведомления", "Миграция базы",
+    "Нагрузочное тестирование", "Дизайн макетов", "CI/CD пайплайн", "Отчеты и аналитика"
+)
+
+PROJECTS = ("Интернет-магазин", "Мобильное приложение", "CRM для отдела продаж", "Лендинг", "Корпоративный портал")
+
+QUERIES = ("магазин", "окружение", "OAuth", "дизайн", "отчеты")
+
+# Сущности, ID которых подставляются при воспроизведении. Запросы
+# выбирают последние записи пользователя по его Telegram ID ($1)
+ENTITY_QUERIES: Dict[str, str] = {
+    'estimate': """
+        SELECT e.id FROM estimates e JOIN users u ON u.id = e.user_id
+        WHERE u.telegram_id = $1 AND e.deleted_at IS NULL
+        ORDER BY e.id DESC LIMIT 1
+    """,
+    'deleted': """
+        SELECT e.id FROM estimates e JOIN users u ON u.id = e.user_id
+        WHERE u.telegram_id = $1 AND e.deleted_at IS NOT NULL
+        ORDER BY e.deleted_at DESC LIMIT 1
+    """,
+    'item': """
+        SELECT i.id FROM estimate_items i
+        WHERE i.estimate_id = (
+            SELECT e.id FROM estimates e JOIN users u ON u.id = e.user_id
+            WHERE u.telegram_id = $1 AND e.deleted_at IS NULL
+            ORDER BY e.id DESC LIMIT 1
+        )
+        ORDER BY i.sort_order, i.id LIMIT 1
+    """,
+    'template': """
+        SELECT t.id FROM work_templates t JOIN users u ON u.id = t.user_id
+        WHERE u.telegram_id = $1 AND t.is_active
+        ORDER BY t.id DESC LIMIT 1
+    """,
+    'bundle': """
+        SELECT b.id FROM template_bundles b JOIN users u ON u.id = b.user_id
+        WHERE u.telegram_id = $1
+        ORDER BY b.id DESC LIMIT 1
+    """,
+}
+
+ENTITY_RE = re.compile(r"\{(" + "|".join(ENTITY_QUERIES) + r")\}")
+
+# Какие части данных кнопки - ID сущностей (по префиксу до первого ':')
+CALLBACK_ENTITIES: Dict[str, Tuple[Optional[str], ...]] = {
+    **{prefix: ('estimate',) for prefix in (
+        'show_estimate', 'add_item', 'add_manual', 'add_bulk', 'add_from_template', 'add_from_bundle',
+        'import_items', 'edit_estimate', 'rename_estimate', 'reprice_estimate', 'confirm_reprice_estimate',
+        'clone_estimate', 'estimate_versions', 'snapshot_estimate', 'delete_estimate', 'generate_report',
+        'text_report', 'pdf_report', 'ai_analyze'
+    )},
+    **{prefix: ('item',) for prefix in ('edit_item', 'delete_item', 'confirm_delete_item')},
+    **{prefix: ('item', None) for prefix in ('edit_item_field', 'move_item')},
+    **{prefix: ('template',) for prefix in (
+        'bundle_add', 'show_template', 'delete_template', 'confirm_delete_template'
+    )},
+    **{prefix: ('bundle',) for prefix in ('show_bundle', 'delete_bundle', 'confirm_delete_bundle')},
+    'restore_estimate': ('deleted',),
+    'use_template': ('estimate', 'template'),
+    'apply_bundle': ('estimate', 'bundle'),
+    'snapshot_diff': ('estimate', None),
+    'confirm_delete': (None, 'estimate'),
+}
+
+
+class _KeepEntities(dict):
+    """Подстановка значений генерации без трогания сущностей"""
+
+    def __missing__(self, key: str) -> str:
+        return "{" + key + "}"
+
+
+def _user(telegram_id: int) -> Dict[str, Any]:
+    return {'id': telegram_id, 'is_bot': False, 'first_name': "User", 'language_code': "ru"}
+
+
+def build_message(update_id: int, telegram_id: int, text: str) -> Dict[str, Any]:
+    """Сообщение пользователя в формате Bot API"""
+    message = {
+        'message_id': update_id,
+        'date': int(time.time()),
+        'chat': {'id': telegram_id, 'type': 'private', 'first_name': "User"},
+        'from': _user(telegram_id),
+        'text': text
+    }
+    if text.startswith("/"):
+        message['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(text.split()[0])}]
+    return {'update_id': update_id, 'message': message}
+
+
+def build_callback(update_id: int, telegram_id: int, data: str) -> Dict[str, Any]:
+    """Нажатие кнопки под сообщением бота в формате Bot API"""
+    return {
+        'update_id': update_id,
+        'callback_query': {
+            'id': str(update_id),
+            'from': _user(telegram_id),
+            'chat_instance': str(telegram_id),
+            'data': data,
+            'message': {
+                'message_id': update_id,
+                'date': int(time.time()),
+                'chat': {'id': telegram_id, 'type': 'private', 'first_name': "User"},
+                'from': BOT_USER,
+                'text': "🏗️ Главное меню"
+            }
+        }
+    }
+
+
+def build_synthetic_updates(users: int, seed: int = 0) -> Dict[int, List[Dict[str, Any]]]:
+    """
+    Сценарии для users синтетических пользователей
+
+    При одинаковом seed генерируются одинаковые обновления.
+    """
+    rng = random.Random(seed)
+    update_id = 0
+    result: Dict[int, List[Dict[str, Any]]] = {}
+
+    for index in range(users):
+        telegram_id = SYNTHETIC_USER_BASE + index
+        updates = []
+        for kind, template in SCENARIO:
+            values = _KeepEntities(
+                rate=rng.choice((1500, 2000, 2500, 3000)),
+                hours=rng.choice((2, 4, 6, 8, 12, 16)),
+                cost=rng.randrange(5000, 50000, 500),
+                category=rng.choice(CATEGORIES),
+                template_name=rng.choice(WORKS),
+                item_name=rng.choice(WORKS),
+                title=f"{rng.choice(PROJECTS)} #{index}",
+                bundle_name=f"Набор {rng.choice(PROJECTS)}",
+                query=rng.choice(QUERIES),
+                bulk="\n".join(
+                    f"{rng.choice(WORKS)}; {rng.choice((1, 2, 4, 8))}; {rng.randrange(1000, 20000, 500)}"
+                    for _ in range(rng.randint(3, 10))
+                )
+            )
+            text = template.format_map(values)
+            update_id += 1
+            build = build_message if kind == 'message' else build_callback
+            updates.append(build(update_id, telegram_id, text))
+        result[telegram_id] = updates
+
+    return result
+
+
+def templatize_callback(data: str) -> str:
+    """Замена ID сущностей в данных кнопки на подстановки"""
+    parts = data.split(":")
+    entities = CALLBACK_ENTITIES.get(parts[0])
+    if not entities:
+        return data
+    for position, entity in enumerate(entities, 1):
+        if entity and position < len(parts) and parts[position].isdigit():
+            parts[position] = "{" + entity + "}"
+    return ":".join(parts)
+
+
+def load_recorded_updates(path: str) -> Dict[int, List[Dict[str, Any]]]:
+    """
+    Обновления из файла UpdateRecorderMiddleware, сгруппированные по пользователям
+
+    ID смет, позиций и шаблонов в кнопках заменяются подстановками:
+    при воспроизведении на другой базе у записей будут другие ID.
+    """
+    result: Dict[int, List[Dict[str, Any]]] = {}
+    with open(path, encoding='utf-8') as file:
+        for line in file:
+            if not line.strip():
+                continue
+            update = json.loads(line)['update']
+            callback = update.get('callback_query')
+            if callback and callback.get('data'):
+                callback['data'] = templatize_callback(callback['data'])
+            user = get_raw_update_user(update)
+            result.setdefault(user if user is not None else 0, []).append(update)
+    return result
+
+
+async def resolve_entities(update: Dict[str, Any], pool) -> Dict[str, Any]:
+    """Подстановка ID сущностей пользователя из базы; без записи - 0"""
+    telegram_id = get_raw_update_user(update)
+    if 'callback_query' in update:
+        event, field = update['callback_query'], 'data'
+    elif 'message' in update:
+        event, field = update['message'], 'text'
+    else:
+        return update
+
+    value = event.get(field)
+    if not value or telegram_id is None:
+        return update
+
+    ids: Dict[str, int] = {}
+    for entity in set(ENTITY_RE.findall(value)):
+        ids[entity] = await pool.fetchval(ENTITY_QUERIES[entity], telegram_id) or 0
+    if ids:
+        event[field] = ENTITY_RE.sub(lambda match: str(ids[match.group(1)]), value)
+    return update
@@ -0,0 +1,59 @@
+"""
+Сессия Bot API без сети для воспроизведения обновлений
+"""
+import time
+from collections import Counter
+from typing import Any, AsyncGenerator, Dict, Optional, get_origin
+
+from aiogram import Bot
+from aiogram.client.session.base import BaseSession
+from aiogram.methods import TelegramMethod
+from aiogram.methods.base import TelegramType
+from aiogram.types import File, Message
+
+# Telegram ID бота в ответах-заглушках
+BOT_USER = {'id': 42, 'is_bot': True, 'first_name': "EstimatePro"}
+
+
+class ReplaySession(BaseSession):
+    """
+    Сессия, которая не ходит в Telegram
+
+    Считает вызовы методов Bot API и возвращает правдоподобные ответы:
+    отправка сообщений - сообщение в тот же чат, остальные методы - True.
+    """
+
+    def __init__(self, **kwargs: Any):
+        super().__init__(**kwargs)
+        self.calls: Counter = Counter()
+        self._message_id = 0
+
+    async def close(self) -> None:
+        pass
+
+    async def make_request(self, bot: Bot, method: TelegramMethod[TelegramType],
+                           timeout: Optional[int] = None) -> TelegramType:
+        self.calls[method.__api_method__] += 1
+        returning = method.__returning__
+
+        if returning is Message:
+            self._message_id += 1
+            chat_id = getattr(method, 'chat_id', None)
+            return Message.model_validate({
+                'message_id': self._message_id,
+                'date': int(time.time()),
+                'chat': {'id': chat_id if isinstance(chat_id, int) else 0, 'type': 'private'},
+                'from': BOT_USER,
+                'text': getattr(method, 'text', None)
+            }, context={'bot': bot})
+        if returning is File:
+            return File(file_id=getattr(method, 'file_id', 'file'), file_unique_id='file')
+        if get_origin(returning) is list:
+            return []
+        # bool, а также Union[Message, bool] у методов редактирования
+        return True
+
+    async def stream_content(self, url: str, headers: Optional[Dict[str, Any]] = None,
+                             timeout: int = 30, chunk_size: int = 65536,
+                             raise_for_status: bool = True) -> AsyncGenerator[bytes, None]:
+        yield b""
@@ -1,9 +1,27 @@
 #!/usr/bin/env python3
 """
-Точка входа для запуска бота (для обратной совместимости)
+Точка входа для запуска бота
+
+    python bot.py              - один процесс
+    python bot.py --workers 4  - распределитель и 4 процесса-обработчика
+                                 (по умолчанию берется из BOT_WORKERS)
 """
 
 if __name__ == "__main__":
-    from bot.main import main
+    import argparse
     import asyncio
-    asyncio.run(main()) 
\ No newline at end of file
+    import os
+
+    parser = argparse.ArgumentParser(description="Telegram бот-сметчик")
+    parser.add_argument(
+        "--workers", type=int, default=int(os.getenv("BOT_WORKERS", "1")),
+        help="количество процессов-обработчиков"
+    )
+    args = parser.parse_args()
+
+    if args.workers > 1:
+        from bot.workers import run_workers
+        asyncio.run(run_workers(args.workers))
+    else:
+        from bot.main import main
+        asyncio.run(main())
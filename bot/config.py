@@ -4,7 +4,7 @@
 import os
 import logging
 from dataclasses import dataclass
-from typing import Optional
+from typing import Optional, Tuple
 from dotenv import load_dotenv
 
 logger = logging.getLogger(__name__)
@@ -30,6 +30,14 @@ def get_env(key: str, default: Optional[str] = None, required: bool = False) ->
     return value or ""
 
 
+def parse_ids(value: str) -> Tuple[int, ...]:
+    """Разбор списка Telegram ID через запятую"""
+    try:
+        return tuple(int(item) for item in value.replace(" ", "").split(",") if item)
+    except ValueError:
+        raise ValueError(f"Ожидается список ID через запятую, получено: {value}")
+
+
 @dataclass
 class Config:
     """Конфигурация бота"""
@@ -40,6 +48,28 @@ class Config:
     gigachat_model: str
     gigachat_scope: str
     ai_enabled: bool
+    popularity_decay_interval: int = 3600
+    usage_flush_interval: float = 5.0
+    database_read_url: str = ""
+    db_pool_min_size: int = 5
+    db_pool_max_size: int = 20
+    db_read_pool_min_size: int = 5
+    db_read_pool_max_size: int = 20
+    read_after_write_window: float = 5.0
+    estimate_purge_delay: int = 86400
+    estimate_purge_interval: int = 600
+    archive_after_months: int = 6
+    archive_interval: int = 86400
+    dispatch_shards: int = 4
+    dispatch_workers_per_shard: int = 4
+    dispatch_max_pending: int = 1000
+    dispatch_idle_timeout: float = 300.0
+    update_record_path: str = ""
+    update_record_salt: str = ""
+    admin_users: Tuple[int, ...] = ()
+    loop_lag_interval: float = 0.1
+    loop_lag_threshold: float = 0.25
+    metrics_log_interval: int = 60
 
     @classmethod
     def from_env(cls, env_file: str = ".env") -> "Config":
@@ -60,13 +90,39 @@ class Config:
             gigachat_credentials=get_env("GIGACHAT_CREDENTIALS", ""),
             gigachat_model=get_env("GIGACHAT_MODEL", "GigaChat"),
             gigachat_scope=get_env("GIGACHAT_SCOPE", "GIGACHAT_API_PERS"),
-            ai_enabled=get_env("AI_ENABLED", "true").lower() == "true"
+            ai_enabled=get_env("AI_ENABLED", "true").lower() == "true",
+            popularity_decay_interval=int(get_env("POPULARITY_DECAY_INTERVAL", "3600")),
+            usage_flush_interval=float(get_env("USAGE_FLUSH_INTERVAL", "5")),
+            database_read_url=get_env("DATABASE_READ_URL", ""),
+            db_pool_min_size=int(get_env("DB_POOL_MIN_SIZE", "5")),
+            db_pool_max_size=int(get_env("DB_POOL_MAX_SIZE", "20")),
+            db_read_pool_min_size=int(get_env("DB_READ_POOL_MIN_SIZE", "5")),
+            db_read_pool_max_size=int(get_env("DB_READ_POOL_MAX_SIZE", "20")),
+            read_after_write_window=float(get_env("READ_AFTER_WRITE_WINDOW", "5")),
+            estimate_purge_delay=int(get_env("ESTIMATE_PURGE_DELAY", "86400")),
+            estimate_purge_interval=int(get_env("ESTIMATE_PURGE_INTERVAL", "600")),
+            archive_after_months=int(get_env("ARCHIVE_AFTER_MONTHS", "6")),
+            archive_interval=int(get_env("ARCHIVE_INTERVAL", "86400")),
+            dispatch_shards=int(get_env("DISPATCH_SHARDS", "4")),
+            dispatch_workers_per_shard=int(get_env("DISPATCH_WORKERS_PER_SHARD", "4")),
+            dispatch_max_pending=int(get_env("DISPATCH_MAX_PENDING", "1000")),
+            dispatch_idle_timeout=float(get_env("DISPATCH_IDLE_TIMEOUT", "300")),
+            update_record_path=get_env("UPDATE_RECORD_PATH", ""),
+            update_record_salt=get_env("UPDATE_RECORD_SALT", ""),
+            admin_users=parse_ids(get_env("ADMIN_USERS", "")),
+            loop_lag_interval=float(get_env("LOOP_LAG_INTERVAL", "0.1")),
+            loop_lag_threshold=float(get_env("LOOP_LAG_THRESHOLD", "0.25")),
+            metrics_log_interval=int(get_env("METRICS_LOG_INTERVAL", "60"))
         )
         
         setup_logging(config.log_level)
         config.validate()
         return config
 
+    def is_admin(self, telegram_id: int) -> bool:
+        """Является ли пользователь администратором бота"""
+        return telegram_id in self.admin_users
+
     @property
     def is_ai_available(self) -> bool:
         """Доступен ли ИИ"""
@@ -80,6 +136,30 @@ class Config:
         if not self.database_url:
             raise ValueError("DATABASE_URL не может быть пустым")
         
+        if not 0 < self.db_pool_min_size <= self.db_pool_max_size:
+            raise ValueError("Нужно 0 < DB_POOL_MIN_SIZE <= DB_POOL_MAX_SIZE")
+        
+        if not 0 < self.db_read_pool_min_size <= self.db_read_pool_max_size:
+            raise ValueError("Нужно 0 < DB_READ_POOL_MIN_SIZE <= DB_READ_POOL_MAX_SIZE")
+        
+        if self.estimate_purge_delay < 0:
+            raise ValueError("ESTIMATE_PURGE_DELAY не может быть отрицательным")
+        
+        if self.archive_after_months < 1:
+            raise ValueError("ARCHIVE_AFTER_MONTHS должен быть не меньше 1")
+        
+        if self.dispatch_shards < 1 or self.dispatch_workers_per_shard < 1 or self.dispatch_max_pending < 1:
+            raise ValueError("DISPATCH_SHARDS, DISPATCH_WORKERS_PER_SHARD и DISPATCH_MAX_PENDING должны быть больше 0")
+        
+        if self.loop_lag_interval <= 0 or self.loop_lag_threshold < 0:
+            raise ValueError("LOOP_LAG_INTERVAL должен быть больше 0, LOOP_LAG_THRESHOLD - не меньше 0")
+        
+        if self.metrics_log_interval < 0:
+            raise ValueError("METRICS_LOG_INTERVAL не может быть отрицательным")
+        
+        if self.update_record_path and not self.update_record_salt:
+            raise ValueError("Для записи обновлений нужен UPDATE_RECORD_SALT")
+        
         if self.ai_enabled and not self.gigachat_credentials:
             logger.warning(
                 "AI_ENABLED=true, но GIGACHAT_CREDENTIALS не установлен. "
@@ -92,6 +172,7 @@ class Config:
         """Строковое представление без секретных данных"""
         return (
             f"Config(database_url='{self.database_url}', "
+            f"read_replica={bool(self.database_read_url)}, "
             f"log_level='{self.log_level}', "
             f"ai_enabled={self.ai_enabled}, "
             f"bot_token={'*' * len(self.bot_token)}')"
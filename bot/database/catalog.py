@@ -0,0 +1,126 @@
+"""
+Кэш публичного каталога шаблонов с инвалидацией через LISTEN/NOTIFY
+"""
+import asyncio
+import heapq
+import logging
+from typing import List, Optional
+
+import asyncpg
+from asyncpg import Pool
+
+from .models import WorkTemplate, decode_all
+
+TEMPLATES_CHANNEL = "work_templates_changed"
+
+# Пауза между попытками восстановить слушающее соединение (секунды)
+RECONNECT_DELAY = 5
+
+
+def template_sort_key(template: WorkTemplate):
+    """Ключ сортировки шаблонов: сначала популярные, затем новые"""
+    return (-(template.popularity or 0), -template.created_at.timestamp())
+
+
+def merge_templates(*sorted_lists: List[WorkTemplate]) -> List[WorkTemplate]:
+    """Слияние заранее отсортированных списков шаблонов"""
+    return list(heapq.merge(*sorted_lists, key=template_sort_key))
+
+
+class PublicTemplateCatalog:
+    """
+    Общий для процесса отсортированный список публичных шаблонов.
+
+    Каталог перечитывается одним запросом только после уведомления
+    об изменении публичного шаблона. Пока слушающее соединение недоступно,
+    кэш считается устаревшим при каждом обращении.
+    """
+
+    def __init__(self, database_url: str, logger: logging.Logger):
+        self.database_url = database_url
+        self.logger = logger
+        self._templates: List[WorkTemplate] = []
+        self._stale = True
+        self._lock = asyncio.Lock()
+        self._listener: Optional[asyncpg.Connection] = None
+        self._reconnect_task: Optional[asyncio.Task] = None
+
+    @property
+    def is_listening(self) -> bool:
+        return self._listener is not None and not self._listener.is_closed()
+
+    async def start(self) -> None:
+        """Подписка на уведомления об изменениях"""
+        try:
+            await self._connect()
+            self.logger.info("Подписка на изменения каталога шаблонов установлена")
+        except Exception as e:
+            self._listener = None
+            self.logger.warning(f"Не удалось подписаться на изменения каталога шаблонов: {e}")
+            self._schedule_reconnect()
+
+    async def close(self) -> None:
+        """Отписка от уведомлений"""
+        if self._reconnect_task:
+            self._reconnect_task.cancel()
+            self._reconnect_task = None
+        if self._listener:
+            listener, self._listener = self._listener, None
+            await listener.close()
+
+    def invalidate(self) -> None:
+        """Пометка кэша устаревшим"""
+        self._stale = True
+
+    async def get(self, pool: Pool) -> List[WorkTemplate]:
+        """Получение отсортированного публичного каталога"""
+        if not self._stale and self.is_listening:
+            return self._templates
+
+        async with self._lock:
+            if self._stale or not self.is_listening:
+                # Сбрасываем флаг до чтения, чтобы не потерять уведомление во время запроса
+                self._stale = False
+                # Только основная база: уведомление приходит после коммита, а реплика может отставать
+                async with pool.acquire() as conn:
+                    rows = await conn.fetch("""
+                        SELECT * FROM work_templates
+                        WHERE is_public = TRUE
+                        ORDER BY popularity DESC, created_at DESC
+                    """)
+                self._templates = decode_all(WorkTemplate, rows)
+                self.logger.debug(f"Каталог публичных шаблонов перечитан: {len(self._templates)}")
+
+        return self._templates
+
+    async def _connect(self) -> None:
+        connection = await asyncpg.connect(self.database_url)
+        await connection.add_listener(TEMPLATES_CHANNEL, self._on_notify)
+        connection.add_termination_listener(self._on_terminate)
+        self._listener = connection
+        self._stale = True
+
+    def _on_notify(self, connection, pid, channel, payload) -> None:
+        self._stale = True
+
+    def _on_terminate(self, connection) -> None:
+        if connection is self._listener:
+            self._listener = None
+            self._stale = True
+            self.logger.warning("Соединение подписки на каталог шаблонов разорвано")
+            self._schedule_reconnect()
+
+    def _schedule_reconnect(self) -> None:
+        if self._reconnect_task and not self._reconnect_task.done():
+            return
+        self._reconnect_task = asyncio.get_running_loop().create_task(self._reconnect())
+
+    async def _reconnect(self) -> None:
+        while not self.is_listening:
+            await asyncio.sleep(RECONNECT_DELAY)
+            try:
+                await self._connect()
+                self.logger.info("Подписка на изменения каталога шаблонов восстановлена")
+            except Exception as e:
+                self._listener = None
+                self.logger.warning(f"Повторная подписка на каталог шаблонов не удалась: {e}")
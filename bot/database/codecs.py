@@ -0,0 +1,50 @@
+"""
+Кодеки asyncpg: NUMERIC передается в Python как целое число сотых долей,
+JSONB - как разобранные структуры
+"""
+import json
+from decimal import Decimal, ROUND_HALF_UP
+
+from asyncpg import Connection
+
+from bot.utils.helpers import MINOR_UNITS
+
+
+def decode_minor_units(text: str) -> int:
+    """'7500.50' -> 750050"""
+    whole, _, fraction = text.partition('.')
+    if len(fraction) <= 2:
+        # Столбцы DECIMAL(*, 2) разбираются без Decimal
+        return int(whole + fraction.ljust(2, '0'))
+    # Результаты AVG и деления округляются до сотых
+    return int((Decimal(text) * MINOR_UNITS).to_integral_value(rounding=ROUND_HALF_UP))
+
+
+def encode_minor_units(value: int) -> str:
+    """750050 -> '7500.50'"""
+    if not isinstance(value, int) or isinstance(value, bool):
+        raise TypeError(f"Ожидается целое число сотых долей, получено {type(value).__name__}")
+    whole, fraction = divmod(abs(value), MINOR_UNITS)
+    return f"{'-' if value < 0 else ''}{whole}.{fraction:02d}"
+
+
+async def register_minor_units_codec(conn: Connection) -> None:
+    """Регистрация кодека NUMERIC для соединения пула"""
+    await conn.set_type_codec(
+        'numeric',
+        encoder=encode_minor_units,
+        decoder=decode_minor_units,
+        schema='pg_catalog',
+        format='text'
+    )
+
+
+async def register_codecs(conn: Connection) -> None:
+    """Регистрация всех кодеков для соединения пула"""
+    await register_minor_units_codec(conn)
+    await conn.set_type_codec(
+        'jsonb',
+        encoder=json.dumps,
+        decoder=json.loads,
+        schema='pg_catalog'
+    )
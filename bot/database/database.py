@@ -3,39 +3,185 @@
 """
 import asyncio
 import logging
+import random
+from contextlib import asynccontextmanager
 from datetime import datetime
-from typing import List, Optional, Dict, Any
+from typing import AsyncIterable, AsyncIterator, Awaitable, Callable, List, Optional, Dict, Any, Iterable, Tuple, TypeVar, Union
 
 import asyncpg
-from asyncpg import Pool
+from asyncpg import Connection, Pool
+
+from .catalog import PublicTemplateCatalog, merge_templates
+from .codecs import register_codecs
+from .models import (
+    User, UserStats, Estimate, EstimateMatch, EstimateItem, WorkTemplate, TemplateBundle, BundleItem,
+    EstimateSnapshot, SnapshotChange, decode, decode_all
+)
+from .routing import RecentWrites, current_user
+from .usage import TemplateUsageBuffer
+from bot.utils.importers import IMPORT_COLUMNS
+
+# Количество смет в одной транзакции пересчета по ставке
+REPRICE_BATCH_SIZE = 100
+
+# Размер пачки фоновой очистки удаленных смет и пауза между пачками (секунды)
+PURGE_BATCH_SIZE = 1000
+PURGE_BATCH_PAUSE = 0.1
+
+# Количество смет в одной транзакции архивации и пауза между транзакциями (секунды)
+ARCHIVE_BATCH_SIZE = 100
+ARCHIVE_BATCH_PAUSE = 0.1
+
+# Статус сметы, позиции которой перенесены в estimate_archives
+ARCHIVED_STATUS = 'archived'
+
+# Попытки записи в смету при конфликте версий и базовая пауза между ними (секунды)
+VERSION_CONFLICT_ATTEMPTS = 5
+VERSION_CONFLICT_DELAY = 0.02
+
+# Фоновое затухание трогает только шаблоны, не пересчитанные дольше этого:
+# за сутки при полураспаде 30 дней популярность падает на ~2%
+POPULARITY_DECAY_MIN_AGE = 86400
+
+# Популярность ниже порога обнуляется и больше не участвует в затухании
+POPULARITY_FLOOR = 0.01
+
+# Количество популярных шаблонов в статистике (как в user_stats.top_templates)
+TOP_TEMPLATES_COUNT = 3
+
+# Совпадение в позиции весит меньше совпадения в самой смете
+ITEM_MATCH_WEIGHT = 0.5
+
+# Надбавка совпадению по словам: ранг ts_rank приводится к [0, 1) и
+# без нее несравним со сходством триграмм
+WORD_MATCH_BONUS = 1.0
+
+# Короче трех символов триграммный индекс не помогает, ищем только по словам
+MIN_SUBSTRING_LENGTH = 3
+
+T = TypeVar('T')
+
+# Записи импорта: список или поток, который разбирает файл по мере COPY
+ImportRecords = Union[Iterable[Tuple], AsyncIterable[Tuple]]
+
+
+class EstimateConflictError(RuntimeError):
+    """Смета изменена параллельной записью"""
 
 
 class Database:
     """Класс для работы с PostgreSQL базой данных"""
     
-    def __init__(self, database_url: str, logger: logging.Logger):
+    def __init__(self, database_url: str, logger: logging.Logger,
+                 read_database_url: str = "",
+                 pool_min_size: int = 5, pool_max_size: int = 20,
+                 read_pool_min_size: int = 5, read_pool_max_size: int = 20,
+                 read_after_write_window: float = 5.0):
         self.database_url = database_url
+        self.read_database_url = read_database_url
         self.logger = logger
         self.pool: Optional[Pool] = None
+        self.read_pool: Optional[Pool] = None
+        self.pool_sizes = (pool_min_size, pool_max_size)
+        self.read_pool_sizes = (read_pool_min_size, read_pool_max_size)
+        self.recent_writes = RecentWrites(read_after_write_window)
+        self.public_templates = PublicTemplateCatalog(database_url, logger)
+        self.template_usage = TemplateUsageBuffer(logger)
+        # Подписчики на изменение личных шаблонов пользователя (кэши поиска)
+        self.template_listeners: List[Callable[[int], None]] = []
     
     async def init_db(self) -> None:
         """Инициализация подключения к базе данных"""
         try:
-            self.pool = await asyncpg.create_pool(
-                self.database_url,
-                min_size=5,
-                max_size=20,
-                command_timeout=60
-            )
+            self.pool = await self._create_pool(self.database_url, *self.pool_sizes)
             self.logger.info("Подключение к базе данных установлено")
             
+            await self.public_templates.start()
+            
         except Exception as e:
             self.logger.error(f"Ошибка подключения к базе данных: {e}")
             raise
+        
+        if self.read_database_url:
+            # Без реплики бот продолжает работать, все запросы идут в основную базу
+            try:
+                self.read_pool = await self._create_pool(self.read_database_url, *self.read_pool_sizes)
+                self.logger.info("Подключение к реплике для чтения установлено")
+            except Exception as e:
+                self.logger.warning(f"Реплика для чтения недоступна, чтение идет из основной базы: {e}")
+
+    @staticmethod
+    async def _create_pool(dsn: str, min_size: int, max_size: int) -> Pool:
+        return await asyncpg.create_pool(
+            dsn,
+            min_size=min_size,
+            max_size=max_size,
+            command_timeout=60,
+            # Деньги и время приходят целыми сотыми долями, без Decimal
+            init=register_codecs
+        )
+
+    @asynccontextmanager
+    async def _acquire(self, read: bool = False) -> AsyncIterator[Connection]:
+        """
+        Соединение из пула: чтение идет в реплику, запись - в основную базу
+
+        После записи пользователь на время окна закрепляется за основной базой,
+        чтобы сразу видеть свои изменения.
+        """
+        user = current_user.get()
+        if read:
+            pool = self.pool if self.read_pool is None or self.recent_writes.is_recent(user) else self.read_pool
+            async with pool.acquire() as conn:
+                yield conn
+            return
+        
+        try:
+            async with self.pool.acquire() as conn:
+                yield conn
+        finally:
+            # Окно отсчитывается от завершения записи
+            self.recent_writes.mark(user)
+
+    async def _write_estimates(self, write: Callable[[Connection], Awaitable[T]]) -> T:
+        """
+        Транзакция записи в сметы с повтором при конфликте версий
+
+        write читает версии смет и применяет изменения только при их
+        совпадении (см. _update_estimate_totals); при конфликте транзакция
+        откатывается и выполняется заново на свежих данных.
+        """
+        async def attempt() -> T:
+            async with self._acquire() as conn:
+                async with conn.transaction():
+                    return await write(conn)
+        
+        return await self._retry_on_conflict(attempt)
+
+    async def _retry_on_conflict(self, attempt: Callable[[], Awaitable[T]]) -> T:
+        """Повтор попытки записи при конфликте версий со случайной паузой"""
+        for attempt_number in range(1, VERSION_CONFLICT_ATTEMPTS + 1):
+            try:
+                return await attempt()
+            except EstimateConflictError:
+                if attempt_number == VERSION_CONFLICT_ATTEMPTS:
+                    raise
+                self.logger.debug(f"Конфликт версий смет, попытка {attempt_number + 1}")
+                # Случайная пауза разводит повторы одновременных писателей
+                await asyncio.sleep(VERSION_CONFLICT_DELAY * attempt_number * random.uniform(0.5, 1.5))
 
     async def close(self) -> None:
         """Закрытие подключения к базе данных"""
+        await self.public_templates.close()
+        if self.read_pool:
+            await self.read_pool.close()
+            self.read_pool = None
         if self.pool:
+            # Незаписанные использования шаблонов сохраняем перед закрытием
+            try:
+                await self.template_usage.flush(self.pool)
+            except Exception as e:
+                self.logger.error(f"Не удалось сохранить использования шаблонов при закрытии: {e}", exc_info=True)
             await self.pool.close()
             self.logger.info("Подключение к базе данных закрыто")
 
@@ -43,7 +189,7 @@ class Database:
     
     async def create_user(self, telegram_id: int, username: str = None, first_name: str = None, last_name: str = None) -> int:
         """Создание нового пользователя"""
-        async with self.pool.acquire() as conn:
+        async with self._acquire() as conn:
             user_id = await conn.fetchval("""
                 INSERT INTO users (telegram_id, username, first_name, last_name)
                 VALUES ($1, $2, $3, $4)
@@ -64,19 +210,68 @@ class Database:
             
             return user_id
 
-    async def get_user_by_telegram_id(self, telegram_id: int) -> Optional[Dict]:
+    async def get_user_by_telegram_id(self, telegram_id: int) -> Optional[User]:
         """Получение пользователя по Telegram ID"""
-        async with self.pool.acquire() as conn:
+        async with self._acquire(read=True) as conn:
             row = await conn.fetchrow("""
                 SELECT * FROM users WHERE telegram_id = $1
             """, telegram_id)
-            return dict(row) if row else None
+            return decode(User, row)
+
+    # === МЕТОДЫ ДЛЯ НАСТРОЕК ПОЛЬЗОВАТЕЛЯ ===
+
+    async def get_hourly_rate(self, user_id: int) -> Optional[int]:
+        """Получение почасовой ставки пользователя"""
+        async with self._acquire(read=True) as conn:
+            rate = await conn.fetchval("""
+                SELECT default_hourly_rate FROM user_settings WHERE user_id = $1
+            """, user_id)
+            return rate
+
+    async def set_hourly_rate(self, user_id: int, rate: Optional[int]) -> None:
+        """Установка или сброс почасовой ставки пользователя"""
+        async with self._acquire() as conn:
+            await conn.execute("""
+                INSERT INTO user_settings (user_id, default_hourly_rate)
+                VALUES ($1, $2)
+                ON CONFLICT (user_id) DO UPDATE SET
+                    default_hourly_rate = EXCLUDED.default_hourly_rate,
+                    updated_at = CURRENT_TIMESTAMP
+            """, user_id, rate)
+
+    # === МЕТОДЫ ДЛЯ СТАТИСТИКИ ===
+
+    async def get_user_stats(self, user_id: int) -> UserStats:
+        """Сводная статистика пользователя вместе с публичными шаблонами"""
+        public_templates = await self.public_templates.get(self.pool)
+        
+        # Строка поддерживается триггерами, чтение - один поиск по первичному ключу
+        async with self._acquire(read=True) as conn:
+            row = await conn.fetchrow("""
+                SELECT * FROM user_stats WHERE user_id = $1
+            """, user_id)
+        
+        stats = decode(UserStats, row) or UserStats(user_id=user_id)
+        own_top = [
+            WorkTemplate(
+                id=template['id'],
+                user_id=user_id,
+                name=template['name'],
+                usage_count=template['usage_count'],
+                popularity=template['popularity'],
+                created_at=datetime.fromisoformat(template['created_at'])
+            )
+            for template in stats.top_templates
+        ]
+        stats.templates_count += len(public_templates)
+        stats.top_templates = merge_templates(own_top, public_templates[:TOP_TEMPLATES_COUNT])[:TOP_TEMPLATES_COUNT]
+        return stats
 
     # === МЕТОДЫ ДЛЯ РАБОТЫ СО СМЕТАМИ ===
     
     async def create_estimate(self, user_id: int, title: str, description: str = None) -> int:
         """Создание новой сметы"""
-        async with self.pool.acquire() as conn:
+        async with self._acquire() as conn:
             estimate_id = await conn.fetchval("""
                 INSERT INTO estimates (user_id, title, description)
                 VALUES ($1, $2, $3)
@@ -84,94 +279,358 @@ class Database:
             """, user_id, title, description)
             return estimate_id
 
-    async def get_user_estimates(self, user_id: int, limit: int = 50) -> List[Dict]:
+    async def get_user_estimates(self, user_id: int, limit: int = 50) -> List[Estimate]:
         """Получение смет пользователя"""
-        async with self.pool.acquire() as conn:
+        # Итоги хранятся в самой смете, из позиций считается только их количество
+        async with self._acquire(read=True) as conn:
             rows = await conn.fetch("""
-                SELECT e.*, 
-                       COUNT(ei.id) as items_count,
-                       COALESCE(SUM(ei.cost), 0) as total_cost,
-                       COALESCE(SUM(ei.duration), 0) as total_duration
+                SELECT e.*,
+                       CASE WHEN e.status = 'archived'
+                            THEN (SELECT jsonb_array_length(a.items) FROM estimate_archives a
+                                  WHERE a.estimate_id = e.id)
+                            ELSE (SELECT COUNT(*) FROM estimate_items ei WHERE ei.estimate_id = e.id)
+                       END as items_count
                 FROM estimates e
-                LEFT JOIN estimate_items ei ON e.id = ei.estimate_id
-                WHERE e.user_id = $1
-                GROUP BY e.id
+                WHERE e.user_id = $1 AND e.deleted_at IS NULL
                 ORDER BY e.created_at DESC
                 LIMIT $2
             """, user_id, limit)
-            return [dict(row) for row in rows]
+            return decode_all(Estimate, rows)
 
-    async def get_estimate_by_id(self, estimate_id: int, user_id: int) -> Optional[Dict]:
+    async def get_estimate_by_id(self, estimate_id: int, user_id: int) -> Optional[Estimate]:
         """Получение сметы по ID"""
-        async with self.pool.acquire() as conn:
+        async with self._acquire(read=True) as conn:
             row = await conn.fetchrow("""
-                SELECT e.*, 
-                       COUNT(ei.id) as items_count,
-                       COALESCE(SUM(ei.cost), 0) as total_cost,
-                       COALESCE(SUM(ei.duration), 0) as total_duration
+                SELECT e.*,
+                       CASE WHEN e.status = 'archived'
+                            THEN (SELECT jsonb_array_length(a.items) FROM estimate_archives a
+                                  WHERE a.estimate_id = e.id)
+                            ELSE (SELECT COUNT(*) FROM estimate_items ei WHERE ei.estimate_id = e.id)
+                       END as items_count
                 FROM estimates e
-                LEFT JOIN estimate_items ei ON e.id = ei.estimate_id
-                WHERE e.id = $1 AND e.user_id = $2
-                GROUP BY e.id
+                WHERE e.id = $1 AND e.user_id = $2 AND e.deleted_at IS NULL
             """, estimate_id, user_id)
-            return dict(row) if row else None
+            return decode(Estimate, row)
+
+    async def open_estimate(self, estimate_id: int, user_id: int) -> Optional[Estimate]:
+        """Открытие сметы для просмотра позиций: архивная смета возвращается из архива"""
+        estimate = await self.get_estimate_by_id(estimate_id, user_id)
+        if estimate is not None and estimate.status == ARCHIVED_STATUS:
+            estimate = await self.unarchive_estimate(estimate_id, user_id) or estimate
+        return estimate
+
+    async def update_estimate_title(self, estimate_id: int, user_id: int, title: str) -> bool:
+        """Изменение названия сметы"""
+        async with self._acquire() as conn:
+            result = await conn.execute("""
+                UPDATE estimates
+                SET title = $3, version = version + 1, updated_at = CURRENT_TIMESTAMP
+                WHERE id = $1 AND user_id = $2 AND deleted_at IS NULL
+            """, estimate_id, user_id, title)
+            return result != "UPDATE 0"
 
     async def delete_estimate(self, estimate_id: int, user_id: int) -> bool:
-        """Удаление сметы"""
-        async with self.pool.acquire() as conn:
+        """Удаление сметы: смета только помечается, строки удаляет purge_deleted_estimates"""
+        async with self._acquire() as conn:
             result = await conn.execute("""
-                DELETE FROM estimates 
-                WHERE id = $1 AND user_id = $2
+                UPDATE estimates
+                SET deleted_at = CURRENT_TIMESTAMP, version = version + 1
+                WHERE id = $1 AND user_id = $2 AND deleted_at IS NULL
             """, estimate_id, user_id)
-            return result != "DELETE 0"
+            return result != "UPDATE 0"
+
+    async def restore_estimate(self, estimate_id: int, user_id: int, undo_window: float) -> bool:
+        """Восстановление удаленной сметы, пока не истекло окно отмены"""
+        async with self._acquire() as conn:
+            result = await conn.execute("""
+                UPDATE estimates
+                SET deleted_at = NULL, version = version + 1
+                WHERE id = $1 AND user_id = $2
+                  AND deleted_at >= CURRENT_TIMESTAMP - make_interval(secs => $3)
+            """, estimate_id, user_id, undo_window)
+            return result != "UPDATE 0"
+
+    async def purge_deleted_estimates(self, undo_window: float) -> None:
+        """
+        Окончательное удаление смет, у которых истекло окно отмены
+
+        Позиции удаляются пачками по PURGE_BATCH_SIZE строк в отдельных
+        коротких транзакциях с паузой между пачками, поэтому очистка больших
+        смет не держит долгих блокировок.
+        """
+        purged_items = await self._purge_in_batches("""
+            DELETE FROM estimate_items
+            WHERE id IN (
+                SELECT i.id
+                FROM estimates e
+                JOIN estimate_items i ON i.estimate_id = e.id
+                WHERE e.deleted_at < CURRENT_TIMESTAMP - make_interval(secs => $1)
+                LIMIT $2
+            )
+        """, undo_window)
+        
+        # Сметы без позиций удаляются быстро, каскадом уходят только версии
+        purged_estimates = await self._purge_in_batches("""
+            DELETE FROM estimates
+            WHERE id IN (
+                SELECT e.id FROM estimates e
+                WHERE e.deleted_at < CURRENT_TIMESTAMP - make_interval(secs => $1)
+                  AND NOT EXISTS (SELECT 1 FROM estimate_items i WHERE i.estimate_id = e.id)
+                LIMIT $2
+            )
+        """, undo_window)
+        
+        if purged_estimates or purged_items:
+            self.logger.info(f"Удалено смет: {purged_estimates}, позиций: {purged_items}")
+
+    async def _purge_in_batches(self, query: str, undo_window: float) -> int:
+        """Повтор удаляющего запроса пачками, пока он что-то удаляет"""
+        total = 0
+        while True:
+            async with self._acquire() as conn:
+                result = await conn.execute(query, undo_window, PURGE_BATCH_SIZE)
+            deleted = int(result.split()[-1])
+            total += deleted
+            if deleted < PURGE_BATCH_SIZE:
+                return total
+            await asyncio.sleep(PURGE_BATCH_PAUSE)
 
     # === МЕТОДЫ ДЛЯ РАБОТЫ С ПОЗИЦИЯМИ СМЕТ ===
     
-    async def add_estimate_item(self, estimate_id: int, name: str, description: str, duration: float, cost: float) -> int:
+    async def add_estimate_item(self, estimate_id: int, name: str, description: str,
+                                duration: int, cost: int) -> Optional[int]:
         """Добавление позиции в смету"""
-        async with self.pool.acquire() as conn:
+        async def write(conn: Connection) -> Optional[int]:
+            version = await self._get_estimate_version(conn, estimate_id)
+            if version is None:
+                return None
+            
             item_id = await conn.fetchval("""
-                INSERT INTO estimate_items (estimate_id, name, description, duration, cost)
-                VALUES ($1, $2, $3, $4, $5)
+                INSERT INTO estimate_items (estimate_id, name, description, duration, cost, sort_order)
+                SELECT $1, $2, $3, $4, $5, COALESCE(MAX(sort_order), 0) + 1
+                FROM estimate_items
+                WHERE estimate_id = $1
                 RETURNING id
             """, estimate_id, name, description, duration, cost)
             
             # Обновляем итоги сметы
-            await self._update_estimate_totals(conn, estimate_id)
+            await self._update_estimate_totals(conn, estimate_id, version)
             return item_id
+        
+        return await self._write_estimates(write)
+
+    async def add_estimate_items(self, estimate_id: int, items: List[Dict]) -> int:
+        """Пакетное добавление позиций в смету одним запросом"""
+        if not items:
+            return 0
+        
+        async def write(conn: Connection) -> int:
+            version = await self._get_estimate_version(conn, estimate_id)
+            if version is None:
+                return 0
+            
+            result = await conn.execute("""
+                INSERT INTO estimate_items (estimate_id, name, description, duration, cost, sort_order)
+                SELECT $1, i.name, '', i.duration / 100.0, i.cost / 100.0, base.max_order + i.position
+                FROM unnest($2::text[], $3::bigint[], $4::bigint[])
+                     WITH ORDINALITY AS i(name, duration, cost, position),
+                     (SELECT COALESCE(MAX(sort_order), 0) AS max_order
+                      FROM estimate_items WHERE estimate_id = $1) base
+            """, estimate_id,
+                [item['name'] for item in items],
+                [item['duration'] for item in items],
+                [item['cost'] for item in items])
+            
+            # Итоги пересчитываются один раз на весь пакет
+            await self._update_estimate_totals(conn, estimate_id, version)
+            return int(result.split()[-1])
+        
+        return await self._write_estimates(write)
 
-    async def get_estimate_items(self, estimate_id: int) -> List[Dict]:
+    async def _copy_to_import_table(self, conn, records: ImportRecords) -> None:
+        """Загрузка записей во временную таблицу импорта через COPY"""
+        # Время, стоимость и количество загружаются целыми сотыми долями:
+        # бинарный COPY не использует текстовый кодек NUMERIC
+        await conn.execute("""
+            CREATE TEMP TABLE import_items (
+                line_no INTEGER,
+                name TEXT,
+                description TEXT,
+                duration BIGINT,
+                cost BIGINT,
+                quantity BIGINT,
+                unit TEXT,
+                category TEXT
+            ) ON COMMIT DROP
+        """)
+        await conn.copy_records_to_table(
+            'import_items',
+            records=records,
+            columns=list(IMPORT_COLUMNS)
+        )
+
+    async def import_estimate_items(self, estimate_id: int, records: ImportRecords) -> int:
+        """
+        Импорт позиций в смету: COPY во временную таблицу и одна вставка
+
+        Записи читаются потоком и загружаются один раз; при конфликте версий
+        в точке сохранения повторяется только вставка из временной таблицы.
+        """
+        async def write(conn: Connection) -> int:
+            version = await self._get_estimate_version(conn, estimate_id)
+            if version is None:
+                return 0
+            
+            # Количество входит в время и стоимость позиции, как в наборах шаблонов:
+            # итоги сметы и карточки позиций считают количество равным 1
+            result = await conn.execute("""
+                INSERT INTO estimate_items
+                    (estimate_id, name, description, duration, cost, unit, sort_order)
+                SELECT $1,
+                       CASE WHEN i.quantity = 100 THEN i.name
+                            ELSE LEFT(i.name, 240) || ' ×' || TRIM_SCALE(i.quantity / 100.0)::text END,
+                       i.description,
+                       ROUND(i.duration * i.quantity / 10000.0, 2),
+                       ROUND(i.cost * i.quantity / 10000.0, 2),
+                       i.unit,
+                       base.max_order + ROW_NUMBER() OVER (ORDER BY i.line_no)
+                FROM import_items i,
+                     (SELECT COALESCE(MAX(sort_order), 0) AS max_order
+                      FROM estimate_items WHERE estimate_id = $1) base
+            """, estimate_id)
+            
+            await self._update_estimate_totals(conn, estimate_id, version)
+            return int(result.split()[-1])
+        
+        async with self._acquire() as conn:
+            async with conn.transaction():
+                await self._copy_to_import_table(conn, records)
+                
+                async def attempt() -> int:
+                    async with conn.transaction():
+                        return await write(conn)
+                
+                return await self._retry_on_conflict(attempt)
+
+    async def get_estimate_items(self, estimate_id: int) -> List[EstimateItem]:
         """Получение позиций сметы"""
-        async with self.pool.acquire() as conn:
+        async with self._acquire(read=True) as conn:
             rows = await conn.fetch("""
                 SELECT * FROM estimate_items 
                 WHERE estimate_id = $1 
-                ORDER BY order_index, created_at
+                ORDER BY sort_order, created_at
             """, estimate_id)
-            return [dict(row) for row in rows]
+            return decode_all(EstimateItem, rows)
 
-    async def delete_estimate_item(self, item_id: int) -> bool:
-        """Удаление позиции сметы"""
-        async with self.pool.acquire() as conn:
-            # Получаем estimate_id перед удалением
+    async def get_estimate_item(self, item_id: int, user_id: int) -> Optional[EstimateItem]:
+        """Получение позиции сметы с проверкой владельца"""
+        async with self._acquire(read=True) as conn:
+            row = await conn.fetchrow("""
+                SELECT i.* FROM estimate_items i
+                JOIN estimates e ON e.id = i.estimate_id
+                WHERE i.id = $1 AND e.user_id = $2 AND e.deleted_at IS NULL
+            """, item_id, user_id)
+            return decode(EstimateItem, row)
+
+    async def update_estimate_item(self, item_id: int, user_id: int, name: str = None,
+                                   duration: int = None, cost: int = None) -> bool:
+        """Изменение позиции сметы с поправкой итогов на разницу значений"""
+        async with self._acquire() as conn:
             estimate_id = await conn.fetchval("""
-                SELECT estimate_id FROM estimate_items WHERE id = $1
-            """, item_id)
-            
-            if not estimate_id:
-                return False
-            
+                WITH old AS (
+                    SELECT i.id, i.duration, i.cost
+                    FROM estimate_items i
+                    JOIN estimates e ON e.id = i.estimate_id
+                    WHERE i.id = $1 AND e.user_id = $2 AND e.deleted_at IS NULL
+                    FOR UPDATE OF i
+                ), changed AS (
+                    UPDATE estimate_items i
+                    SET name = COALESCE($3, i.name),
+                        duration = COALESCE($4, i.duration),
+                        cost = COALESCE($5, i.cost)
+                    FROM old
+                    WHERE i.id = old.id
+                    RETURNING i.estimate_id,
+                              i.duration - old.duration AS duration_delta,
+                              i.cost - old.cost AS cost_delta
+                )
+                UPDATE estimates e
+                SET total_duration = e.total_duration + c.duration_delta,
+                    total_cost = e.total_cost + c.cost_delta,
+                    version = e.version + 1,
+                    updated_at = CURRENT_TIMESTAMP
+                FROM changed c
+                WHERE e.id = c.estimate_id
+                RETURNING e.id
+            """, item_id, user_id, name, duration, cost)
+            return estimate_id is not None
+
+    async def delete_estimate_item(self, item_id: int, user_id: int) -> bool:
+        """Удаление позиции сметы с вычитанием ее из итогов"""
+        async with self._acquire() as conn:
+            estimate_id = await conn.fetchval("""
+                WITH deleted AS (
+                    DELETE FROM estimate_items i
+                    USING estimates e
+                    WHERE i.id = $1 AND e.id = i.estimate_id AND e.user_id = $2
+                      AND e.deleted_at IS NULL
+                    RETURNING i.estimate_id, i.duration, i.cost
+                )
+                UPDATE estimates e
+                SET total_duration = e.total_duration - d.duration,
+                    total_cost = e.total_cost - d.cost,
+                    version = e.version + 1,
+                    updated_at = CURRENT_TIMESTAMP
+                FROM deleted d
+                WHERE e.id = d.estimate_id
+                RETURNING e.id
+            """, item_id, user_id)
+            return estimate_id is not None
+
+    async def reorder_estimate_items(self, estimate_id: int, user_id: int, item_ids: List[int]) -> int:
+        """Сохранение нового порядка позиций одним запросом"""
+        async with self._acquire() as conn:
             result = await conn.execute("""
-                DELETE FROM estimate_items WHERE id = $1
-            """, item_id)
-            
-            # Обновляем итоги сметы
-            await self._update_estimate_totals(conn, estimate_id)
-            return result != "DELETE 0"
+                UPDATE estimate_items i
+                SET sort_order = o.position
+                FROM unnest($3::int[]) WITH ORDINALITY AS o(id, position),
+                     estimates e
+                WHERE i.id = o.id
+                  AND i.estimate_id = $1
+                  AND e.id = i.estimate_id AND e.user_id = $2
+                  AND e.deleted_at IS NULL
+                  AND i.sort_order IS DISTINCT FROM o.position
+            """, estimate_id, user_id, item_ids)
+            return int(result.split()[-1])
 
-    async def _update_estimate_totals(self, conn, estimate_id: int) -> None:
-        """Обновление итогов сметы"""
-        await conn.execute("""
+    async def _get_estimate_version(self, conn: Connection, estimate_id: int) -> Optional[int]:
+        """
+        Текущая версия сметы; None, если смета удалена
+
+        Позиции архивной сметы сначала возвращаются из архива, иначе запись
+        пересчитала бы итоги без них.
+        """
+        row = await conn.fetchrow("""
+            SELECT version, status FROM estimates
+            WHERE id = $1 AND deleted_at IS NULL
+        """, estimate_id)
+        if row is None:
+            return None
+        if row['status'] != ARCHIVED_STATUS:
+            return row['version']
+        
+        restored = await self._restore_archived(conn, [estimate_id])
+        return restored[0]['version'] if restored else row['version']
+
+    async def _update_estimate_totals(self, conn: Connection, estimate_id: int, version: int) -> None:
+        """
+        Обновление итогов сметы, если ее версия не изменилась с момента чтения
+
+        Итоги считаются по снимку начала запроса; если параллельная запись
+        успела изменить смету, такой пересчет мог ее не увидеть, поэтому
+        выбрасывается EstimateConflictError и запись повторяется.
+        """
+        result = await conn.execute("""
             UPDATE estimates 
             SET total_cost = (
                 SELECT COALESCE(SUM(cost), 0) 
@@ -183,56 +642,676 @@ class Database:
                 FROM estimate_items 
                 WHERE estimate_id = $1
             ),
+            version = version + 1,
             updated_at = CURRENT_TIMESTAMP
-            WHERE id = $1
-        """, estimate_id)
+            WHERE id = $1 AND version = $2
+        """, estimate_id, version)
+        if result == "UPDATE 0":
+            raise EstimateConflictError(f"Смета {estimate_id} изменена параллельной записью")
+
+    async def reprice_estimates(self, user_id: int, rate: int,
+                                estimate_ids: Optional[List[int]] = None) -> Tuple[int, int]:
+        """
+        Пересчет стоимости позиций по ставке: стоимость = часы × ставка
+
+        Без списка смет пересчитываются все черновики пользователя. Сметы
+        обрабатываются пачками, каждая пачка - отдельная короткая транзакция,
+        итоги каждой сметы пересчитываются один раз.
+
+        Returns:
+            Tuple[int, int]: (количество смет, количество измененных позиций)
+        """
+        if estimate_ids is None:
+            async with self._acquire() as conn:
+                estimate_ids = [row['id'] for row in await conn.fetch("""
+                    SELECT id FROM estimates
+                    WHERE user_id = $1 AND status = 'draft' AND deleted_at IS NULL
+                    ORDER BY id
+                """, user_id)]
+        
+        repriced_items = 0
+        for start in range(0, len(estimate_ids), REPRICE_BATCH_SIZE):
+            batch = estimate_ids[start:start + REPRICE_BATCH_SIZE]
+            repriced_items += await self._write_estimates(
+                lambda conn: self._reprice_batch(conn, user_id, rate, batch)
+            )
+        
+        return len(estimate_ids), repriced_items
+
+    async def _reprice_batch(self, conn: Connection, user_id: int, rate: int, batch: List[int]) -> int:
+        """Пересчет пачки смет по ставке со сравнением версий"""
+        versions = await conn.fetch("""
+            SELECT id, version, status FROM estimates
+            WHERE id = ANY($2::int[]) AND user_id = $1 AND deleted_at IS NULL
+        """, user_id, batch)
+        if not versions:
+            return 0
+        
+        archived = [row['id'] for row in versions if row['status'] == ARCHIVED_STATUS]
+        if archived:
+            # Архивные сметы пересчитываются вместе с возвращенными позициями
+            restored = {row['id']: row['version'] for row in await self._restore_archived(conn, archived, user_id)}
+            versions = [
+                {'id': row['id'], 'version': restored.get(row['id'], row['version'])}
+                for row in versions
+            ]
+        ids = [row['id'] for row in versions]
+        
+        result = await conn.execute("""
+            UPDATE estimate_items
+            SET cost = ROUND(duration * $2, 2)
+            WHERE estimate_id = ANY($1::int[])
+              AND cost <> ROUND(duration * $2, 2)
+        """, ids, rate)
+        
+        updated = await conn.execute("""
+            UPDATE estimates e
+            SET total_cost = COALESCE(s.total_cost, 0),
+                total_duration = COALESCE(s.total_duration, 0),
+                version = e.version + 1,
+                updated_at = CURRENT_TIMESTAMP
+            FROM unnest($1::int[], $2::int[]) AS v(id, version)
+            LEFT JOIN (
+                SELECT estimate_id,
+                       SUM(cost) AS total_cost,
+                       SUM(duration) AS total_duration
+                FROM estimate_items
+                WHERE estimate_id = ANY($1::int[])
+                GROUP BY estimate_id
+            ) s ON s.estimate_id = v.id
+            WHERE e.id = v.id AND e.version = v.version
+        """, ids, [row['version'] for row in versions])
+        
+        # Хотя бы одна смета пачки изменена параллельно - пачка повторяется целиком
+        if int(updated.split()[-1]) != len(ids):
+            raise EstimateConflictError("Сметы пачки пересчета изменены параллельной записью")
+        return int(result.split()[-1])
+
+    # === МЕТОДЫ ДЛЯ КОПИЙ И ВЕРСИЙ СМЕТ ===
+
+    async def clone_estimate(self, estimate_id: int, user_id: int) -> Optional[int]:
+        """Копирование сметы вместе с позициями одним запросом"""
+        async with self._acquire() as conn:
+            async with conn.transaction():
+                await self._restore_archived(conn, [estimate_id], user_id)
+                return await conn.fetchval("""
+                    WITH source AS (
+                        SELECT * FROM estimates
+                        WHERE id = $1 AND user_id = $2 AND deleted_at IS NULL
+                    ), cloned AS (
+                        INSERT INTO estimates (user_id, title, description, currency, total_cost, total_duration)
+                        SELECT user_id, LEFT(title, 245) || ' (копия)', description, currency,
+                               total_cost, total_duration
+                        FROM source
+                        RETURNING id
+                    ), items AS (
+                        INSERT INTO estimate_items
+                            (estimate_id, name, description, duration, cost, unit, quantity, sort_order)
+                        SELECT c.id, i.name, i.description, i.duration, i.cost, i.unit, i.quantity, i.sort_order
+                        FROM estimate_items i, cloned c
+                        WHERE i.estimate_id = $1
+                    )
+                    SELECT id FROM cloned
+                """, estimate_id, user_id)
+
+    async def snapshot_estimate(self, estimate_id: int, user_id: int) -> Optional[int]:
+        """Сохранение текущего состояния сметы как новой версии"""
+        async with self._acquire() as conn:
+            async with conn.transaction():
+                await self._restore_archived(conn, [estimate_id], user_id)
+                return await conn.fetchval("""
+                    INSERT INTO estimate_snapshots (estimate_id, version, title, total_cost, total_duration, items)
+                    SELECT e.id,
+                           COALESCE((SELECT MAX(version) FROM estimate_snapshots WHERE estimate_id = e.id), 0) + 1,
+                           e.title, e.total_cost, e.total_duration,
+                           COALESCE((
+                               SELECT jsonb_agg(jsonb_strip_nulls(jsonb_build_object(
+                                          'n', i.name,
+                                          'd', NULLIF(i.description, ''),
+                                          'h', i.duration,
+                                          'c', i.cost,
+                                          'q', NULLIF(i.quantity, 1),
+                                          'u', NULLIF(i.unit, 'шт')
+                                      )) ORDER BY i.sort_order, i.created_at)
+                               FROM estimate_items i
+                               WHERE i.estimate_id = e.id
+                           ), '[]'::jsonb)
+                    FROM estimates e
+                    WHERE e.id = $1 AND e.user_id = $2 AND e.deleted_at IS NULL
+                    RETURNING version
+                """, estimate_id, user_id)
+
+    async def get_estimate_snapshots(self, estimate_id: int, user_id: int, limit: int = 20) -> List[EstimateSnapshot]:
+        """Получение списка версий сметы"""
+        async with self._acquire(read=True) as conn:
+            rows = await conn.fetch("""
+                SELECT s.version, s.title, s.total_cost, s.total_duration,
+                       jsonb_array_length(s.items) as items_count,
+                       s.created_at
+                FROM estimate_snapshots s
+                JOIN estimates e ON e.id = s.estimate_id
+                WHERE s.estimate_id = $1 AND e.user_id = $2 AND e.deleted_at IS NULL
+                ORDER BY s.version DESC
+                LIMIT $3
+            """, estimate_id, user_id, limit)
+            return decode_all(EstimateSnapshot, rows)
+
+    async def diff_estimate_snapshots(self, estimate_id: int, user_id: int,
+                                      from_version: int, to_version: Optional[int] = None) -> List[SnapshotChange]:
+        """
+        Сравнение версии сметы с другой версией или с текущим состоянием
+
+        Позиции сопоставляются по названию, возвращаются только различия.
+        """
+        async with self._acquire(read=True) as conn:
+            rows = await conn.fetch("""
+                WITH owner AS (
+                    SELECT id FROM estimates WHERE id = $1 AND user_id = $2 AND deleted_at IS NULL
+                ), prev AS (
+                    SELECT x.n AS name, SUM(x.h) AS duration, SUM(x.c) AS cost
+                    FROM estimate_snapshots s
+                    JOIN owner o ON o.id = s.estimate_id,
+                         jsonb_to_recordset(s.items) AS x(n text, h numeric, c numeric)
+                    WHERE s.version = $3
+                    GROUP BY x.n
+                ), curr AS (
+                    SELECT x.n AS name, SUM(x.h) AS duration, SUM(x.c) AS cost
+                    FROM estimate_snapshots s
+                    JOIN owner o ON o.id = s.estimate_id,
+                         jsonb_to_recordset(s.items) AS x(n text, h numeric, c numeric)
+                    WHERE $4::int IS NOT NULL AND s.version = $4
+                    GROUP BY x.n
+                    UNION ALL
+                    SELECT i.name, SUM(i.duration), SUM(i.cost)
+                    FROM estimate_items i
+                    JOIN owner o ON o.id = i.estimate_id
+                    WHERE $4::int IS NULL
+                    GROUP BY i.name
+                )
+                SELECT COALESCE(c.name, p.name) AS name,
+                       CASE WHEN p.name IS NULL THEN 'added'
+                            WHEN c.name IS NULL THEN 'removed'
+                            ELSE 'changed' END AS change,
+                       p.duration AS old_duration, p.cost AS old_cost,
+                       c.duration AS new_duration, c.cost AS new_cost
+                FROM prev p
+                FULL JOIN curr c ON c.name = p.name
+                WHERE p.name IS NULL OR c.name IS NULL
+                   OR p.duration <> c.duration OR p.cost <> c.cost
+                ORDER BY change, name
+            """, estimate_id, user_id, from_version, to_version)
+            return decode_all(SnapshotChange, rows)
+
+    # === МЕТОДЫ ДЛЯ АРХИВА СМЕТ ===
+
+    async def archive_inactive_estimates(self, months: int) -> int:
+        """
+        Перенос позиций смет, не изменявшихся months месяцев, в архив
+
+        Позиции сметы сворачиваются в один JSONB документ в estimate_archives
+        и удаляются из estimate_items; сама смета с итогами остается на месте
+        со статусом archived. Сметы обрабатываются пачками по ARCHIVE_BATCH_SIZE,
+        каждая пачка - отдельная короткая транзакция из одного запроса.
+
+        Returns:
+            int: количество перенесенных в архив смет
+        """
+        total = 0
+        while True:
+            async with self._acquire() as conn:
+                archived = await conn.fetchval("""
+                    WITH candidates AS (
+                        SELECT id, status FROM estimates
+                        WHERE deleted_at IS NULL AND status <> 'archived'
+                          AND updated_at < CURRENT_TIMESTAMP - make_interval(months => $1)
+                        ORDER BY updated_at
+                        LIMIT $2
+                        FOR UPDATE SKIP LOCKED
+                    ), archived AS (
+                        INSERT INTO estimate_archives (estimate_id, status, items)
+                        SELECT c.id, c.status,
+                               COALESCE((
+                                   SELECT jsonb_agg(jsonb_strip_nulls(jsonb_build_object(
+                                              'n', i.name,
+                                              'd', NULLIF(i.description, ''),
+                                              'h', i.duration,
+                                              'c', i.cost,
+                                              'q', NULLIF(i.quantity, 1),
+                                              'u', NULLIF(i.unit, 'шт')
+                                          )) ORDER BY i.sort_order, i.created_at)
+                                   FROM estimate_items i
+                                   WHERE i.estimate_id = c.id
+                               ), '[]'::jsonb)
+                        FROM candidates c
+                        RETURNING estimate_id
+                    ), removed AS (
+                        DELETE FROM estimate_items i
+                        USING archived a
+                        WHERE i.estimate_id = a.estimate_id
+                    ), marked AS (
+                        UPDATE estimates e
+                        SET status = 'archived', version = e.version + 1
+                        FROM archived a
+                        WHERE e.id = a.estimate_id
+                        RETURNING e.id
+                    )
+                    SELECT COUNT(*) FROM marked
+                """, months, ARCHIVE_BATCH_SIZE)
+            total += archived
+            if archived < ARCHIVE_BATCH_SIZE:
+                break
+            await asyncio.sleep(ARCHIVE_BATCH_PAUSE)
+        
+        if total:
+            self.logger.info(f"В архив перенесено смет: {total}")
+        return total
+
+    async def unarchive_estimate(self, estimate_id: int, user_id: int) -> Optional[Estimate]:
+        """Возврат позиций архивной сметы в рабочие таблицы одним запросом"""
+        async with self._acquire() as conn:
+            rows = await self._restore_archived(conn, [estimate_id], user_id)
+            return decode(Estimate, rows[0]) if rows else None
+
+    async def _restore_archived(self, conn: Connection, estimate_ids: List[int],
+                                user_id: Optional[int] = None) -> List[Any]:
+        """
+        Возврат позиций архивных смет из списка; остальные сметы не меняются
+
+        Вызывается перед любой записью в смету, ее копированием и сохранением
+        версии, чтобы они видели все позиции. Восстановленные позиции встают
+        после уже имеющихся, итоги пересчитываются по всем позициям.
+        """
+        return await conn.fetch("""
+            WITH restored AS (
+                DELETE FROM estimate_archives a
+                USING estimates e
+                WHERE a.estimate_id = ANY($1::int[])
+                  AND e.id = a.estimate_id AND e.deleted_at IS NULL
+                  AND ($2::int IS NULL OR e.user_id = $2)
+                RETURNING a.estimate_id, a.status, a.items
+            ), present AS (
+                SELECT r.estimate_id,
+                       COALESCE(MAX(i.sort_order), 0) AS max_order,
+                       COALESCE(SUM(i.cost), 0) AS total_cost,
+                       COALESCE(SUM(i.duration), 0) AS total_duration
+                FROM restored r
+                LEFT JOIN estimate_items i ON i.estimate_id = r.estimate_id
+                GROUP BY r.estimate_id
+            ), archived_items AS (
+                SELECT r.estimate_id, x.*
+                FROM restored r,
+                     ROWS FROM (jsonb_to_recordset(r.items)
+                                AS (n text, d text, h numeric, c numeric, q numeric, u text))
+                     WITH ORDINALITY AS x(n, d, h, c, q, u, position)
+            ), items AS (
+                INSERT INTO estimate_items
+                    (estimate_id, name, description, duration, cost, unit, quantity, sort_order)
+                SELECT x.estimate_id, x.n, COALESCE(x.d, ''), x.h, x.c,
+                       COALESCE(x.u, 'шт'), COALESCE(x.q, 1), p.max_order + x.position
+                FROM archived_items x
+                JOIN present p ON p.estimate_id = x.estimate_id
+            ), archived_totals AS (
+                SELECT estimate_id, SUM(c) AS total_cost, SUM(h) AS total_duration
+                FROM archived_items
+                GROUP BY estimate_id
+            )
+            UPDATE estimates e
+            SET status = r.status,
+                total_cost = p.total_cost + COALESCE(t.total_cost, 0),
+                total_duration = p.total_duration + COALESCE(t.total_duration, 0),
+                version = e.version + 1
+            FROM restored r
+            JOIN present p ON p.estimate_id = r.estimate_id
+            LEFT JOIN archived_totals t ON t.estimate_id = r.estimate_id
+            WHERE e.id = r.estimate_id
+            RETURNING e.*, jsonb_array_length(r.items) + (
+                SELECT COUNT(*) FROM estimate_items i WHERE i.estimate_id = e.id
+            ) as items_count
+        """, estimate_ids, user_id)
 
     # === МЕТОДЫ ДЛЯ РАБОТЫ С ШАБЛОНАМИ ===
     
     async def create_work_template(self, user_id: int, name: str, description: str, 
-                                 category: str, default_duration: float, default_cost: float) -> int:
+                                 category: str, default_duration: int, default_cost: int) -> int:
         """Создание шаблона работы"""
-        async with self.pool.acquire() as conn:
+        async with self._acquire() as conn:
             template_id = await conn.fetchval("""
                 INSERT INTO work_templates (user_id, name, description, category, default_duration, default_cost)
                 VALUES ($1, $2, $3, $4, $5, $6)
                 RETURNING id
             """, user_id, name, description, category, default_duration, default_cost)
-            return template_id
+        self._templates_changed(user_id)
+        return template_id
 
-    async def get_user_templates(self, user_id: int) -> List[Dict]:
-        """Получение шаблонов пользователя"""
-        async with self.pool.acquire() as conn:
+    def _templates_changed(self, user_id: int) -> None:
+        """Оповещение подписчиков об изменении личных шаблонов пользователя"""
+        for listener in self.template_listeners:
+            listener(user_id)
+
+    async def import_templates(self, user_id: int, records: ImportRecords) -> List[WorkTemplate]:
+        """Импорт шаблонов: COPY во временную таблицу и одна вставка"""
+        async with self._acquire() as conn:
+            async with conn.transaction():
+                await self._copy_to_import_table(conn, records)
+                rows = await conn.fetch("""
+                    INSERT INTO work_templates
+                        (user_id, name, description, category, default_duration, default_cost)
+                    SELECT $1, i.name, i.description, COALESCE(i.category, 'Без категории'),
+                           i.duration / 100.0, i.cost / 100.0
+                    FROM import_items i
+                    ORDER BY i.line_no
+                    RETURNING *
+                """, user_id)
+        self._templates_changed(user_id)
+        return decode_all(WorkTemplate, rows)
+
+    async def get_user_templates(self, user_id: int) -> List[WorkTemplate]:
+        """Получение шаблонов пользователя вместе с публичными"""
+        public_templates = await self.public_templates.get(self.pool)
+        
+        # Публичный каталог берется из кэша, из базы читаются только личные шаблоны
+        personal_templates = await self.get_personal_templates(user_id)
+        return merge_templates(personal_templates, public_templates)
+
+    async def get_personal_templates(self, user_id: int) -> List[WorkTemplate]:
+        """Личные шаблоны пользователя по убыванию популярности"""
+        async with self._acquire(read=True) as conn:
             rows = await conn.fetch("""
                 SELECT * FROM work_templates 
-                WHERE user_id = $1 OR is_public = TRUE
-                ORDER BY usage_count DESC, created_at DESC
+                WHERE user_id = $1 AND is_public IS NOT TRUE
+                ORDER BY popularity DESC, created_at DESC
             """, user_id)
-            return [dict(row) for row in rows]
+            return decode_all(WorkTemplate, rows)
+
+    async def search_user_templates(self, user_id: int, query: str, limit: int = 20) -> List[WorkTemplate]:
+        """Поиск личных шаблонов по подстроке и триграммному сходству"""
+        # Спецсимволы LIKE из пользовательского ввода не нужны
+        query = query.replace('%', '').replace('_', '').replace('\\', '')
+        async with self._acquire(read=True) as conn:
+            rows = await conn.fetch("""
+                SELECT * FROM work_templates
+                WHERE user_id = $1 AND is_public IS NOT TRUE
+                  AND ($2 = '' OR name ILIKE '%' || $2 || '%' OR name % $2)
+                ORDER BY similarity(name, $2) DESC, popularity DESC
+                LIMIT $3
+            """, user_id, query, limit)
+            return decode_all(WorkTemplate, rows)
 
-    async def get_template_by_id(self, template_id: int) -> Optional[Dict]:
+    async def get_template_by_id(self, template_id: int) -> Optional[WorkTemplate]:
         """Получение шаблона по ID"""
-        async with self.pool.acquire() as conn:
+        async with self._acquire(read=True) as conn:
             row = await conn.fetchrow("""
                 SELECT * FROM work_templates WHERE id = $1
             """, template_id)
-            return dict(row) if row else None
+            return decode(WorkTemplate, row)
 
     async def increment_template_usage(self, template_id: int) -> None:
-        """Увеличение счетчика использования шаблона"""
-        async with self.pool.acquire() as conn:
-            await conn.execute("""
-                UPDATE work_templates 
-                SET usage_count = usage_count + 1,
-                    updated_at = CURRENT_TIMESTAMP
-                WHERE id = $1
-            """, template_id)
+        """Увеличение счетчика использования шаблона (запись откладывается)"""
+        self.template_usage.add(template_id)
+
+    async def flush_template_usage(self) -> None:
+        """Запись накопленных использований шаблонов одним запросом"""
+        flushed = await self.template_usage.flush(self.pool)
+        if flushed:
+            self.logger.debug(f"Записаны использования {flushed} шаблонов")
+
+    async def decay_template_popularity(self) -> None:
+        """
+        Приведение популярности шаблонов к текущему моменту
+
+        Пересчитываются только шаблоны, чья популярность заметно изменилась
+        с прошлого пересчета (старше POPULARITY_DECAY_MIN_AGE); совсем малая
+        обнуляется. Оповещение кэшей и пересчет статистики для этого
+        оператора отключены (см. init.d/018-alter-template-popularity-decay.sql).
+        """
+        async with self._acquire() as conn:
+            async with conn.transaction():
+                await conn.execute("SET LOCAL estimates_app.popularity_decay = 'on'")
+                result = await conn.execute("""
+                    UPDATE work_templates
+                    SET popularity = CASE
+                            WHEN decayed_popularity(popularity, popularity_updated_at) < $2 THEN 0
+                            ELSE decayed_popularity(popularity, popularity_updated_at)
+                        END,
+                        popularity_updated_at = CURRENT_TIMESTAMP
+                    WHERE popularity > 0
+                      AND popularity_updated_at < CURRENT_TIMESTAMP - make_interval(secs => $1)
+                """, POPULARITY_DECAY_MIN_AGE, POPULARITY_FLOOR)
+            self.logger.info(f"Популярность шаблонов пересчитана: {result}")
 
     async def delete_template(self, template_id: int, user_id: int) -> bool:
         """Удаление шаблона"""
-        async with self.pool.acquire() as conn:
+        async with self._acquire() as conn:
             result = await conn.execute("""
                 DELETE FROM work_templates 
                 WHERE id = $1 AND user_id = $2
             """, template_id, user_id)
-            return result != "DELETE 0" 
\ No newline at end of file
+        if result == "DELETE 0":
+            return False
+        self._templates_changed(user_id)
+        return True
+
+    # === МЕТОДЫ ДЛЯ РАБОТЫ С НАБОРАМИ ШАБЛОНОВ ===
+
+    async def create_template_bundle(self, user_id: int, name: str, items: List[Tuple[int, int]]) -> int:
+        """Создание набора шаблонов из пар (template_id, quantity в сотых долях)"""
+        async with self._acquire() as conn:
+            async with conn.transaction():
+                bundle_id = await conn.fetchval("""
+                    INSERT INTO template_bundles (user_id, name)
+                    VALUES ($1, $2)
+                    RETURNING id
+                """, user_id, name)
+                
+                # В набор попадают только доступные пользователю шаблоны
+                await conn.execute("""
+                    INSERT INTO template_bundle_items (bundle_id, position, template_id, quantity)
+                    SELECT $1, i.position, i.template_id, i.quantity / 100.0
+                    FROM unnest($2::int[], $3::bigint[])
+                         WITH ORDINALITY AS i(template_id, quantity, position)
+                    JOIN work_templates t ON t.id = i.template_id
+                    WHERE t.user_id = $4 OR t.is_public = TRUE
+                """, bundle_id,
+                    [template_id for template_id, _ in items],
+                    [quantity for _, quantity in items],
+                    user_id)
+                return bundle_id
+
+    async def get_user_bundles(self, user_id: int) -> List[TemplateBundle]:
+        """Получение наборов шаблонов пользователя с итогами"""
+        async with self._acquire(read=True) as conn:
+            rows = await conn.fetch("""
+                SELECT b.*,
+                       COUNT(bi.template_id) as items_count,
+                       COALESCE(SUM(t.default_cost * bi.quantity), 0) as total_cost,
+                       COALESCE(SUM(t.default_duration * bi.quantity), 0) as total_duration
+                FROM template_bundles b
+                LEFT JOIN template_bundle_items bi ON bi.bundle_id = b.id
+                LEFT JOIN work_templates t ON t.id = bi.template_id
+                WHERE b.user_id = $1
+                GROUP BY b.id
+                ORDER BY b.created_at DESC
+            """, user_id)
+            return decode_all(TemplateBundle, rows)
+
+    async def get_bundle_items(self, bundle_id: int, user_id: int) -> List[BundleItem]:
+        """Получение состава набора шаблонов"""
+        async with self._acquire(read=True) as conn:
+            rows = await conn.fetch("""
+                SELECT bi.position, bi.quantity, t.id as template_id, t.name,
+                       t.default_duration, t.default_cost
+                FROM template_bundle_items bi
+                JOIN template_bundles b ON b.id = bi.bundle_id
+                JOIN work_templates t ON t.id = bi.template_id
+                WHERE bi.bundle_id = $1 AND b.user_id = $2
+                ORDER BY bi.position
+            """, bundle_id, user_id)
+            return decode_all(BundleItem, rows)
+
+    async def delete_template_bundle(self, bundle_id: int, user_id: int) -> bool:
+        """Удаление набора шаблонов"""
+        async with self._acquire() as conn:
+            result = await conn.execute("""
+                DELETE FROM template_bundles
+                WHERE id = $1 AND user_id = $2
+            """, bundle_id, user_id)
+            return result != "DELETE 0"
+
+    async def apply_template_bundle(self, bundle_id: int, user_id: int, estimate_id: int) -> int:
+        """Добавление всех шаблонов набора в смету одним запросом"""
+        async def write(conn: Connection) -> List[Any]:
+            version = await self._get_estimate_version(conn, estimate_id)
+            if version is None:
+                return []
+            
+            # Вставка выполняется в CTE, а запрос возвращает использованные шаблоны
+            template_ids = await conn.fetch("""
+                WITH source AS (
+                    SELECT bi.position, bi.quantity, t.id, t.name, t.description,
+                           t.default_duration, t.default_cost
+                    FROM template_bundle_items bi
+                    JOIN template_bundles b ON b.id = bi.bundle_id
+                    JOIN work_templates t ON t.id = bi.template_id
+                    JOIN estimates e ON e.id = $3 AND e.user_id = $2 AND e.deleted_at IS NULL
+                    WHERE bi.bundle_id = $1 AND b.user_id = $2
+                ), base AS (
+                    SELECT COALESCE(MAX(sort_order), 0) AS max_order
+                    FROM estimate_items WHERE estimate_id = $3
+                ), inserted AS (
+                    INSERT INTO estimate_items (estimate_id, name, description, duration, cost, sort_order)
+                    SELECT $3,
+                           CASE WHEN s.quantity = 1 THEN s.name
+                                ELSE LEFT(s.name, 240) || ' ×' || TRIM_SCALE(s.quantity)::text END,
+                           COALESCE(s.description, ''),
+                           s.default_duration * s.quantity,
+                           s.default_cost * s.quantity,
+                           base.max_order + ROW_NUMBER() OVER (ORDER BY s.position)
+                    FROM source s, base
+                )
+                SELECT id FROM source
+            """, bundle_id, user_id, estimate_id)
+            
+            if template_ids:
+                await self._update_estimate_totals(conn, estimate_id, version)
+            return template_ids
+        
+        template_ids = await self._write_estimates(write)
+        
+        # Счетчики использования всех шаблонов набора записываются одним пакетом
+        for row in template_ids:
+            self.template_usage.add(row['id'])
+        
+        return len(template_ids)
+
+    # === МЕТОДЫ ДЛЯ ПОИСКА ===
+
+    async def search_estimates(self, user_id: int, query: str, limit: int = 10,
+                               after: Optional[Tuple[float, int]] = None) -> List[EstimateMatch]:
+        """
+        Поиск смет по словам и подстроке в названии, описании и позициях
+
+        Слова ищутся по search_vector (GIN), подстрока - по триграммам.
+        Ранг слов приводится к [0, 1) и получает WORD_MATCH_BONUS, поэтому
+        совпадение по словам всегда выше совпадения только по подстроке
+        (сходство триграмм, [0, 1]); совпадения в позициях умножаются
+        на ITEM_MATCH_WEIGHT. Результаты отсортированы по релевантности;
+        следующая страница запрашивается по (score, id) последнего результата.
+        """
+        # Спецсимволы LIKE из пользовательского ввода не нужны
+        pattern = query.replace('%', '').replace('_', '').replace('\\', '').strip()
+        if len(pattern) < MIN_SUBSTRING_LENGTH:
+            pattern = None
+        after_score, after_id = after if after else (None, None)
+        
+        async with self._acquire(read=True) as conn:
+            rows = await conn.fetch("""
+                WITH q AS (
+                    SELECT websearch_to_tsquery('russian', $2) AS query
+                ), matches AS (
+                    SELECT e.id, $8 + ts_rank(e.search_vector, q.query, 32) AS score, NULL::text AS item_name
+                    FROM estimates e, q
+                    WHERE e.user_id = $1 AND e.search_vector @@ q.query
+                    UNION ALL
+                    SELECT e.id, similarity(e.title, $3), NULL
+                    FROM estimates e
+                    WHERE $3 IS NOT NULL AND e.user_id = $1 AND e.title ILIKE '%' || $3 || '%'
+                    UNION ALL
+                    -- Описание длиннее запроса: сходство с лучшим отрезком текста
+                    SELECT e.id, word_similarity($3, e.description), NULL
+                    FROM estimates e
+                    WHERE $3 IS NOT NULL AND e.user_id = $1 AND e.description ILIKE '%' || $3 || '%'
+                    UNION ALL
+                    SELECT i.estimate_id, ($8 + ts_rank(i.search_vector, q.query, 32)) * $4, i.name
+                    FROM estimate_items i
+                    JOIN estimates e ON e.id = i.estimate_id, q
+                    WHERE e.user_id = $1 AND i.search_vector @@ q.query
+                    UNION ALL
+                    SELECT i.estimate_id, similarity(i.name, $3) * $4, i.name
+                    FROM estimate_items i
+                    JOIN estimates e ON e.id = i.estimate_id
+                    WHERE $3 IS NOT NULL AND e.user_id = $1 AND i.name ILIKE '%' || $3 || '%'
+                    UNION ALL
+                    -- Позиции архивных смет: первая подходящая позиция из документа
+                    SELECT a.estimate_id, ($8 + ts_rank(to_tsvector('russian', m.name), q.query, 32)) * $4, m.name
+                    FROM estimate_archives a
+                    JOIN estimates e ON e.id = a.estimate_id, q,
+                    LATERAL (
+                        SELECT x->>'n' AS name FROM jsonb_array_elements(a.items) x
+                        WHERE to_tsvector('russian', x->>'n') @@ q.query
+                        LIMIT 1
+                    ) m
+                    WHERE e.user_id = $1 AND a.search_vector @@ q.query
+                    UNION ALL
+                    SELECT a.estimate_id, similarity(m.name, $3) * $4, m.name
+                    FROM estimate_archives a
+                    JOIN estimates e ON e.id = a.estimate_id,
+                    LATERAL (
+                        SELECT x->>'n' AS name FROM jsonb_array_elements(a.items) x
+                        WHERE x->>'n' ILIKE '%' || $3 || '%'
+                        LIMIT 1
+                    ) m
+                    WHERE $3 IS NOT NULL AND e.user_id = $1 AND a.item_names ILIKE '%' || $3 || '%'
+                ), ranked AS (
+                    SELECT id,
+                           MAX(score)::float8 AS score,
+                           (ARRAY_AGG(item_name ORDER BY score DESC) FILTER (WHERE item_name IS NOT NULL))[1]
+                               AS matched_item
+                    FROM matches
+                    GROUP BY id
+                )
+                SELECT e.id, e.title, r.score, e.total_cost, e.total_duration, e.updated_at, r.matched_item
+                FROM ranked r
+                JOIN estimates e ON e.id = r.id AND e.deleted_at IS NULL
+                WHERE $5::float8 IS NULL OR (r.score, r.id) < ($5::float8, $6::int)
+                ORDER BY r.score DESC, r.id DESC
+                LIMIT $7
+            """, user_id, query, pattern, ITEM_MATCH_WEIGHT, after_score, after_id, limit,
+                WORD_MATCH_BONUS)
+            return decode_all(EstimateMatch, rows)
+
+    # === МЕТОДЫ ДЛЯ ИНДЕКСА ПОДСКАЗОК ===
+
+    async def get_indexable_templates(self) -> List[WorkTemplate]:
+        """Получение всех активных шаблонов для индекса подсказок"""
+        async with self._acquire(read=True) as conn:
+            rows = await conn.fetch("""
+                SELECT id, user_id, name, description, default_duration, default_cost, is_public
+                FROM work_templates
+                WHERE is_active
+            """)
+            return decode_all(WorkTemplate, rows)
+
+    async def get_items_history(self) -> List[Dict]:
+        """Получение истории позиций смет, сгруппированной по пользователю и названию"""
+        async with self._acquire(read=True) as conn:
+            rows = await conn.fetch("""
+                SELECT e.user_id,
+                       MIN(ei.name) as name,
+                       AVG(ei.duration) as duration,
+                       AVG(ei.cost) as cost
+                FROM estimate_items ei
+                JOIN estimates e ON e.id = ei.estimate_id
+                WHERE e.deleted_at IS NULL
+                GROUP BY e.user_id, LOWER(ei.name)
+            """)
+            return [dict(row) for row in rows] 
\ No newline at end of file
@@ -1,150 +1,243 @@
 """
 Модели данных для базы данных
+
+Деньги хранятся в копейках, время и количество - в сотых долях (см. codecs.py).
 """
-from dataclasses import dataclass
+from dataclasses import dataclass, asdict, field, fields, MISSING
 from datetime import datetime
-from typing import Optional, Dict, Any
+from operator import itemgetter
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, Type, TypeVar
+
+from asyncpg import Record
+
+ModelT = TypeVar('ModelT', bound='Model')
 
 
-@dataclass
-class User:
+class Model:
+    """Базовый класс моделей"""
+    __slots__ = ()
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Преобразование в словарь"""
+        return asdict(self)
+
+
+@dataclass(slots=True)
+class User(Model):
     """Модель пользователя"""
     id: int
     telegram_id: int
-    username: Optional[str]
-    first_name: Optional[str]
-    last_name: Optional[str]
-    created_at: datetime
-    updated_at: Optional[datetime] = None
+    username: Optional[str] = None
+    first_name: Optional[str] = None
+    last_name: Optional[str] = None
+    language_code: Optional[str] = 'ru'
     is_active: bool = True
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
 
-    def to_dict(self) -> Dict[str, Any]:
-        """Преобразование в словарь"""
-        return {
-            'id': self.id,
-            'telegram_id': self.telegram_id,
-            'username': self.username,
-            'first_name': self.first_name,
-            'last_name': self.last_name,
-            'created_at': self.created_at,
-            'updated_at': self.updated_at,
-            'is_active': self.is_active
-        }
-
-
-@dataclass
-class Estimate:
+
+@dataclass(slots=True)
+class UserStats(Model):
+    """Модель сводной статистики пользователя"""
+    user_id: int
+    estimates_count: int = 0
+    total_cost: int = 0
+    total_duration: int = 0
+    templates_count: int = 0
+    top_templates: List[Any] = field(default_factory=list)
+    updated_at: Optional[datetime] = None
+
+
+@dataclass(slots=True)
+class Estimate(Model):
     """Модель сметы"""
     id: int
     user_id: int
     title: str
-    description: Optional[str]
-    created_at: datetime
-    updated_at: Optional[datetime] = None
-    total_cost: float = 0.0
-    total_duration: float = 0.0
+    description: Optional[str] = None
     status: str = "draft"  # draft, active, completed, archived
+    currency: str = "RUB"
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+    total_cost: int = 0
+    total_duration: int = 0
+    version: int = 0
+    items_count: int = 0
 
-    def to_dict(self) -> Dict[str, Any]:
-        """Преобразование в словарь"""
-        return {
-            'id': self.id,
-            'user_id': self.user_id,
-            'title': self.title,
-            'description': self.description,
-            'created_at': self.created_at,
-            'updated_at': self.updated_at,
-            'total_cost': self.total_cost,
-            'total_duration': self.total_duration,
-            'status': self.status
-        }
-
-
-@dataclass
-class EstimateItem:
+
+@dataclass(slots=True)
+class EstimateMatch(Model):
+    """Найденная смета с оценкой релевантности"""
+    id: int
+    title: str
+    score: float
+    total_cost: int = 0
+    total_duration: int = 0
+    updated_at: Optional[datetime] = None
+    matched_item: Optional[str] = None  # позиция, в которой найден запрос
+
+
+@dataclass(slots=True)
+class EstimateItem(Model):
     """Модель позиции сметы"""
     id: int
     estimate_id: int
     name: str
-    description: Optional[str]
-    duration: float
-    cost: float
-    created_at: datetime
+    description: Optional[str] = None
+    duration: int = 0
+    cost: int = 0
+    unit: Optional[str] = 'шт'
+    quantity: int = 100
+    sort_order: int = 0
+    created_at: Optional[datetime] = None
     updated_at: Optional[datetime] = None
-    order_index: int = 0
 
-    def to_dict(self) -> Dict[str, Any]:
-        """Преобразование в словарь"""
-        return {
-            'id': self.id,
-            'estimate_id': self.estimate_id,
-            'name': self.name,
-            'description': self.description,
-            'duration': self.duration,
-            'cost': self.cost,
-            'created_at': self.created_at,
-            'updated_at': self.updated_at,
-            'order_index': self.order_index
-        }
-
-
-@dataclass
-class WorkTemplate:
+
+@dataclass(slots=True)
+class WorkTemplate(Model):
     """Модель шаблона работы"""
     id: int
     user_id: int
     name: str
-    description: Optional[str]
-    category: str
-    default_duration: float
-    default_cost: float
+    description: Optional[str] = None
+    default_duration: int = 0
+    default_cost: int = 0
+    category: Optional[str] = None
+    is_active: bool = True
     usage_count: int = 0
-    created_at: datetime
+    created_at: Optional[datetime] = None
     updated_at: Optional[datetime] = None
     is_public: bool = False
+    popularity: float = 0.0
+    popularity_updated_at: Optional[datetime] = None
 
-    def to_dict(self) -> Dict[str, Any]:
-        """Преобразование в словарь"""
-        return {
-            'id': self.id,
-            'user_id': self.user_id,
-            'name': self.name,
-            'description': self.description,
-            'category': self.category,
-            'default_duration': self.default_duration,
-            'default_cost': self.default_cost,
-            'usage_count': self.usage_count,
-            'created_at': self.created_at,
-            'updated_at': self.updated_at,
-            'is_public': self.is_public
-        }
-
-
-@dataclass
-class UserSettings:
+
+@dataclass(slots=True)
+class UserSettings(Model):
     """Модель настроек пользователя"""
     id: int
     user_id: int
-    default_hourly_rate: Optional[float] = None
+    default_hourly_rate: Optional[int] = None
     timezone: str = "UTC"
     language: str = "ru"
     notifications_enabled: bool = True
     ai_assistance_enabled: bool = True
-    created_at: datetime
+    created_at: Optional[datetime] = None
     updated_at: Optional[datetime] = None
 
-    def to_dict(self) -> Dict[str, Any]:
-        """Преобразование в словарь"""
-        return {
-            'id': self.id,
-            'user_id': self.user_id,
-            'default_hourly_rate': self.default_hourly_rate,
-            'timezone': self.timezone,
-            'language': self.language,
-            'notifications_enabled': self.notifications_enabled,
-            'ai_assistance_enabled': self.ai_assistance_enabled,
-            'created_at': self.created_at,
-            'updated_at': self.updated_at
-        }
-
- 
\ No newline at end of file
+
+@dataclass(slots=True)
+class TemplateBundle(Model):
+    """Модель набора шаблонов"""
+    id: int
+    user_id: int
+    name: str
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+    items_count: int = 0
+    total_duration: int = 0
+    total_cost: int = 0
+
+
+@dataclass(slots=True)
+class BundleItem(Model):
+    """Модель шаблона в составе набора"""
+    template_id: int
+    name: str
+    position: int = 0
+    quantity: int = 100
+    default_duration: int = 0
+    default_cost: int = 0
+
+
+@dataclass(slots=True)
+class EstimateSnapshot(Model):
+    """Модель сохраненной версии сметы"""
+    version: int
+    title: str
+    total_cost: int = 0
+    total_duration: int = 0
+    items_count: int = 0
+    created_at: Optional[datetime] = None
+
+
+@dataclass(slots=True)
+class SnapshotChange(Model):
+    """Различие позиции между версиями сметы"""
+    name: str
+    change: str  # added, removed, changed
+    old_duration: Optional[int] = None
+    old_cost: Optional[int] = None
+    new_duration: Optional[int] = None
+    new_cost: Optional[int] = None
+
+
+# === ДЕКОДИРОВАНИЕ ЗАПИСЕЙ ===
+
+# Конструкторы по модели и набору столбцов запроса
+_decoders: Dict[Tuple[type, Tuple[str, ...]], Callable[[Record], Any]] = {}
+
+
+def _compile_decoder(model: type, keys: Tuple[str, ...]) -> Callable[[Record], Any]:
+    """
+    Сборка конструктора, берущего поля модели прямо по позициям записи
+
+    Столбцы, которых нет в модели, пропускаются; поля, которых нет
+    в запросе, получают значения по умолчанию.
+    """
+    # Как и в dict(record), из одноименных столбцов берется последний
+    positions = {key: index for index, key in enumerate(keys)}
+
+    names: List[str] = []
+    indexes: List[int] = []
+    for model_field in fields(model):
+        index = positions.get(model_field.name)
+        if index is not None:
+            names.append(model_field.name)
+            indexes.append(index)
+        elif model_field.default is MISSING and model_field.default_factory is MISSING:
+            raise KeyError(f"В записи нет столбца {model_field.name} для модели {model.__name__}")
+
+    if not indexes:
+        return lambda r: model()
+
+    # itemgetter с одним индексом возвращает значение, а не кортеж
+    getter = itemgetter(*indexes) if len(indexes) > 1 else lambda r: (r[indexes[0]],)
+
+    model_names = [model_field.name for model_field in fields(model)]
+    if names == model_names[:len(names)]:
+        # Поля из записи идут первыми: остальные заполнит конструктор
+        return lambda r: model(*getter(r))
+
+    names_tuple = tuple(names)
+    return lambda r: model(**dict(zip(names_tuple, getter(r))))
+
+
+def _get_decoder(model: type, record: Record) -> Callable[[Record], Any]:
+    keys = tuple(record.keys())
+    decoder = _decoders.get((model, keys))
+    if decoder is None:
+        decoder = _decoders[(model, keys)] = _compile_decoder(model, keys)
+    return decoder
+
+
+def decode(model: Type[ModelT], record: Optional[Record]) -> Optional[ModelT]:
+    """Преобразование записи asyncpg в модель"""
+    if record is None:
+        return None
+    return _get_decoder(model, record)(record)
+
+
+def decode_all(model: Type[ModelT], records: Iterable[Record]) -> List[ModelT]:
+    """Преобразование списка записей одного запроса в модели"""
+    records = list(records)
+    if not records:
+        return []
+    decoder = _get_decoder(model, records[0])
+    return [decoder(record) for record in records]
+
+
+__all__ = [
+    'Model', 'User', 'UserStats', 'Estimate', 'EstimateMatch', 'EstimateItem', 'WorkTemplate', 'UserSettings',
+    'TemplateBundle', 'BundleItem', 'EstimateSnapshot', 'SnapshotChange', 'decode', 'decode_all'
+]
@@ -0,0 +1,49 @@
+"""
+Маршрутизация запросов между основной базой и репликой для чтения
+"""
+import time
+from contextvars import ContextVar
+from typing import Dict, Hashable, Optional
+
+# Пользователь, чье обновление сейчас обрабатывается (Telegram ID)
+current_user: ContextVar[Optional[Hashable]] = ContextVar("current_user", default=None)
+
+# Размер таблицы, после которого из нее вычищаются истекшие записи
+PRUNE_THRESHOLD = 1000
+
+
+class RecentWrites:
+    """
+    Пользователи, недавно писавшие в основную базу.
+
+    Пока окно не истекло, чтения такого пользователя идут в основную базу,
+    чтобы он видел свои изменения, даже если реплика отстает.
+    """
+
+    def __init__(self, window: float):
+        self.window = window
+        self._deadlines: Dict[Hashable, float] = {}
+
+    def mark(self, user: Optional[Hashable]) -> None:
+        """Отметка записи пользователя"""
+        if user is None or self.window <= 0:
+            return
+        now = time.monotonic()
+        self._deadlines[user] = now + self.window
+        if len(self._deadlines) > PRUNE_THRESHOLD:
+            self._prune(now)
+
+    def is_recent(self, user: Optional[Hashable]) -> bool:
+        """Писал ли пользователь в основную базу в пределах окна"""
+        if user is None:
+            return False
+        deadline = self._deadlines.get(user)
+        if deadline is None:
+            return False
+        if deadline <= time.monotonic():
+            del self._deadlines[user]
+            return False
+        return True
+
+    def _prune(self, now: float) -> None:
+        self._deadlines = {user: deadline for user, deadline in self._deadlines.items() if deadline > now}
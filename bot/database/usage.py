@@ -0,0 +1,94 @@
+"""
+Отложенная пакетная запись счетчиков использования шаблонов
+"""
+import asyncio
+import logging
+import time
+from collections import Counter
+from typing import Optional
+
+from asyncpg import Pool
+
+from bot.utils.metrics import metrics
+
+batch_size_histogram = metrics.histogram(
+    "template_usage_flush_batch_size", "Шаблонов в одной записи",
+    buckets=(1, 2, 5, 10, 25, 50, 100, 250, 500, 1000)
+)
+flush_lag_histogram = metrics.histogram(
+    "template_usage_flush_lag_seconds", "Задержка записи самого старого использования"
+)
+flush_duration_histogram = metrics.histogram(
+    "template_usage_flush_duration_seconds", "Длительность записи пакета"
+)
+flush_errors_counter = metrics.counter(
+    "template_usage_flush_errors_total", "Неудачные записи пакета"
+)
+pending_gauge = metrics.gauge(
+    "template_usage_pending", "Шаблонов с незаписанными использованиями"
+)
+
+
+class TemplateUsageBuffer:
+    """
+    Накопитель использований шаблонов.
+
+    Нажатия копятся в памяти и записываются одним UPDATE по массивам,
+    поэтому популярные публичные шаблоны не блокируются построчными обновлениями.
+    """
+
+    def __init__(self, logger: logging.Logger):
+        self.logger = logger
+        self._pending: Counter = Counter()
+        self._oldest: Optional[float] = None
+        self._lock = asyncio.Lock()
+
+    def add(self, template_id: int, delta: int = 1) -> None:
+        """Учет использования шаблона"""
+        if self._oldest is None:
+            self._oldest = time.monotonic()
+        self._pending[template_id] += delta
+        pending_gauge.set(len(self._pending))
+
+    async def flush(self, pool: Pool) -> int:
+        """Запись накопленных использований, возвращает размер пакета"""
+        async with self._lock:
+            if not self._pending:
+                return 0
+
+            pending, self._pending = self._pending, Counter()
+            oldest, self._oldest = self._oldest, None
+            pending_gauge.set(0)
+
+            template_ids = sorted(pending)
+            deltas = [pending[template_id] for template_id in template_ids]
+
+            started = time.monotonic()
+            try:
+                async with pool.acquire() as conn:
+                    await conn.execute("""
+                        UPDATE work_templates t
+                        SET usage_count = t.usage_count + d.delta,
+                            popularity = decayed_popularity(t.popularity, t.popularity_updated_at) + d.delta,
+                            popularity_updated_at = CURRENT_TIMESTAMP,
+                            updated_at = CURRENT_TIMESTAMP
+                        FROM unnest($1::int[], $2::int[]) AS d(id, delta)
+                        WHERE t.id = d.id
+                    """, template_ids, deltas)
+            except Exception as e:
+                # Возвращаем использования в буфер до следующей попытки
+                flush_errors_counter.inc()
+                self._pending.update(pending)
+                if oldest is not None and (self._oldest is None or oldest < self._oldest):
+                    self._oldest = oldest
+                pending_gauge.set(len(self._pending))
+                self.logger.error(f"Ошибка записи использований шаблонов: {e}")
+                raise
+
+            finished = time.monotonic()
+            batch_size_histogram.observe(len(template_ids))
+            flush_duration_histogram.observe(finished - started)
+            if oldest is not None:
+                flush_lag_histogram.observe(finished - oldest)
+
+            return len(template_ids)
@@ -2,6 +2,6 @@
 Обработчики сообщений и команд бота
 """
 
-from . import commands, messages, callbacks, inline
+from . import admin, commands, messages, callbacks, inline
 
-__all__ = ['commands', 'messages', 'callbacks', 'inline'] 
\ No newline at end of file
+__all__ = ['admin', 'commands', 'messages', 'callbacks', 'inline'] 
\ No newline at end of file
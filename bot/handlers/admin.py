@@ -0,0 +1,119 @@
+"""
+Служебные команды администраторов: метрики и профилирование работающего процесса
+"""
+import asyncio
+import logging
+import os
+import time
+from typing import Set
+
+from aiogram import Bot, Router, html
+from aiogram.filters import Command, CommandObject
+from aiogram.types import BufferedInputFile, Message
+
+from bot.services.profiling import (
+    SamplingProfiler, MemorySnapshots, DEFAULT_PROFILE_DURATION, MAX_PROFILE_DURATION
+)
+from bot.utils.decorators import error_handler, admin_only
+from bot.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+router = Router()
+
+# Профилируется процесс, получивший команду: в многопроцессном режиме
+# это процесс, которому распределитель отдает обновления администратора
+profiler = SamplingProfiler()
+memory = MemorySnapshots()
+
+# Длинный вывод метрик отправляется файлом (предел сообщения Telegram - 4096 символов)
+METRICS_MESSAGE_LIMIT = 3500
+
+# Ссылки на фоновые задачи профиля, чтобы их не собрал сборщик мусора
+_profile_tasks: Set[asyncio.Task] = set()
+
+
+def _report_file(prefix: str, report: str) -> BufferedInputFile:
+    filename = f"{prefix}-{os.getpid()}-{time.strftime('%Y%m%d-%H%M%S')}.txt"
+    return BufferedInputFile(report.encode('utf-8'), filename=filename)
+
+
+async def _send_profile(bot: Bot, chat_id: int, duration: float) -> None:
+    """Снятие профиля и отправка отчета в чат администратора"""
+    try:
+        report = await profiler.profile(duration)
+        top = profiler.hottest_handlers()[:5]
+        total = profiler.samples or 1
+        caption = "🔥 Профиль готов\n" + "\n".join(
+            f"{count / total:.1%} {name}" for name, count in top
+        ) if top else "🔥 Профиль готов: обработчики не занимали цикл"
+        await bot.send_document(chat_id, _report_file("profile", report), caption=caption)
+    except Exception as e:
+        logger.error(f"Ошибка снятия профиля: {e}", exc_info=True)
+        await bot.send_message(chat_id, f"⚠️ Не удалось снять профиль: {e}")
+
+
+@router.message(Command("metrics"))
+@error_handler
+@admin_only
+async def cmd_metrics(message: Message, command: CommandObject, **kwargs):
+    """Команда /metrics [префикс] - метрики процесса"""
+    prefix = (command.args or "").strip()
+    text = metrics.render(prefix)
+    if not text:
+        await message.answer(f"📈 Нет метрик с префиксом {prefix}" if prefix else "📈 Метрик пока нет")
+        return
+
+    header = f"📈 Метрики процесса {os.getpid()}"
+    if len(text) > METRICS_MESSAGE_LIMIT:
+        await message.answer_document(_report_file("metrics", text), caption=header)
+    else:
+        await message.answer(f"{header}\n<pre>{html.quote(text)}</pre>", parse_mode="HTML")
+
+
+@router.message(Command("profile"))
+@error_handler
+@admin_only
+async def cmd_profile(message: Message, command: CommandObject, bot: Bot, **kwargs):
+    """Команда /profile [секунды] - выборочный профиль процесса"""
+    if profiler.running:
+        await message.answer("⏳ Профиль уже снимается, дождитесь отчета")
+        return
+
+    try:
+        duration = int(command.args) if command.args else DEFAULT_PROFILE_DURATION
+    except ValueError:
+        await message.answer(f"Использование: /profile [секунды, 1-{MAX_PROFILE_DURATION}]")
+        return
+    duration = max(1, min(duration, MAX_PROFILE_DURATION))
+
+    logger.info(f"Администратор {message.from_user.id} запустил профиль на {duration} с")
+    # Ответ не ждет профиля, чтобы не занимать очередь обновлений администратора
+    task = asyncio.create_task(_send_profile(bot, message.chat.id, duration))
+    _profile_tasks.add(task)
+    task.add_done_callback(_profile_tasks.discard)
+    await message.answer(f"🔥 Профиль процесса {os.getpid()} снимается {duration} с, отчет придет файлом")
+
+
+@router.message(Command("memsnap"))
+@error_handler
+@admin_only
+async def cmd_memsnap(message: Message, command: CommandObject, **kwargs):
+    """Команда /memsnap [stop] - снимок памяти и разница с прошлым"""
+    if (command.args or "").strip() == "stop":
+        if memory.tracing:
+            memory.stop()
+            await message.answer("🧠 Трассировка памяти выключена")
+        else:
+            await message.answer("🧠 Трассировка памяти не включена")
+        return
+
+    first = not memory.tracing
+    logger.info(f"Администратор {message.from_user.id} снимает снимок памяти")
+    # Снимок и сравнение проходят по всем выделениям - вне событийного цикла
+    report = await asyncio.to_thread(memory.take)
+    caption = (
+        "🧠 Трассировка включена, это первый снимок. Следующий /memsnap покажет рост, "
+        "/memsnap stop выключит трассировку"
+        if first else f"🧠 Снимок {memory.taken}: рост с прошлого снимка в файле"
+    )
+    await message.answer_document(_report_file("memory", report), caption=caption)
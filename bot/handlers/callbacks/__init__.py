@@ -3,7 +3,7 @@ Callback обработчики бота
 """
 
 from aiogram import Router
-from . import main, estimates, templates, ai
+from . import main, estimates, items, templates, bundles, versions, search, ai
 
 def setup_callbacks_router() -> Router:
     """Настройка объединенного роутера для всех callback'ов"""
@@ -12,7 +12,11 @@ def setup_callbacks_router() -> Router:
     # Добавляем все роутеры в порядке приоритета
     router.include_router(main.router)
     router.include_router(estimates.router)
+    router.include_router(items.router)
     router.include_router(templates.router)
+    router.include_router(bundles.router)
+    router.include_router(versions.router)
+    router.include_router(search.router)
     router.include_router(ai.router)
     
     return router
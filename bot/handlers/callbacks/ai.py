@@ -3,7 +3,7 @@
 """
 import logging
 
-from aiogram import Router, F
+from aiogram import Router, F, html
 from aiogram.types import CallbackQuery
 from aiogram.fsm.context import FSMContext
 
@@ -11,10 +11,15 @@ from bot.keyboards.inline import get_ai_keyboard, get_back_keyboard
 from bot.keyboards.reply import get_cancel_keyboard
 from bot.utils.states import AIStates
 from bot.utils.decorators import error_handler
+from bot.utils.validators import validate_project_type
+from bot.services.gigachat import build_estimate_prompt
 
 logger = logging.getLogger(__name__)
 router = Router()
 
+# Количество похожих позиций, передаваемых в промпт
+AI_REFERENCE_ITEMS = 8
+
 
 @router.callback_query(F.data == "ai_assistant")
 @error_handler
@@ -93,4 +98,53 @@ async def callback_ai_consultation(callback: CallbackQuery, state: FSMContext, c
         reply_markup=get_cancel_keyboard()
     )
     
-    await state.set_state(AIStates.waiting_ai_consultation) 
\ No newline at end of file
+    await state.set_state(AIStates.waiting_ai_consultation) 
+
+@router.callback_query(F.data.startswith("ai_type:"))
+@error_handler
+async def callback_ai_project_type(callback: CallbackQuery, state: FSMContext, user_id: int,
+                                   retrieval_index, ai_client, **kwargs):
+    """Генерация сметы по описанию и типу проекта"""
+    project_type = callback.data.split(":")[1]
+    data = await state.get_data()
+    description = data.get('ai_description')
+    
+    if not validate_project_type(project_type) or not description:
+        await callback.answer("⚠️ Начните генерацию сметы заново")
+        return
+    
+    if not ai_client:
+        await callback.answer("⚠️ ИИ-помощник недоступен!")
+        return
+    
+    await callback.message.edit_text(
+        "🤖 <b>Генерирую смету...</b>\n\n"
+        "Это может занять до минуты.",
+        parse_mode="HTML"
+    )
+    
+    # В промпт попадают только похожие позиции из шаблонов и истории пользователя
+    reference_items = retrieval_index.search(description, user_id, top_k=AI_REFERENCE_ITEMS)
+    prompt = build_estimate_prompt(description, project_type, reference_items)
+    
+    try:
+        answer = await ai_client.complete(prompt)
+    except Exception as e:
+        logger.error(f"Ошибка генерации сметы ИИ: {e}")
+        await callback.message.edit_text(
+            "⚠️ ИИ-помощник не ответил. Попробуйте позже.",
+            reply_markup=get_back_keyboard("ai_assistant")
+        )
+        await state.clear()
+        return
+    
+    text = f"🤖 <b>Смета от ИИ</b>\n\n{html.quote(answer)}"
+    if reference_items:
+        text += f"\n\n<i>Учтено похожих работ из вашей истории: {len(reference_items)}</i>"
+    
+    await callback.message.edit_text(
+        text[:4096],
+        parse_mode="HTML",
+        reply_markup=get_back_keyboard("ai_assistant")
+    )
+    await state.clear()
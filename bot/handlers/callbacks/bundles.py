@@ -0,0 +1,274 @@
+"""
+Обработчики для наборов шаблонов работ
+"""
+import logging
+
+from aiogram import Router, F
+from aiogram.types import CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
+from aiogram.fsm.context import FSMContext
+
+from bot.keyboards.inline import get_bundle_selection_keyboard
+from bot.keyboards.reply import get_cancel_keyboard
+from bot.utils.states import BundleStates
+from bot.utils.decorators import error_handler
+from bot.utils.helpers import format_currency, format_duration, format_minor, MINOR_UNITS
+from bot.handlers.callbacks.estimates import callback_show_estimate
+
+logger = logging.getLogger(__name__)
+router = Router()
+
+# Количество шаблонов на экране выбора
+MAX_SELECTABLE_TEMPLATES = 30
+
+
+@router.callback_query(F.data == "template_bundles")
+@error_handler
+async def callback_template_bundles(callback: CallbackQuery, state: FSMContext, user_id: int, db, **kwargs):
+    """Список наборов шаблонов"""
+    await state.clear()
+    bundles = await db.get_user_bundles(user_id)
+
+    if not bundles:
+        text = """
+📦 <b>Наборы шаблонов</b>
+
+📝 У вас пока нет наборов.
+
+Соберите несколько шаблонов в набор, например
+«Лендинг», и добавляйте их в смету одним нажатием!
+"""
+    else:
+        text = f"📦 <b>Наборы шаблонов</b> ({len(bundles)})\n\n"
+        for bundle in bundles:
+            text += (
+                f"┣ <b>{bundle.name}</b> — {bundle.items_count} поз., "
+                f"{format_duration(bundle.total_duration)}, {format_currency(bundle.total_cost)}\n"
+            )
+
+    keyboard_buttons = [
+        [InlineKeyboardButton(text=f"📦 {bundle.name[:30]}", callback_data=f"show_bundle:{bundle.id}")]
+        for bundle in bundles[:10]
+    ]
+    keyboard_buttons.extend([
+        [InlineKeyboardButton(text="➕ Создать набор", callback_data="create_bundle")],
+        [InlineKeyboardButton(text="◀️ Назад", callback_data="work_templates")]
+    ])
+
+    await callback.message.edit_text(
+        text,
+        parse_mode="HTML",
+        reply_markup=InlineKeyboardMarkup(inline_keyboard=keyboard_buttons)
+    )
+
+
+@router.callback_query(F.data == "create_bundle")
+@error_handler
+async def callback_create_bundle(callback: CallbackQuery, state: FSMContext, **kwargs):
+    """Создание набора шаблонов"""
+    await callback.message.edit_text(
+        "📦 <b>Создание набора шаблонов</b>\n\n"
+        "Введите название набора:\n"
+        "<i>Например: 'Лендинг под ключ'</i>",
+        parse_mode="HTML"
+    )
+    await callback.message.answer(
+        "Введите название набора:",
+        reply_markup=get_cancel_keyboard()
+    )
+    await state.set_state(BundleStates.waiting_bundle_name)
+
+
+async def render_bundle_selection(message, state: FSMContext, user_id: int, db, edit: bool = True):
+    """Показ экрана выбора шаблонов для набора"""
+    data = await state.get_data()
+    selected = {template_id: quantity for template_id, quantity in data.get('bundle_items', [])}
+    templates = (await db.get_user_templates(user_id))[:MAX_SELECTABLE_TEMPLATES]
+
+    text = (
+        f"📦 <b>Набор «{data.get('bundle_name', '')}»</b>\n\n"
+        f"Нажимайте на шаблоны, чтобы добавить их в набор.\n"
+        f"Повторное нажатие увеличивает количество.\n\n"
+        f"Выбрано шаблонов: {len(selected)}"
+    )
+    keyboard = get_bundle_selection_keyboard(templates, selected)
+
+    if edit:
+        await message.edit_text(text, parse_mode="HTML", reply_markup=keyboard)
+    else:
+        await message.answer(text, parse_mode="HTML", reply_markup=keyboard)
+
+
+@router.callback_query(BundleStates.selecting_templates, F.data.startswith("bundle_add:"))
+@error_handler
+async def callback_bundle_add(callback: CallbackQuery, state: FSMContext, user_id: int, db, **kwargs):
+    """Добавление шаблона в собираемый набор"""
+    template_id = int(callback.data.split(":")[1])
+    data = await state.get_data()
+    items = [list(item) for item in data.get('bundle_items', [])]
+
+    for item in items:
+        if item[0] == template_id:
+            item[1] += 1
+            break
+    else:
+        items.append([template_id, 1])
+
+    await state.update_data(bundle_items=items)
+    await render_bundle_selection(callback.message, state, user_id, db)
+
+
+@router.callback_query(BundleStates.selecting_templates, F.data == "bundle_clear")
+@error_handler
+async def callback_bundle_clear(callback: CallbackQuery, state: FSMContext, user_id: int, db, **kwargs):
+    """Очистка собираемого набора"""
+    await state.update_data(bundle_items=[])
+    await render_bundle_selection(callback.message, state, user_id, db)
+
+
+@router.callback_query(BundleStates.selecting_templates, F.data == "bundle_save")
+@error_handler
+async def callback_bundle_save(callback: CallbackQuery, state: FSMContext, user_id: int, db, **kwargs):
+    """Сохранение набора шаблонов"""
+    data = await state.get_data()
+    items = data.get('bundle_items', [])
+
+    if not items:
+        await callback.answer("⚠️ Выберите хотя бы один шаблон!")
+        return
+
+    await db.create_template_bundle(
+        user_id=user_id,
+        name=data['bundle_name'],
+        items=[(template_id, quantity * MINOR_UNITS) for template_id, quantity in items]
+    )
+
+    await callback.answer("✅ Набор создан!")
+    await callback_template_bundles(callback, state=state, user_id=user_id, db=db)
+
+
+@router.callback_query(F.data.startswith("show_bundle:"))
+@error_handler
+async def callback_show_bundle(callback: CallbackQuery, user_id: int, db, **kwargs):
+    """Показ состава набора"""
+    bundle_id = int(callback.data.split(":")[1])
+    items = await db.get_bundle_items(bundle_id, user_id)
+
+    text = "📦 <b>Состав набора</b>\n\n"
+    if items:
+        for i, item in enumerate(items, 1):
+            quantity = f" ×{format_minor(item.quantity)}" if item.quantity != MINOR_UNITS else ""
+            text += (
+                f"┣ {i}. <b>{item.name}</b>{quantity}\n"
+                f"   ⏱️ {format_minor(item.default_duration)} ч  💰 {format_minor(item.default_cost)} ₽\n"
+            )
+    else:
+        text += "📝 В наборе нет доступных шаблонов."
+
+    keyboard = InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text="🗑️ Удалить", callback_data=f"delete_bundle:{bundle_id}")],
+        [InlineKeyboardButton(text="◀️ К списку", callback_data="template_bundles")]
+    ])
+
+    await callback.message.edit_text(
+        text,
+        parse_mode="HTML",
+        reply_markup=keyboard
+    )
+
+
+@router.callback_query(F.data.startswith("delete_bundle:"))
+@error_handler
+async def callback_delete_bundle(callback: CallbackQuery, **kwargs):
+    """Подтверждение удаления набора"""
+    bundle_id = int(callback.data.split(":")[1])
+
+    text = "🗑️ <b>Удаление набора</b>\n\nВы уверены, что хотите удалить этот набор?"
+
+    keyboard = InlineKeyboardMarkup(inline_keyboard=[
+        [
+            InlineKeyboardButton(text="✅ Да", callback_data=f"confirm_delete_bundle:{bundle_id}"),
+            InlineKeyboardButton(text="❌ Нет", callback_data=f"show_bundle:{bundle_id}")
+        ]
+    ])
+
+    await callback.message.edit_text(
+        text,
+        parse_mode="HTML",
+        reply_markup=keyboard
+    )
+
+
+@router.callback_query(F.data.startswith("confirm_delete_bundle:"))
+@error_handler
+async def callback_confirm_delete_bundle(callback: CallbackQuery, state: FSMContext, user_id: int, db, **kwargs):
+    """Окончательное удаление набора"""
+    bundle_id = int(callback.data.split(":")[1])
+
+    success = await db.delete_template_bundle(bundle_id, user_id)
+
+    if success:
+        await callback.answer("✅ Набор удален!")
+        await callback_template_bundles(callback, state=state, user_id=user_id, db=db)
+    else:
+        await callback.answer("⚠️ Ошибка при удалении!")
+
+
+@router.callback_query(F.data.startswith("add_from_bundle:"))
+@error_handler
+async def callback_add_from_bundle(callback: CallbackQuery, user_id: int, db, **kwargs):
+    """Выбор набора для добавления в смету"""
+    estimate_id = int(callback.data.split(":")[1])
+    bundles = await db.get_user_bundles(user_id)
+
+    if not bundles:
+        text = """
+📦 <b>Наборы недоступны</b>
+
+У вас пока нет наборов шаблонов.
+Создайте набор в разделе «Шаблоны работ».
+"""
+    else:
+        text = f"📦 <b>Выберите набор</b> ({len(bundles)})\n\n"
+        for bundle in bundles:
+            text += (
+                f"┣ {bundle.name} ({bundle.items_count} поз., "
+                f"{format_currency(bundle.total_cost)})\n"
+            )
+
+    keyboard_buttons = [
+        [InlineKeyboardButton(
+            text=f"📦 {bundle.name[:35]}",
+            callback_data=f"apply_bundle:{estimate_id}:{bundle.id}"
+        )]
+        for bundle in bundles[:10]
+    ]
+    keyboard_buttons.append([InlineKeyboardButton(
+        text="◀️ Назад",
+        callback_data=f"add_item:{estimate_id}"
+    )])
+
+    await callback.message.edit_text(
+        text,
+        parse_mode="HTML",
+        reply_markup=InlineKeyboardMarkup(inline_keyboard=keyboard_buttons)
+    )
+
+
+@router.callback_query(F.data.startswith("apply_bundle:"))
+@error_handler
+async def callback_apply_bundle(callback: CallbackQuery, user_id: int, db, **kwargs):
+    """Добавление всех позиций набора в смету"""
+    parts = callback.data.split(":")
+    estimate_id = int(parts[1])
+    bundle_id = int(parts[2])
+
+    added = await db.apply_template_bundle(bundle_id, user_id, estimate_id)
+
+    if not added:
+        await callback.answer("⚠️ Набор пуст или недоступен!")
+        return
+
+    await callback.answer(f"✅ Добавлено позиций: {added}")
+
+    # Смета перерисовывается один раз после добавления всего набора
+    await callback_show_estimate(callback, user_id=user_id, db=db)
@@ -11,9 +11,10 @@ from bot.keyboards.inline import (
     get_estimate_keyboard, get_add_item_method_keyboard
 )
 from bot.keyboards.reply import get_cancel_keyboard
-from bot.utils.states import EstimateStates
+from bot.utils.states import EstimateStates, ImportStates
 from bot.utils.decorators import error_handler
-from bot.utils.helpers import format_estimate_card
+from bot.utils.helpers import format_estimate_card, format_currency, format_minor
+from bot.utils.validators import MAX_BULK_ITEMS
 
 logger = logging.getLogger(__name__)
 router = Router()
@@ -59,9 +60,9 @@ async def callback_my_estimates(callback: CallbackQuery, user_id: int, db, **kwa
         
         # Показываем последние 5 смет
         for estimate in estimates[:5]:
-            items_count = estimate.get('items_count', 0)
-            total_cost = estimate.get('total_cost', 0)
-            total_duration = estimate.get('total_duration', 0)
+            items_count = estimate.items_count
+            total_cost = estimate.total_cost
+            total_duration = estimate.total_duration
             
             text += format_estimate_card(estimate, items_count, total_cost, total_duration) + "\n\n"
         
@@ -70,8 +71,8 @@ async def callback_my_estimates(callback: CallbackQuery, user_id: int, db, **kwa
         for i, estimate in enumerate(estimates[:8]):  # Ограничиваем 8 сметами
             keyboard_buttons.append([
                 InlineKeyboardButton(
-                    text=f"📄 {estimate['title'][:25]}", 
-                    callback_data=f"show_estimate:{estimate['id']}"
+                    text=f"📄 {estimate.title[:25]}", 
+                    callback_data=f"show_estimate:{estimate.id}"
                 )
             ])
         
@@ -94,7 +95,7 @@ async def callback_my_estimates(callback: CallbackQuery, user_id: int, db, **kwa
 async def callback_show_estimate(callback: CallbackQuery, user_id: int, db, **kwargs):
     """Показ детальной информации о смете"""
     estimate_id = int(callback.data.split(":")[1])
-    estimate = await db.get_estimate_by_id(estimate_id, user_id)
+    estimate = await db.open_estimate(estimate_id, user_id)
     
     if not estimate:
         await callback.answer("⚠️ Смета не найдена!")
@@ -104,31 +105,28 @@ async def callback_show_estimate(callback: CallbackQuery, user_id: int, db, **kw
     items = await db.get_estimate_items(estimate_id)
     
     text = f"""
-📄 <b>{estimate['title']}</b>
+📄 <b>{estimate.title}</b>
 
 """
     
-    if estimate.get('description'):
-        text += f"📝 <b>Описание:</b>\n{estimate['description']}\n\n"
+    if estimate.description:
+        text += f"📝 <b>Описание:</b>\n{estimate.description}\n\n"
     
     # Показываем позиции
     if items:
         text += f"📊 <b>Позиции работ ({len(items)}):</b>\n\n"
-        total_cost = 0
-        total_duration = 0
         
         for i, item in enumerate(items[:10], 1):  # Показываем первые 10
-            total_cost += item['cost']
-            total_duration += item['duration']
-            text += f"┣ {i}. <b>{item['name']}</b>\n"
-            text += f"   ⏱️ {item['duration']} ч  💰 {item['cost']:,.0f} ₽\n"
+            text += f"┣ {i}. <b>{item.name}</b>\n"
+            text += f"   ⏱️ {format_minor(item.duration)} ч  💰 {format_minor(item.cost)} ₽\n"
         
         if len(items) > 10:
             text += f"\n... и еще {len(items) - 10} позиций\n"
         
+        # Итоги по всем позициям, а не только по показанным
         text += f"\n📈 <b>Итого:</b>\n"
-        text += f"⏱️ Время: {total_duration} ч\n"
-        text += f"💰 Стоимость: {total_cost:,.0f} ₽"
+        text += f"⏱️ Время: {format_minor(estimate.total_duration)} ч\n"
+        text += f"💰 Стоимость: {format_minor(estimate.total_cost)} ₽"
     else:
         text += "📝 Пока нет позиций в смете.\n\nДобавьте первую позицию!"
     
@@ -183,6 +181,65 @@ async def callback_add_manual(callback: CallbackQuery, state: FSMContext, **kwar
     await state.set_state(EstimateStates.waiting_item_name)
 
 
+@router.callback_query(F.data.startswith("add_bulk:"))
+@error_handler
+async def callback_add_bulk(callback: CallbackQuery, state: FSMContext, user_id: int, db, **kwargs):
+    """Добавление нескольких позиций одним сообщением"""
+    estimate_id = int(callback.data.split(":")[1])
+    hourly_rate = await db.get_hourly_rate(user_id)
+    
+    await state.update_data(estimate_id=estimate_id, hourly_rate=hourly_rate)
+    
+    rate_hint = ""
+    if hourly_rate:
+        rate_hint = (
+            f"\n\n💵 Стоимость можно не указывать — она будет рассчитана "
+            f"по ставке {format_currency(hourly_rate)}/ч:\n"
+            f"<code>Название; часы</code>"
+        )
+    
+    await callback.message.edit_text(
+        "📋 <b>Добавление позиций списком</b>\n\n"
+        "Отправьте позиции по одной на строку в формате:\n"
+        "<code>Название; часы; стоимость</code>\n\n"
+        "<i>Например:\n"
+        "Вёрстка главной; 8; 12000\n"
+        "Настройка CI/CD; 4; 6000</i>" + rate_hint,
+        parse_mode="HTML"
+    )
+    
+    await callback.message.answer(
+        f"Отправьте список позиций (до {MAX_BULK_ITEMS} строк):",
+        reply_markup=get_cancel_keyboard()
+    )
+    
+    await state.set_state(EstimateStates.waiting_bulk_items)
+
+
+@router.callback_query(F.data.startswith("import_items:"))
+@error_handler
+async def callback_import_items(callback: CallbackQuery, state: FSMContext, **kwargs):
+    """Импорт позиций сметы из файла"""
+    estimate_id = int(callback.data.split(":")[1])
+    
+    await state.update_data(import_target="estimate", estimate_id=estimate_id)
+    
+    await callback.message.edit_text(
+        "📥 <b>Импорт позиций из файла</b>\n\n"
+        "Поддерживаются файлы CSV и XLSX. Первая строка — заголовки столбцов:\n"
+        "<code>Название; Часы; Стоимость</code>\n"
+        "<i>Необязательные: Описание, Количество, Ед.</i>",
+        parse_mode="HTML"
+    )
+    
+    await callback.message.answer(
+        "Отправьте файл:",
+        reply_markup=get_cancel_keyboard()
+    )
+    
+    await state.set_state(ImportStates.waiting_import_file)
+
+
 @router.callback_query(F.data.startswith("add_from_template:"))
 @error_handler
 async def callback_add_from_template(callback: CallbackQuery, user_id: int, db, **kwargs):
@@ -213,7 +270,7 @@ async def callback_add_from_template(callback: CallbackQuery, user_id: int, db,
         # Группируем по категориям
         categories = {}
         for template in templates:
-            category = template.get('category', 'Без категории')
+            category = template.category or 'Без категории'
             if category not in categories:
                 categories[category] = []
             categories[category].append(template)
@@ -223,10 +280,10 @@ async def callback_add_from_template(callback: CallbackQuery, user_id: int, db,
         for category, cat_templates in categories.items():
             text += f"📂 <b>{category}</b>\n"
             for template in cat_templates[:3]:
-                text += f"┣ {template['name']} ({template['default_duration']} ч, {template['default_cost']} ₽)\n"
+                text += f"┣ {template.name} ({format_minor(template.default_duration)} ч, {format_minor(template.default_cost)} ₽)\n"
                 keyboard_buttons.append([InlineKeyboardButton(
-                    text=f"🔧 {template['name'][:35]}",
-                    callback_data=f"use_template:{estimate_id}:{template['id']}"
+                    text=f"🔧 {template.name[:35]}",
+                    callback_data=f"use_template:{estimate_id}:{template.id}"
                 )])
             text += "\n"
         
@@ -268,10 +325,10 @@ async def callback_use_template(callback: CallbackQuery, user_id: int, db, **kwa
         # Добавляем позицию из шаблона
         item_id = await db.add_estimate_item(
             estimate_id=estimate_id,
-            name=template['name'],
-            description=template.get('description', ''),
-            duration=template['default_duration'],
-            cost=template['default_cost']
+            name=template.name,
+            description=template.description or '',
+            duration=template.default_duration,
+            cost=template.default_cost
         )
         
         # Увеличиваем счетчик использования шаблона
@@ -321,11 +378,36 @@ async def callback_confirm_delete(callback: CallbackQuery, user_id: int, db, **k
         success = await db.delete_estimate(item_id, user_id)
         if success:
             await callback.answer("✅ Смета удалена!")
-            await callback_my_estimates(callback, user_id=user_id, db=db)
+            
+            # Смета только помечена удаленной и до очистки ее можно вернуть
+            keyboard = InlineKeyboardMarkup(inline_keyboard=[
+                [InlineKeyboardButton(text="↩️ Восстановить", callback_data=f"restore_estimate:{item_id}")],
+                [InlineKeyboardButton(text="📋 Мои сметы", callback_data="my_estimates")]
+            ])
+            await callback.message.edit_text(
+                "🗑️ <b>Смета удалена</b>\n\nЕсли это ошибка, смету можно восстановить.",
+                parse_mode="HTML",
+                reply_markup=keyboard
+            )
         else:
             await callback.answer("⚠️ Ошибка при удалении!")
 
 
+@router.callback_query(F.data.startswith("restore_estimate:"))
+@error_handler
+async def callback_restore_estimate(callback: CallbackQuery, user_id: int, db, config, **kwargs):
+    """Восстановление удаленной сметы"""
+    estimate_id = int(callback.data.split(":")[1])
+    
+    if not await db.restore_estimate(estimate_id, user_id, config.estimate_purge_delay):
+        await callback.answer("⚠️ Смету уже нельзя восстановить", show_alert=True)
+        await callback_my_estimates(callback, user_id=user_id, db=db)
+        return
+    
+    await callback.answer("✅ Смета восстановлена!")
+    await callback_show_estimate(callback, user_id=user_id, db=db)
+
+
 @router.callback_query(F.data == "active_estimates")
 @error_handler
 async def callback_active_estimates(callback: CallbackQuery, user_id: int, db, **kwargs):
@@ -335,7 +417,7 @@ async def callback_active_estimates(callback: CallbackQuery, user_id: int, db, *
     # Фильтруем только сметы с позициями
     active_estimates = []
     for estimate in estimates:
-        items_count = estimate.get('items_count', 0)
+        items_count = estimate.items_count
         if items_count > 0:
             active_estimates.append(estimate)
     
@@ -356,20 +438,20 @@ async def callback_active_estimates(callback: CallbackQuery, user_id: int, db, *
         text = f"⚡ <b>Активные сметы</b> ({len(active_estimates)})\n\n"
         
         for estimate in active_estimates[:5]:
-            items_count = estimate.get('items_count', 0)
-            total_cost = estimate.get('total_cost', 0)
-            total_duration = estimate.get('total_duration', 0)
+            items_count = estimate.items_count
+            total_cost = estimate.total_cost
+            total_duration = estimate.total_duration
             
             # Прогресс-бар (условно считаем что 100% = все позиции готовы)
             progress = "▰▰▰▱▱▱▱" if items_count > 0 else "▱▱▱▱▱▱▱"
             
             text += f"""
 ╭─────────────────────────╮
-│ 📄 <b>{estimate['title'][:20]}</b>
+│ 📄 <b>{estimate.title[:20]}</b>
 ├─────────────────────────┤
 │ 📊 Позиций: {items_count}
-│ ⏱️ Время: {total_duration} ч
-│ 💰 Сумма: {total_cost:,.0f} ₽
+│ ⏱️ Время: {format_minor(total_duration)} ч
+│ 💰 Сумма: {format_minor(total_cost)} ₽
 │ 📈 {progress}
 ╰─────────────────────────╯
 
@@ -380,8 +462,8 @@ async def callback_active_estimates(callback: CallbackQuery, user_id: int, db, *
         for estimate in active_estimates[:6]:
             keyboard_buttons.append([
                 InlineKeyboardButton(
-                    text=f"⚡ {estimate['title'][:25]}", 
-                    callback_data=f"show_estimate:{estimate['id']}"
+                    text=f"⚡ {estimate.title[:25]}", 
+                    callback_data=f"show_estimate:{estimate.id}"
                 )
             ])
         
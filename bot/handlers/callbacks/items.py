@@ -0,0 +1,240 @@
+"""
+Обработчики для редактирования позиций смет
+"""
+import logging
+
+from aiogram import Router, F
+from aiogram.types import CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
+from aiogram.fsm.context import FSMContext
+
+from bot.keyboards.inline import get_estimate_edit_keyboard, get_item_edit_keyboard
+from bot.keyboards.reply import get_cancel_keyboard
+from bot.utils.states import EstimateStates
+from bot.utils.decorators import error_handler
+from bot.utils.helpers import format_item_card, format_currency
+
+logger = logging.getLogger(__name__)
+router = Router()
+
+# Количество позиций на экране редактирования
+MAX_EDITABLE_ITEMS = 30
+
+ITEM_FIELD_PROMPTS = {
+    'name': "📝 Введите новое название позиции:",
+    'duration': "⏱️ Введите новое время выполнения в часах:\n<i>Например: 8 или 2.5</i>",
+    'cost': "💰 Введите новую стоимость в рублях:\n<i>Например: 5000 или 7500.50</i>",
+}
+
+
+@router.callback_query(F.data.startswith("edit_estimate:"))
+@error_handler
+async def callback_edit_estimate(callback: CallbackQuery, state: FSMContext, user_id: int, db, **kwargs):
+    """Выбор позиции сметы для редактирования"""
+    await state.clear()
+    estimate_id = int(callback.data.split(":")[1])
+    await render_estimate_editor(callback, estimate_id, user_id, db)
+
+
+async def render_estimate_editor(callback: CallbackQuery, estimate_id: int, user_id: int, db) -> None:
+    """Показ списка позиций сметы для редактирования"""
+    estimate = await db.open_estimate(estimate_id, user_id)
+
+    if not estimate:
+        await callback.answer("⚠️ Смета не найдена!")
+        return
+
+    items = await db.get_estimate_items(estimate_id)
+
+    text = f"✏️ <b>Редактирование: {estimate.title}</b>\n\n"
+    if items:
+        text += "Выберите позицию, чтобы изменить ее, переместить или удалить."
+        if len(items) > MAX_EDITABLE_ITEMS:
+            text += f"\n\n<i>Показаны первые {MAX_EDITABLE_ITEMS} из {len(items)} позиций</i>"
+    else:
+        text += "📝 В смете пока нет позиций."
+
+    await callback.message.edit_text(
+        text,
+        parse_mode="HTML",
+        reply_markup=get_estimate_edit_keyboard(estimate_id, items[:MAX_EDITABLE_ITEMS])
+    )
+
+
+async def render_item_editor(callback: CallbackQuery, item_id: int, user_id: int, db) -> None:
+    """Показ карточки позиции с кнопками редактирования"""
+    item = await db.get_estimate_item(item_id, user_id)
+
+    if not item:
+        await callback.answer("⚠️ Позиция не найдена!")
+        return
+
+    item_ids = [row.id for row in await db.get_estimate_items(item.estimate_id)]
+
+    await callback.message.edit_text(
+        format_item_card(item, item_ids.index(item_id) + 1, len(item_ids)),
+        parse_mode="HTML",
+        reply_markup=get_item_edit_keyboard(item_id, item.estimate_id)
+    )
+
+
+@router.callback_query(F.data.startswith("edit_item:"))
+@error_handler
+async def callback_edit_item(callback: CallbackQuery, state: FSMContext, user_id: int, db, **kwargs):
+    """Карточка редактирования позиции"""
+    await state.clear()
+    item_id = int(callback.data.split(":")[1])
+    await render_item_editor(callback, item_id, user_id, db)
+
+
+@router.callback_query(F.data.startswith("edit_item_field:"))
+@error_handler
+async def callback_edit_item_field(callback: CallbackQuery, state: FSMContext, user_id: int, db, **kwargs):
+    """Запрос нового значения поля позиции"""
+    parts = callback.data.split(":")
+    item_id = int(parts[1])
+    field = parts[2]
+
+    item = await db.get_estimate_item(item_id, user_id)
+    if not item or field not in ITEM_FIELD_PROMPTS:
+        await callback.answer("⚠️ Позиция не найдена!")
+        return
+
+    await state.update_data(item_id=item_id, estimate_id=item.estimate_id, item_field=field)
+    await callback.message.answer(
+        ITEM_FIELD_PROMPTS[field],
+        reply_markup=get_cancel_keyboard(),
+        parse_mode="HTML"
+    )
+    await state.set_state(EstimateStates.editing_item)
+    await callback.answer()
+
+
+@router.callback_query(F.data.startswith("move_item:"))
+@error_handler
+async def callback_move_item(callback: CallbackQuery, user_id: int, db, **kwargs):
+    """Перемещение позиции выше или ниже"""
+    parts = callback.data.split(":")
+    item_id = int(parts[1])
+    offset = -1 if parts[2] == "up" else 1
+
+    item = await db.get_estimate_item(item_id, user_id)
+    if not item:
+        await callback.answer("⚠️ Позиция не найдена!")
+        return
+
+    item_ids = [row.id for row in await db.get_estimate_items(item.estimate_id)]
+    position = item_ids.index(item_id)
+    new_position = position + offset
+
+    if not 0 <= new_position < len(item_ids):
+        await callback.answer("⚠️ Позицию некуда перемещать")
+        return
+
+    item_ids[position], item_ids[new_position] = item_ids[new_position], item_ids[position]
+
+    # Новый порядок сохраняется одним запросом, меняются только сдвинутые строки
+    await db.reorder_estimate_items(item.estimate_id, user_id, item_ids)
+
+    await callback.answer("✅ Позиция перемещена")
+    await render_item_editor(callback, item_id, user_id, db)
+
+
+@router.callback_query(F.data.startswith("delete_item:"))
+@error_handler
+async def callback_delete_item(callback: CallbackQuery, **kwargs):
+    """Подтверждение удаления позиции"""
+    item_id = int(callback.data.split(":")[1])
+
+    text = "🗑️ <b>Удаление позиции</b>\n\nВы уверены, что хотите удалить эту позицию?"
+
+    keyboard = InlineKeyboardMarkup(inline_keyboard=[
+        [
+            InlineKeyboardButton(text="✅ Да", callback_data=f"confirm_delete_item:{item_id}"),
+            InlineKeyboardButton(text="❌ Нет", callback_data=f"edit_item:{item_id}")
+        ]
+    ])
+
+    await callback.message.edit_text(
+        text,
+        parse_mode="HTML",
+        reply_markup=keyboard
+    )
+
+
+@router.callback_query(F.data.startswith("confirm_delete_item:"))
+@error_handler
+async def callback_confirm_delete_item(callback: CallbackQuery, user_id: int, db, **kwargs):
+    """Окончательное удаление позиции"""
+    item_id = int(callback.data.split(":")[1])
+
+    item = await db.get_estimate_item(item_id, user_id)
+    if not item or not await db.delete_estimate_item(item_id, user_id):
+        await callback.answer("⚠️ Ошибка при удалении!")
+        return
+
+    await callback.answer("✅ Позиция удалена!")
+
+    await render_estimate_editor(callback, item.estimate_id, user_id, db)
+
+
+@router.callback_query(F.data.startswith("rename_estimate:"))
+@error_handler
+async def callback_rename_estimate(callback: CallbackQuery, state: FSMContext, **kwargs):
+    """Запрос нового названия сметы"""
+    estimate_id = int(callback.data.split(":")[1])
+
+    await state.update_data(estimate_id=estimate_id)
+    await callback.message.answer(
+        "📝 Введите новое название сметы:",
+        reply_markup=get_cancel_keyboard()
+    )
+    await state.set_state(EstimateStates.editing_estimate)
+    await callback.answer()
+
+
+@router.callback_query(F.data.startswith("reprice_estimate:"))
+@error_handler
+async def callback_reprice_estimate(callback: CallbackQuery, user_id: int, db, **kwargs):
+    """Подтверждение пересчета сметы по ставке"""
+    estimate_id = int(callback.data.split(":")[1])
+    hourly_rate = await db.get_hourly_rate(user_id)
+
+    if not hourly_rate:
+        await callback.answer("⚠️ Задайте почасовую ставку в настройках!", show_alert=True)
+        return
+
+    text = (
+        f"💵 <b>Пересчет по ставке</b>\n\n"
+        f"Стоимость всех позиций сметы будет пересчитана\n"
+        f"по ставке {format_currency(hourly_rate)}/ч. Продолжить?"
+    )
+
+    keyboard = InlineKeyboardMarkup(inline_keyboard=[
+        [
+            InlineKeyboardButton(text="✅ Да", callback_data=f"confirm_reprice_estimate:{estimate_id}"),
+            InlineKeyboardButton(text="❌ Нет", callback_data=f"edit_estimate:{estimate_id}")
+        ]
+    ])
+
+    await callback.message.edit_text(
+        text,
+        parse_mode="HTML",
+        reply_markup=keyboard
+    )
+
+
+@router.callback_query(F.data.startswith("confirm_reprice_estimate:"))
+@error_handler
+async def callback_confirm_reprice_estimate(callback: CallbackQuery, user_id: int, db, **kwargs):
+    """Пересчет стоимости позиций сметы по ставке"""
+    estimate_id = int(callback.data.split(":")[1])
+    hourly_rate = await db.get_hourly_rate(user_id)
+
+    if not hourly_rate:
+        await callback.answer("⚠️ Задайте почасовую ставку в настройках!", show_alert=True)
+        return
+
+    _, items_count = await db.reprice_estimates(user_id, hourly_rate, [estimate_id])
+
+    await callback.answer(f"✅ Изменено позиций: {items_count}")
+    await render_estimate_editor(callback, estimate_id, user_id, db)
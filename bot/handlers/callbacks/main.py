@@ -6,10 +6,13 @@ from datetime import datetime
 
 from aiogram import Router, F
 from aiogram.types import CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
+from aiogram.fsm.context import FSMContext
 
-from bot.keyboards.inline import get_main_keyboard, get_back_keyboard
+from bot.keyboards.inline import get_main_keyboard, get_back_keyboard, get_settings_keyboard
+from bot.keyboards.reply import get_cancel_keyboard
+from bot.utils.states import SettingsStates
 from bot.utils.decorators import error_handler
-from bot.utils.helpers import format_stats_block
+from bot.utils.helpers import format_stats_block, format_currency
 
 logger = logging.getLogger(__name__)
 router = Router()
@@ -37,17 +40,15 @@ async def callback_main_menu(callback: CallbackQuery, **kwargs):
 @error_handler
 async def callback_user_stats(callback: CallbackQuery, user_id: int, db, **kwargs):
     """Показ статистики пользователя"""
-    estimates = await db.get_user_estimates(user_id)
-    templates = await db.get_user_templates(user_id)
+    # Сводная строка поддерживается триггерами базы
+    stats = await db.get_user_stats(user_id)
     
-    stats_text = format_stats_block(estimates, templates)
+    stats_text = format_stats_block(stats)
     
-    # Добавляем топ шаблоны
-    if templates:
-        top_templates = sorted(templates, key=lambda x: x.get('usage_count', 0), reverse=True)[:3]
+    if stats.top_templates:
         stats_text += "\n\n🏆 <b>Популярные шаблоны:</b>\n"
-        for i, template in enumerate(top_templates, 1):
-            stats_text += f"┣ {i}. {template['name'][:20]} ({template.get('usage_count', 0)} исп.)\n"
+        for i, template in enumerate(stats.top_templates, 1):
+            stats_text += f"┣ {i}. {template.name[:20]} ({template.usage_count} исп.)\n"
     
     keyboard = InlineKeyboardMarkup(inline_keyboard=[
         [InlineKeyboardButton(text="🔄 Обновить", callback_data="user_stats")],
@@ -63,19 +64,25 @@ async def callback_user_stats(callback: CallbackQuery, user_id: int, db, **kwarg
 
 @router.callback_query(F.data == "settings")
 @error_handler
-async def callback_settings(callback: CallbackQuery, config, **kwargs):
+async def callback_settings(callback: CallbackQuery, state: FSMContext, user_id: int, db, config, **kwargs):
     """Настройки бота"""
+    await state.clear()
+    hourly_rate = await db.get_hourly_rate(user_id)
+    rate_text = format_currency(hourly_rate) + "/ч" if hourly_rate else "не задана"
+    
     settings_text = f"""
 ⚙️ <b>Настройки бота</b>
 
 🔧 <b>Доступные опции:</b>
 
 ┣ 🤖 ИИ-помощник: {"✅ Включен" if config.is_ai_available else "❌ Отключен"}
+┣ 💵 Почасовая ставка: {rate_text}
 ┣ 📊 Валюта: ₽ (Рубли)  
 ┣ ⏱️ Формат времени: Часы
 ┗ 📅 Дата создания: {datetime.now().strftime("%d.%m.%Y")}
 
 💡 <b>Советы:</b>
+• Задайте ставку, и стоимость позиций будет считаться по часам
 • Создавайте шаблоны для частых работ
 • Используйте ИИ для генерации смет
 • Регулярно создавайте отчеты
@@ -85,7 +92,82 @@ async def callback_settings(callback: CallbackQuery, config, **kwargs):
     await callback.message.edit_text(
         settings_text,
         parse_mode="HTML",
-        reply_markup=get_back_keyboard()
+        reply_markup=get_settings_keyboard(hourly_rate is not None)
+    )
+
+
+@router.callback_query(F.data == "set_hourly_rate")
+@error_handler
+async def callback_set_hourly_rate(callback: CallbackQuery, state: FSMContext, **kwargs):
+    """Запрос почасовой ставки"""
+    await callback.message.answer(
+        "💵 Введите почасовую ставку в рублях:\n"
+        "<i>Например: 2500</i>",
+        reply_markup=get_cancel_keyboard(),
+        parse_mode="HTML"
+    )
+    await state.set_state(SettingsStates.waiting_hourly_rate)
+    await callback.answer()
+
+
+@router.callback_query(F.data == "clear_hourly_rate")
+@error_handler
+async def callback_clear_hourly_rate(callback: CallbackQuery, state: FSMContext, user_id: int, db, config, **kwargs):
+    """Сброс почасовой ставки"""
+    await db.set_hourly_rate(user_id, None)
+    await callback.answer("✅ Ставка сброшена")
+    await callback_settings(callback, state=state, user_id=user_id, db=db, config=config)
+
+
+@router.callback_query(F.data == "reprice_drafts")
+@error_handler
+async def callback_reprice_drafts(callback: CallbackQuery, user_id: int, db, **kwargs):
+    """Подтверждение пересчета черновиков по ставке"""
+    hourly_rate = await db.get_hourly_rate(user_id)
+    if not hourly_rate:
+        await callback.answer("⚠️ Сначала задайте почасовую ставку!")
+        return
+    
+    text = f"""
+🔄 <b>Пересчет черновиков</b>
+
+Стоимость всех позиций во всех черновиках
+будет пересчитана по ставке {format_currency(hourly_rate)}/ч.
+
+Продолжить?
+"""
+    
+    keyboard = InlineKeyboardMarkup(inline_keyboard=[
+        [
+            InlineKeyboardButton(text="✅ Да", callback_data="confirm_reprice_drafts"),
+            InlineKeyboardButton(text="❌ Нет", callback_data="settings")
+        ]
+    ])
+    
+    await callback.message.edit_text(
+        text,
+        parse_mode="HTML",
+        reply_markup=keyboard
+    )
+
+
+@router.callback_query(F.data == "confirm_reprice_drafts")
+@error_handler
+async def callback_confirm_reprice_drafts(callback: CallbackQuery, user_id: int, db, **kwargs):
+    """Пересчет всех черновиков по ставке"""
+    hourly_rate = await db.get_hourly_rate(user_id)
+    if not hourly_rate:
+        await callback.answer("⚠️ Сначала задайте почасовую ставку!")
+        return
+    
+    estimates_count, items_count = await db.reprice_estimates(user_id, hourly_rate)
+    
+    await callback.message.edit_text(
+        f"✅ <b>Черновики пересчитаны</b>\n\n"
+        f"📋 Смет: {estimates_count}\n"
+        f"✏️ Изменено позиций: {items_count}",
+        parse_mode="HTML",
+        reply_markup=get_back_keyboard("settings")
     )
 
 
@@ -0,0 +1,71 @@
+"""
+Обработчики поиска по сметам
+"""
+import logging
+from typing import Optional, Tuple
+
+from aiogram import Router, F
+from aiogram.types import CallbackQuery, InlineKeyboardMarkup
+from aiogram.fsm.context import FSMContext
+
+from bot.keyboards.inline import get_search_results_keyboard, get_back_keyboard
+from bot.keyboards.reply import get_cancel_keyboard
+from bot.utils.states import SearchStates
+from bot.utils.decorators import error_handler
+from bot.utils.helpers import format_search_results, SEARCH_PAGE_SIZE
+
+logger = logging.getLogger(__name__)
+router = Router()
+
+# Ограничения длины поискового запроса
+MIN_QUERY_LENGTH = 2
+MAX_QUERY_LENGTH = 100
+
+
+async def render_search_results(query: str, user_id: int, db, page: int = 1,
+                                after: Optional[Tuple[float, int]] = None) -> Tuple[str, InlineKeyboardMarkup]:
+    """Страница результатов поиска: текст и клавиатура"""
+    # Лишний результат показывает, есть ли следующая страница
+    results = await db.search_estimates(user_id, query, limit=SEARCH_PAGE_SIZE + 1, after=after)
+    has_more = len(results) > SEARCH_PAGE_SIZE
+    results = results[:SEARCH_PAGE_SIZE]
+
+    return (
+        format_search_results(query, results, page),
+        get_search_results_keyboard(results, page, has_more)
+    )
+
+
+@router.callback_query(F.data == "search_estimates")
+@error_handler
+async def callback_search_estimates(callback: CallbackQuery, state: FSMContext, **kwargs):
+    """Запрос поисковой фразы"""
+    await callback.message.answer(
+        "🔍 Что найти? Введите слово или часть названия сметы или позиции:\n"
+        "<i>Например: OAuth</i>",
+        reply_markup=get_cancel_keyboard(),
+        parse_mode="HTML"
+    )
+    await state.set_state(SearchStates.waiting_query)
+    await callback.answer()
+
+
+@router.callback_query(F.data.startswith("search_more:"))
+@error_handler
+async def callback_search_more(callback: CallbackQuery, state: FSMContext, user_id: int, db, **kwargs):
+    """Следующая страница результатов поиска"""
+    _, page, score, estimate_id = callback.data.split(":")
+
+    data = await state.get_data()
+    query = data.get('search_query')
+    if not query:
+        await callback.message.edit_text(
+            "⚠️ Поиск устарел, начните новый.",
+            reply_markup=get_back_keyboard()
+        )
+        return
+
+    text, keyboard = await render_search_results(
+        query, user_id, db, page=int(page), after=(float(score), int(estimate_id))
+    )
+    await callback.message.edit_text(text, parse_mode="HTML", reply_markup=keyboard)
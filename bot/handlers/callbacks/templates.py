@@ -9,9 +9,9 @@ from aiogram.fsm.context import FSMContext
 
 from bot.keyboards.inline import get_work_templates_keyboard
 from bot.keyboards.reply import get_cancel_keyboard
-from bot.utils.states import TemplateStates
+from bot.utils.states import TemplateStates, ImportStates
 from bot.utils.decorators import error_handler
-from bot.utils.helpers import format_template_card
+from bot.utils.helpers import format_template_card, format_minor
 
 logger = logging.getLogger(__name__)
 router = Router()
@@ -56,6 +56,28 @@ async def callback_create_template(callback: CallbackQuery, state: FSMContext, *
     await state.set_state(TemplateStates.waiting_template_name)
 
 
+@router.callback_query(F.data == "import_templates")
+@error_handler
+async def callback_import_templates(callback: CallbackQuery, state: FSMContext, **kwargs):
+    """Импорт шаблонов из файла"""
+    await state.update_data(import_target="templates")
+    
+    await callback.message.edit_text(
+        "📥 <b>Импорт шаблонов из файла</b>\n\n"
+        "Поддерживаются файлы CSV и XLSX. Первая строка — заголовки столбцов:\n"
+        "<code>Название; Часы; Стоимость</code>\n"
+        "<i>Необязательные: Описание, Категория</i>",
+        parse_mode="HTML"
+    )
+    
+    await callback.message.answer(
+        "Отправьте файл:",
+        reply_markup=get_cancel_keyboard()
+    )
+    
+    await state.set_state(ImportStates.waiting_import_file)
+
+
 @router.callback_query(F.data == "my_templates")
 @error_handler
 async def callback_my_templates(callback: CallbackQuery, user_id: int, db, **kwargs):
@@ -80,7 +102,7 @@ async def callback_my_templates(callback: CallbackQuery, user_id: int, db, **kwa
         # Группируем по категориям
         categories = {}
         for template in templates:
-            category = template.get('category', 'Без категории')
+            category = template.category or 'Без категории'
             if category not in categories:
                 categories[category] = []
             categories[category].append(template)
@@ -98,8 +120,8 @@ async def callback_my_templates(callback: CallbackQuery, user_id: int, db, **kwa
         for i, template in enumerate(templates[:10]):  # Ограничиваем 10 шаблонами
             keyboard_buttons.append([
                 InlineKeyboardButton(
-                    text=f"🔧 {template['name'][:30]}", 
-                    callback_data=f"show_template:{template['id']}"
+                    text=f"🔧 {template.name[:30]}", 
+                    callback_data=f"show_template:{template.id}"
                 )
             ])
         
@@ -131,15 +153,15 @@ async def callback_show_template(callback: CallbackQuery, db, **kwargs):
     text = f"""
 🔧 <b>Шаблон работы</b>
 
-<b>📝 Название:</b> {template['name']}
-<b>📂 Категория:</b> {template.get('category', 'Без категории')}
-<b>⏱️ Время:</b> {template['default_duration']} ч
-<b>💰 Стоимость:</b> {template['default_cost']} ₽
-<b>🔥 Использований:</b> {template.get('usage_count', 0)}
+<b>📝 Название:</b> {template.name}
+<b>📂 Категория:</b> {template.category or 'Без категории'}
+<b>⏱️ Время:</b> {format_minor(template.default_duration)} ч
+<b>💰 Стоимость:</b> {format_minor(template.default_cost)} ₽
+<b>🔥 Использований:</b> {template.usage_count}
 """
     
-    if template.get('description'):
-        text += f"\n<b>📄 Описание:</b>\n{template['description']}"
+    if template.description:
+        text += f"\n<b>📄 Описание:</b>\n{template.description}"
     
     keyboard = InlineKeyboardMarkup(inline_keyboard=[
         [InlineKeyboardButton(
@@ -180,13 +202,14 @@ async def callback_delete_template(callback: CallbackQuery, **kwargs):
 
 @router.callback_query(F.data.startswith("confirm_delete_template:"))
 @error_handler
-async def callback_confirm_delete_template(callback: CallbackQuery, user_id: int, db, **kwargs):
+async def callback_confirm_delete_template(callback: CallbackQuery, user_id: int, db, retrieval_index, **kwargs):
     """Окончательное удаление шаблона"""
     template_id = int(callback.data.split(":")[1])
     
     success = await db.delete_template(template_id, user_id)
     
     if success:
+        retrieval_index.remove_template(template_id)
         await callback.answer("✅ Шаблон удален!")
         await callback_my_templates(callback, user_id=user_id, db=db)
     else:
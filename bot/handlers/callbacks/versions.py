@@ -0,0 +1,148 @@
+"""
+Обработчики для копий и версий смет
+"""
+import logging
+
+from aiogram import Router, F
+from aiogram.types import CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
+
+from bot.utils.decorators import error_handler
+from bot.utils.helpers import format_currency, format_duration, format_minor
+
+logger = logging.getLogger(__name__)
+router = Router()
+
+# Количество строк в сравнении версий
+MAX_DIFF_LINES = 30
+
+CHANGE_MARKS = {
+    'added': '🟢',
+    'removed': '🔴',
+    'changed': '🟡',
+}
+
+
+@router.callback_query(F.data.startswith("clone_estimate:"))
+@error_handler
+async def callback_clone_estimate(callback: CallbackQuery, user_id: int, db, **kwargs):
+    """Копирование сметы"""
+    estimate_id = int(callback.data.split(":")[1])
+
+    new_estimate_id = await db.clone_estimate(estimate_id, user_id)
+
+    if not new_estimate_id:
+        await callback.answer("⚠️ Смета не найдена!")
+        return
+
+    keyboard = InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text="📄 Открыть копию", callback_data=f"show_estimate:{new_estimate_id}")],
+        [InlineKeyboardButton(text="◀️ К исходной смете", callback_data=f"show_estimate:{estimate_id}")]
+    ])
+
+    await callback.message.edit_text(
+        "📑 <b>Копия сметы создана</b>\n\n"
+        "Все позиции скопированы, исходная смета не изменилась.",
+        parse_mode="HTML",
+        reply_markup=keyboard
+    )
+
+
+@router.callback_query(F.data.startswith("estimate_versions:"))
+@error_handler
+async def callback_estimate_versions(callback: CallbackQuery, user_id: int, db, **kwargs):
+    """Список сохраненных версий сметы"""
+    estimate_id = int(callback.data.split(":")[1])
+    snapshots = await db.get_estimate_snapshots(estimate_id, user_id)
+
+    if not snapshots:
+        text = """
+🕓 <b>Версии сметы</b>
+
+📝 Сохраненных версий пока нет.
+
+Сохраните версию перед изменениями, чтобы
+потом сравнить ее с текущим состоянием сметы.
+"""
+    else:
+        text = f"🕓 <b>Версии сметы</b> ({len(snapshots)})\n\n"
+        for snapshot in snapshots:
+            text += (
+                f"┣ <b>v{snapshot.version}</b> от {snapshot.created_at.strftime('%d.%m.%Y %H:%M')}\n"
+                f"   {snapshot.items_count} поз., {format_duration(snapshot.total_duration)}, "
+                f"{format_currency(snapshot.total_cost)}\n"
+            )
+
+    keyboard_buttons = [
+        [InlineKeyboardButton(
+            text=f"🔍 v{snapshot.version} ↔ текущая",
+            callback_data=f"snapshot_diff:{estimate_id}:{snapshot.version}"
+        )]
+        for snapshot in snapshots[:8]
+    ]
+    keyboard_buttons.extend([
+        [InlineKeyboardButton(text="📸 Сохранить версию", callback_data=f"snapshot_estimate:{estimate_id}")],
+        [InlineKeyboardButton(text="◀️ К смете", callback_data=f"show_estimate:{estimate_id}")]
+    ])
+
+    await callback.message.edit_text(
+        text,
+        parse_mode="HTML",
+        reply_markup=InlineKeyboardMarkup(inline_keyboard=keyboard_buttons)
+    )
+
+
+@router.callback_query(F.data.startswith("snapshot_estimate:"))
+@error_handler
+async def callback_snapshot_estimate(callback: CallbackQuery, user_id: int, db, **kwargs):
+    """Сохранение текущей версии сметы"""
+    estimate_id = int(callback.data.split(":")[1])
+
+    version = await db.snapshot_estimate(estimate_id, user_id)
+
+    if not version:
+        await callback.answer("⚠️ Смета не найдена!")
+        return
+
+    await callback.answer(f"✅ Сохранена версия v{version}")
+    await callback_estimate_versions(callback, user_id=user_id, db=db)
+
+
+@router.callback_query(F.data.startswith("snapshot_diff:"))
+@error_handler
+async def callback_snapshot_diff(callback: CallbackQuery, user_id: int, db, **kwargs):
+    """Сравнение версии сметы с текущим состоянием"""
+    parts = callback.data.split(":")
+    estimate_id = int(parts[1])
+    version = int(parts[2])
+
+    changes = await db.diff_estimate_snapshots(estimate_id, user_id, version)
+
+    text = f"🔍 <b>Изменения с версии v{version}</b>\n\n"
+    if not changes:
+        text += "✅ Смета не изменилась."
+    else:
+        for change in changes[:MAX_DIFF_LINES]:
+            mark = CHANGE_MARKS[change.change]
+            if change.change == 'added':
+                details = f"{format_minor(change.new_duration)} ч, {format_currency(change.new_cost)}"
+            elif change.change == 'removed':
+                details = f"{format_minor(change.old_duration)} ч, {format_currency(change.old_cost)}"
+            else:
+                details = (
+                    f"{format_minor(change.old_duration)} → {format_minor(change.new_duration)} ч, "
+                    f"{format_currency(change.old_cost)} → {format_currency(change.new_cost)}"
+                )
+            text += f"{mark} <b>{change.name}</b>\n   {details}\n"
+
+        if len(changes) > MAX_DIFF_LINES:
+            text += f"\n... и еще {len(changes) - MAX_DIFF_LINES} изменений"
+
+    keyboard = InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text="◀️ К версиям", callback_data=f"estimate_versions:{estimate_id}")]
+    ])
+
+    await callback.message.edit_text(
+        text,
+        parse_mode="HTML",
+        reply_markup=keyboard
+    )
@@ -4,10 +4,15 @@
 import logging
 from aiogram import Router, F
 from aiogram.types import Message
-from aiogram.filters import Command
+from aiogram.filters import Command, CommandObject
+from aiogram.fsm.context import FSMContext
 
+from bot.handlers.callbacks.search import render_search_results, MIN_QUERY_LENGTH, MAX_QUERY_LENGTH
 from bot.keyboards.inline import get_main_keyboard
+from bot.keyboards.reply import get_cancel_keyboard
 from bot.utils.decorators import error_handler
+from bot.utils.states import SearchStates
+from bot.utils.validators import sanitize_text
 
 
 def setup_commands_router(logger: logging.Logger) -> Router:
@@ -69,6 +74,10 @@ def setup_commands_router(logger: logging.Logger) -> Router:
 • Все данные сохраняются автоматически
 • Можно экспортировать сметы в PDF
 
+<b>🔍 Поиск:</b>
+/search <i>запрос</i> — найти сметы по названию,
+описанию и позициям, например /search OAuth
+
 <b>🔧 Шаблоны работ:</b>
 Создавайте шаблоны для повторяющихся задач:
 Frontend, Backend, DevOps, Design и др.
@@ -86,5 +95,30 @@ Frontend, Backend, DevOps, Design и др.
             reply_markup=get_main_keyboard(),
             parse_mode="HTML"
         )
+
+
+    @router.message(Command("search"))
+    @error_handler
+    async def cmd_search(message: Message, command: CommandObject, state: FSMContext, user_id: int, db, **kwargs):
+        """Команда /search [запрос]"""
+        logger.info(f"Пользователь {message.from_user.id} выполнил команду /search")
+        query = sanitize_text(command.args or "")
+        
+        if len(query) < MIN_QUERY_LENGTH:
+            await message.answer(
+                "🔍 Что найти? Введите слово или часть названия сметы или позиции:\n"
+                "<i>Например: OAuth</i>",
+                reply_markup=get_cancel_keyboard(),
+                parse_mode="HTML"
+            )
+            await state.set_state(SearchStates.waiting_query)
+            return
+        
+        query = query[:MAX_QUERY_LENGTH]
+        await state.set_state(None)
+        await state.update_data(search_query=query)
+        
+        text, keyboard = await render_search_results(query, user_id, db)
+        await message.answer(text, reply_markup=keyboard, parse_mode="HTML")
     
     return router 
\ No newline at end of file
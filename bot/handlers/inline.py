@@ -3,26 +3,50 @@
 """
 import logging
 
-from aiogram import Router
+from aiogram import Router, html
 from aiogram.types import InlineQuery, InlineQueryResultArticle, InputTextMessageContent
 
+from bot.utils.helpers import format_currency, format_duration
+
 logger = logging.getLogger(__name__)
 router = Router()
 
+# Время кэширования ответа на стороне Telegram (секунды)
+INLINE_CACHE_TIME = 30
+
 
 @router.inline_query()
-async def inline_query_handler(query: InlineQuery, **kwargs):
-    """Обработчик inline запросов"""
-    # Пока что простая заглушка для inline режима
-    results = [
-        InlineQueryResultArticle(
-            id="1",
-            title="EstimatePro",
-            description="Бот для создания профессиональных смет",
+async def inline_query_handler(query: InlineQuery, template_search, user_id: int = None, **kwargs):
+    """Поиск шаблонов работ по мере ввода"""
+    if user_id is None:
+        await query.answer([], cache_time=INLINE_CACHE_TIME, is_personal=True)
+        return
+
+    templates = await template_search.search(user_id, query.query)
+
+    results = []
+    for template in templates:
+        duration = format_duration(template.default_duration or 0)
+        cost = format_currency(template.default_cost or 0)
+        category = template.category or 'Без категории'
+
+        message_text = (
+            f"🔧 <b>{html.quote(template.name)}</b>\n"
+            f"⏱️ {duration}  💰 {cost}\n"
+            f"📂 {html.quote(category)}"
+        )
+        if template.description:
+            message_text += f"\n\n{html.quote(template.description)}"
+
+        results.append(InlineQueryResultArticle(
+            id=str(template.id),
+            title=template.name,
+            description=f"{duration} · {cost} · {category}",
             input_message_content=InputTextMessageContent(
-                message_text="🏗️ EstimatePro - профессиональный бот для создания смет!\n\nПопробуйте: @your_bot_username"
+                message_text=message_text,
+                parse_mode="HTML"
             )
-        )
-    ]
-    
-    await query.answer(results, cache_time=300) 
\ No newline at end of file
+        ))
+
+    # Выдача зависит от личных шаблонов, поэтому кэш Telegram персональный
+    await query.answer(results, cache_time=INLINE_CACHE_TIME, is_personal=True)
@@ -2,18 +2,33 @@
 Обработчики сообщений в FSM состояниях
 """
 import logging
+import os
+import tempfile
 
 from aiogram import Router, F
 from aiogram.types import Message
 from aiogram.filters import StateFilter
 from aiogram.fsm.context import FSMContext
 
-from bot.keyboards.inline import get_main_keyboard, get_estimate_keyboard
-from bot.keyboards.reply import get_cancel_keyboard, get_category_keyboard, get_skip_keyboard, remove_keyboard
-from bot.utils.states import EstimateStates, TemplateStates, AIStates
+from bot.keyboards.inline import get_main_keyboard, get_estimate_keyboard, get_item_edit_keyboard
+from bot.keyboards.reply import (
+    get_cancel_keyboard, get_category_keyboard, get_skip_keyboard, get_rate_cost_keyboard,
+    remove_keyboard, RATE_COST_BUTTON_PREFIX
+)
+from bot.utils.states import (
+    EstimateStates, TemplateStates, AIStates, ImportStates, BundleStates, SettingsStates, SearchStates
+)
 from bot.utils.decorators import error_handler
-from bot.utils.validators import validate_duration, validate_cost, validate_text_length, sanitize_text
-from bot.utils.helpers import format_estimate_card
+from bot.utils.validators import (
+    validate_duration, validate_cost, validate_text_length, validate_hourly_rate, sanitize_text,
+    parse_bulk_items, MAX_BULK_ITEMS
+)
+from bot.utils.helpers import format_estimate_card, format_item_card, format_minor, cost_by_rate
+from bot.utils.importers import (
+    aiter_import_records, ImportFormatError, SUPPORTED_EXTENSIONS
+)
+from bot.database.models import WorkTemplate
+from bot.handlers.callbacks.search import render_search_results, MIN_QUERY_LENGTH, MAX_QUERY_LENGTH
 
 logger = logging.getLogger(__name__)
 router = Router()
@@ -98,7 +113,7 @@ async def process_template_duration(message: Message, state: FSMContext, **kwarg
     
     await state.update_data(duration=duration)
     await message.answer(
-        f"✅ <b>Время:</b> {duration} ч\n\n"
+        f"✅ <b>Время:</b> {format_minor(duration)} ч\n\n"
         f"💰 Введите стоимость в рублях:\n"
         f"<i>Например: 5000 или 7500.50</i>",
         reply_markup=get_cancel_keyboard(),
@@ -118,7 +133,7 @@ async def process_template_cost(message: Message, state: FSMContext, **kwargs):
     
     await state.update_data(cost=cost)
     await message.answer(
-        f"✅ <b>Стоимость:</b> {cost} ₽\n\n"
+        f"✅ <b>Стоимость:</b> {format_minor(cost)} ₽\n\n"
         f"📂 Выберите категорию:",
         reply_markup=get_category_keyboard(),
         parse_mode="HTML"
@@ -128,7 +143,7 @@ async def process_template_cost(message: Message, state: FSMContext, **kwargs):
 
 @router.message(StateFilter(TemplateStates.waiting_template_category))
 @error_handler
-async def process_template_category(message: Message, state: FSMContext, user_id: int, db, **kwargs):
+async def process_template_category(message: Message, state: FSMContext, user_id: int, db, retrieval_index, **kwargs):
     """Обработка категории и создание шаблона"""
     category = message.text
     
@@ -158,12 +173,23 @@ async def process_template_category(message: Message, state: FSMContext, user_id
             default_cost=data['cost']
         )
         
+        # Шаблон сразу доступен для ИИ-подсказок
+        retrieval_index.add_template(WorkTemplate(
+            id=template_id,
+            user_id=user_id,
+            name=data['name'],
+            description=data['description'],
+            default_duration=data['duration'],
+            default_cost=data['cost'],
+            category=category
+        ))
+        
         await message.answer(
             f"✅ <b>Шаблон создан!</b>\n\n"
             f"📝 <b>Название:</b> {data['name']}\n"
             f"📂 <b>Категория:</b> {category}\n"
-            f"⏱️ <b>Время:</b> {data['duration']} ч\n"
-            f"💰 <b>Стоимость:</b> {data['cost']} ₽",
+            f"⏱️ <b>Время:</b> {format_minor(data['duration'])} ч\n"
+            f"💰 <b>Стоимость:</b> {format_minor(data['cost'])} ₽",
             reply_markup=remove_keyboard(),
             parse_mode="HTML"
         )
@@ -184,6 +210,31 @@ async def process_template_category(message: Message, state: FSMContext, user_id
     await state.clear()
 
 
+# === СОЗДАНИЕ НАБОРОВ ШАБЛОНОВ ===
+
+@router.message(StateFilter(BundleStates.waiting_bundle_name))
+@error_handler
+async def process_bundle_name(message: Message, state: FSMContext, user_id: int, db, **kwargs):
+    """Обработка названия набора и переход к выбору шаблонов"""
+    name = sanitize_text(message.text or "")
+    
+    is_valid, error_msg = validate_text_length(name, min_length=3, max_length=100)
+    if not is_valid:
+        await message.answer(error_msg)
+        return
+    
+    await state.update_data(bundle_name=name, bundle_items=[])
+    await message.answer(
+        f"✅ <b>Название:</b> {name}",
+        reply_markup=remove_keyboard(),
+        parse_mode="HTML"
+    )
+    
+    from bot.handlers.callbacks.bundles import render_bundle_selection
+    await render_bundle_selection(message, state, user_id, db, edit=False)
+    await state.set_state(BundleStates.selecting_templates)
+
+
 # === СОЗДАНИЕ СМЕТ ===
 
 @router.message(StateFilter(EstimateStates.waiting_title))
@@ -293,19 +344,23 @@ async def process_item_name(message: Message, state: FSMContext, **kwargs):
 
 @router.message(StateFilter(EstimateStates.waiting_item_duration))
 @error_handler
-async def process_item_duration(message: Message, state: FSMContext, **kwargs):
+async def process_item_duration(message: Message, state: FSMContext, user_id: int, db, **kwargs):
     """Обработка времени выполнения позиции"""
     is_valid, duration, error_msg = validate_duration(message.text)
     if not is_valid:
         await message.answer(error_msg)
         return
     
-    await state.update_data(item_duration=duration)
+    # При заданной ставке стоимость предлагается одной кнопкой
+    hourly_rate = await db.get_hourly_rate(user_id)
+    rate_cost = cost_by_rate(duration, hourly_rate) if hourly_rate else None
+    
+    await state.update_data(item_duration=duration, rate_cost=rate_cost)
     await message.answer(
-        f"✅ <b>Время:</b> {duration} ч\n\n"
+        f"✅ <b>Время:</b> {format_minor(duration)} ч\n\n"
         f"💰 Введите стоимость в рублях:\n"
         f"<i>Например: 5000 или 7500.50</i>",
-        reply_markup=get_cancel_keyboard(),
+        reply_markup=get_rate_cost_keyboard(rate_cost) if rate_cost is not None else get_cancel_keyboard(),
         parse_mode="HTML"
     )
     await state.set_state(EstimateStates.waiting_item_cost)
@@ -315,13 +370,17 @@ async def process_item_duration(message: Message, state: FSMContext, **kwargs):
 @error_handler
 async def process_item_cost(message: Message, state: FSMContext, user_id: int, db, **kwargs):
     """Обработка стоимости позиции и добавление в смету"""
-    is_valid, cost, error_msg = validate_cost(message.text)
-    if not is_valid:
-        await message.answer(error_msg)
-        return
-    
     # Получаем все данные
     data = await state.get_data()
+    
+    if data.get('rate_cost') is not None and message.text.startswith(RATE_COST_BUTTON_PREFIX):
+        cost = data['rate_cost']
+    else:
+        is_valid, cost, error_msg = validate_cost(message.text)
+        if not is_valid:
+            await message.answer(error_msg)
+            return
+    
     estimate_id = data['estimate_id']
     
     try:
@@ -341,10 +400,10 @@ async def process_item_cost(message: Message, state: FSMContext, user_id: int, d
 ✅ <b>Позиция добавлена!</b>
 
 📝 <b>Название:</b> {data['item_name']}
-⏱️ <b>Время:</b> {data['item_duration']} ч
-💰 <b>Стоимость:</b> {cost} ₽
+⏱️ <b>Время:</b> {format_minor(data['item_duration'])} ч
+💰 <b>Стоимость:</b> {format_minor(cost)} ₽
 
-{format_estimate_card(estimate, estimate.get('items_count', 0), estimate.get('total_cost', 0), estimate.get('total_duration', 0))}
+{format_estimate_card(estimate, estimate.items_count, estimate.total_cost, estimate.total_duration)}
 """
         
         await message.answer(
@@ -369,6 +428,279 @@ async def process_item_cost(message: Message, state: FSMContext, user_id: int, d
     await state.clear()
 
 
+@router.message(StateFilter(EstimateStates.waiting_bulk_items))
+@error_handler
+async def process_bulk_items(message: Message, state: FSMContext, user_id: int, db, **kwargs):
+    """Обработка списка позиций и пакетное добавление в смету"""
+    data = await state.get_data()
+    estimate_id = data['estimate_id']
+    
+    if not await db.get_estimate_by_id(estimate_id, user_id):
+        await message.answer("⚠️ Смета не найдена!", reply_markup=remove_keyboard())
+        await state.clear()
+        return
+    
+    items = []
+    errors = []
+    for line_number, item, error_msg in parse_bulk_items(message.text or "", data.get('hourly_rate')):
+        if item:
+            items.append(item)
+        else:
+            errors.append(f"Строка {line_number}: {error_msg}")
+        if len(items) + len(errors) >= MAX_BULK_ITEMS:
+            break
+    
+    if not items:
+        text = "⚠️ Не найдено ни одной корректной позиции.\n\n"
+        text += "\n".join(errors[:10])
+        text += "\n\nИсправьте список и отправьте снова:"
+        await message.answer(text, reply_markup=get_cancel_keyboard())
+        return
+    
+    try:
+        added = await db.add_estimate_items(estimate_id, items)
+        estimate = await db.get_estimate_by_id(estimate_id, user_id)
+        
+        success_text = f"""
+✅ <b>Добавлено позиций: {added}</b>
+
+{format_estimate_card(estimate, estimate.items_count, estimate.total_cost, estimate.total_duration)}
+"""
+        if errors:
+            success_text += f"\n⚠️ <b>Пропущено строк: {len(errors)}</b>\n"
+            success_text += "\n".join(errors[:10])
+            if len(errors) > 10:
+                success_text += f"\n... и еще {len(errors) - 10}"
+        
+        await message.answer(
+            success_text,
+            reply_markup=remove_keyboard(),
+            parse_mode="HTML"
+        )
+        
+        await message.answer(
+            "Что будем делать дальше?",
+            reply_markup=get_estimate_keyboard(estimate_id),
+            parse_mode="HTML"
+        )
+        
+    except Exception as e:
+        logger.error(f"Ошибка пакетного добавления позиций: {e}")
+        await message.answer(
+            "⚠️ Ошибка при добавлении позиций. Попробуйте позже.",
+            reply_markup=remove_keyboard()
+        )
+    
+    await state.clear()
+
+
+# === РЕДАКТИРОВАНИЕ СМЕТ ===
+
+@router.message(StateFilter(EstimateStates.editing_item))
+@error_handler
+async def process_edit_item(message: Message, state: FSMContext, user_id: int, db, **kwargs):
+    """Обработка нового значения поля позиции"""
+    data = await state.get_data()
+    field = data['item_field']
+
+    if field == 'name':
+        value = sanitize_text(message.text)
+        is_valid, error_msg = validate_text_length(value, min_length=3, max_length=200)
+    elif field == 'duration':
+        is_valid, value, error_msg = validate_duration(message.text)
+    else:
+        is_valid, value, error_msg = validate_cost(message.text)
+
+    if not is_valid:
+        await message.answer(error_msg)
+        return
+
+    updated = await db.update_estimate_item(data['item_id'], user_id, **{field: value})
+    await state.clear()
+
+    if not updated:
+        await message.answer("⚠️ Позиция не найдена!", reply_markup=remove_keyboard())
+        return
+
+    item = await db.get_estimate_item(data['item_id'], user_id)
+    await message.answer("✅ Позиция обновлена!", reply_markup=remove_keyboard())
+    await message.answer(
+        format_item_card(item),
+        reply_markup=get_item_edit_keyboard(item.id, item.estimate_id),
+        parse_mode="HTML"
+    )
+
+
+@router.message(StateFilter(EstimateStates.editing_estimate))
+@error_handler
+async def process_edit_estimate_title(message: Message, state: FSMContext, user_id: int, db, **kwargs):
+    """Обработка нового названия сметы"""
+    title = sanitize_text(message.text)
+
+    is_valid, error_msg = validate_text_length(title, min_length=3, max_length=200)
+    if not is_valid:
+        await message.answer(error_msg)
+        return
+
+    data = await state.get_data()
+    estimate_id = data['estimate_id']
+    updated = await db.update_estimate_title(estimate_id, user_id, title)
+    await state.clear()
+
+    if not updated:
+        await message.answer("⚠️ Смета не найдена!", reply_markup=remove_keyboard())
+        return
+
+    await message.answer(
+        f"✅ <b>Название изменено:</b> {title}",
+        reply_markup=remove_keyboard(),
+        parse_mode="HTML"
+    )
+    await message.answer(
+        "Что будем делать дальше?",
+        reply_markup=get_estimate_keyboard(estimate_id),
+        parse_mode="HTML"
+    )
+
+
+# === НАСТРОЙКИ ===
+
+@router.message(StateFilter(SettingsStates.waiting_hourly_rate))
+@error_handler
+async def process_hourly_rate(message: Message, state: FSMContext, user_id: int, db, **kwargs):
+    """Обработка почасовой ставки"""
+    is_valid, rate, error_msg = validate_hourly_rate(message.text)
+    if not is_valid:
+        await message.answer(error_msg)
+        return
+    
+    await db.set_hourly_rate(user_id, rate)
+    await state.clear()
+    
+    await message.answer(
+        f"✅ <b>Ставка сохранена:</b> {format_minor(rate)} ₽/ч\n\n"
+        f"Стоимость новых позиций будет предлагаться как часы × ставка.",
+        reply_markup=remove_keyboard(),
+        parse_mode="HTML"
+    )
+    await message.answer(
+        "🏗️ <b>Главное меню</b>",
+        reply_markup=get_main_keyboard(),
+        parse_mode="HTML"
+    )
+
+
+# === ПОИСК ===
+
+@router.message(StateFilter(SearchStates.waiting_query))
+@error_handler
+async def process_search_query(message: Message, state: FSMContext, user_id: int, db, **kwargs):
+    """Обработка поисковой фразы"""
+    query = sanitize_text(message.text or "")
+    if not MIN_QUERY_LENGTH <= len(query) <= MAX_QUERY_LENGTH:
+        await message.answer(f"⚠️ Запрос должен быть от {MIN_QUERY_LENGTH} до {MAX_QUERY_LENGTH} символов")
+        return
+    
+    # Фраза остается в данных состояния для следующих страниц
+    await state.set_state(None)
+    await state.update_data(search_query=query)
+    
+    await message.answer("⏳ Ищу...", reply_markup=remove_keyboard())
+    text, keyboard = await render_search_results(query, user_id, db)
+    await message.answer(text, reply_markup=keyboard, parse_mode="HTML")
+
+
+# === ИМПОРТ ИЗ ФАЙЛОВ ===
+
+# Ограничение Telegram на скачивание файлов ботом
+MAX_IMPORT_FILE_SIZE = 20 * 1024 * 1024
+
+
+@router.message(StateFilter(ImportStates.waiting_import_file))
+@error_handler
+async def process_import_file(message: Message, state: FSMContext, user_id: int, db, retrieval_index, **kwargs):
+    """Импорт позиций или шаблонов из CSV/XLSX файла"""
+    document = message.document
+    if not document:
+        await message.answer("📎 Отправьте файл CSV или XLSX")
+        return
+    
+    extension = os.path.splitext((document.file_name or "").lower())[1]
+    if extension not in SUPPORTED_EXTENSIONS:
+        await message.answer("⚠️ Поддерживаются только файлы CSV и XLSX")
+        return
+    
+    if document.file_size and document.file_size > MAX_IMPORT_FILE_SIZE:
+        await message.answer("⚠️ Файл слишком большой (максимум 20 МБ)")
+        return
+    
+    data = await state.get_data()
+    target = data.get('import_target')
+    estimate_id = data.get('estimate_id')
+    
+    if target == "estimate" and not await db.get_estimate_by_id(estimate_id, user_id):
+        await message.answer("⚠️ Смета не найдена!", reply_markup=remove_keyboard())
+        await state.clear()
+        return
+    
+    await message.answer("⏳ Импортирую файл...")
+    
+    # Файл скачивается на диск и читается построчно, а не целиком в память
+    with tempfile.NamedTemporaryFile(suffix=extension, delete=False) as tmp_file:
+        path = tmp_file.name
+    
+    errors = []
+    try:
+        await message.bot.download(document, destination=path)
+        # Файл разбирается пачками в рабочем потоке, пока идет COPY
+        records = aiter_import_records(path, document.file_name, errors)
+        
+        if target == "estimate":
+            imported = await db.import_estimate_items(estimate_id, records)
+        else:
+            templates = await db.import_templates(user_id, records)
+            for template in templates:
+                retrieval_index.add_template(template)
+            imported = len(templates)
+    except ImportFormatError as e:
+        await message.answer(f"⚠️ {e}\n\nИсправьте файл и отправьте снова:")
+        return
+    except Exception as e:
+        logger.error(f"Ошибка импорта файла: {e}")
+        await message.answer(
+            "⚠️ Ошибка при импорте файла. Попробуйте позже.",
+            reply_markup=remove_keyboard()
+        )
+        await state.clear()
+        return
+    finally:
+        os.remove(path)
+    
+    text = f"✅ <b>Импортировано: {imported}</b>"
+    if errors:
+        text += f"\n\n⚠️ <b>Пропущено строк: {len(errors)}</b>\n"
+        text += "\n".join(errors[:10])
+        if len(errors) > 10:
+            text += f"\n... и еще {len(errors) - 10}"
+    
+    await message.answer(text, reply_markup=remove_keyboard(), parse_mode="HTML")
+    
+    if target == "estimate":
+        await message.answer(
+            "Что будем делать дальше?",
+            reply_markup=get_estimate_keyboard(estimate_id),
+            parse_mode="HTML"
+        )
+    else:
+        await message.answer(
+            "🏗️ <b>Главное меню</b>",
+            reply_markup=get_main_keyboard(),
+            parse_mode="HTML"
+        )
+    
+    await state.clear()
+
+
 # === ИИ-ПОМОЩНИК ===
 
 @router.message(StateFilter(AIStates.waiting_ai_description))
@@ -19,6 +19,7 @@ def get_main_keyboard():
             InlineKeyboardButton(text="🔧 Шаблоны работ", callback_data="work_templates"),
             InlineKeyboardButton(text="🤖 ИИ-помощник", callback_data="ai_assistant")
         ],
+        [InlineKeyboardButton(text="🔍 Поиск по сметам", callback_data="search_estimates")],
         [
             InlineKeyboardButton(text="⚙️ Настройки", callback_data="settings"),
             InlineKeyboardButton(text="❓ Помощь", callback_data="help")
@@ -50,6 +51,16 @@ def get_estimate_keyboard(estimate_id: int):
                 callback_data=f"ai_analyze:{estimate_id}"
             )
         ],
+        [
+            InlineKeyboardButton(
+                text="📑 Копировать",
+                callback_data=f"clone_estimate:{estimate_id}"
+            ),
+            InlineKeyboardButton(
+                text="🕓 Версии",
+                callback_data=f"estimate_versions:{estimate_id}"
+            )
+        ],
         [
             InlineKeyboardButton(
                 text="🗑️ Удалить", 
@@ -78,6 +89,8 @@ def get_work_templates_keyboard():
             InlineKeyboardButton(text="➕ Создать шаблон", callback_data="create_template"),
             InlineKeyboardButton(text="📋 Мои шаблоны", callback_data="my_templates")
         ],
+        [InlineKeyboardButton(text="📦 Наборы шаблонов", callback_data="template_bundles")],
+        [InlineKeyboardButton(text="📥 Импорт из файла", callback_data="import_templates")],
         [InlineKeyboardButton(text="◀️ Назад", callback_data="main_menu")]
     ]
     return InlineKeyboardMarkup(inline_keyboard=keyboard_buttons)
@@ -90,10 +103,22 @@ def get_add_item_method_keyboard(estimate_id: int):
             text="🔧 Из шаблона", 
             callback_data=f"add_from_template:{estimate_id}"
         )],
+        [InlineKeyboardButton(
+            text="📦 Из набора", 
+            callback_data=f"add_from_bundle:{estimate_id}"
+        )],
         [InlineKeyboardButton(
             text="✏️ Вручную", 
             callback_data=f"add_manual:{estimate_id}"
         )],
+        [InlineKeyboardButton(
+            text="📋 Списком", 
+            callback_data=f"add_bulk:{estimate_id}"
+        )],
+        [InlineKeyboardButton(
+            text="📥 Из файла CSV/XLSX", 
+            callback_data=f"import_items:{estimate_id}"
+        )],
         [InlineKeyboardButton(
             text="◀️ Назад", 
             callback_data=f"show_estimate:{estimate_id}"
@@ -102,6 +127,104 @@ def get_add_item_method_keyboard(estimate_id: int):
     return InlineKeyboardMarkup(inline_keyboard=keyboard_buttons)
 
 
+def get_bundle_selection_keyboard(templates: list, selected: dict):
+    """Клавиатура выбора шаблонов для набора"""
+    keyboard_buttons = []
+    for template in templates:
+        quantity = selected.get(template.id)
+        mark = f"✅ ×{quantity}" if quantity else "➕"
+        keyboard_buttons.append([InlineKeyboardButton(
+            text=f"{mark} {template.name[:30]}",
+            callback_data=f"bundle_add:{template.id}"
+        )])
+    
+    keyboard_buttons.append([
+        InlineKeyboardButton(text="🧹 Очистить", callback_data="bundle_clear"),
+        InlineKeyboardButton(text="💾 Сохранить", callback_data="bundle_save")
+    ])
+    keyboard_buttons.append([InlineKeyboardButton(text="◀️ Отмена", callback_data="template_bundles")])
+    return InlineKeyboardMarkup(inline_keyboard=keyboard_buttons)
+
+
+def get_estimate_edit_keyboard(estimate_id: int, items: list):
+    """Клавиатура выбора позиции для редактирования"""
+    keyboard_buttons = [
+        [InlineKeyboardButton(
+            text=f"✏️ {i}. {item.name[:30]}",
+            callback_data=f"edit_item:{item.id}"
+        )]
+        for i, item in enumerate(items, 1)
+    ]
+    keyboard_buttons.append([
+        InlineKeyboardButton(text="📝 Название сметы", callback_data=f"rename_estimate:{estimate_id}"),
+        InlineKeyboardButton(text="💵 По ставке", callback_data=f"reprice_estimate:{estimate_id}")
+    ])
+    keyboard_buttons.append([InlineKeyboardButton(
+        text="◀️ К смете",
+        callback_data=f"show_estimate:{estimate_id}"
+    )])
+    return InlineKeyboardMarkup(inline_keyboard=keyboard_buttons)
+
+
+def get_item_edit_keyboard(item_id: int, estimate_id: int):
+    """Клавиатура редактирования позиции сметы"""
+    keyboard_buttons = [
+        [
+            InlineKeyboardButton(text="📝 Название", callback_data=f"edit_item_field:{item_id}:name"),
+            InlineKeyboardButton(text="⏱️ Время", callback_data=f"edit_item_field:{item_id}:duration"),
+            InlineKeyboardButton(text="💰 Стоимость", callback_data=f"edit_item_field:{item_id}:cost")
+        ],
+        [
+            InlineKeyboardButton(text="⬆️ Выше", callback_data=f"move_item:{item_id}:up"),
+            InlineKeyboardButton(text="⬇️ Ниже", callback_data=f"move_item:{item_id}:down")
+        ],
+        [InlineKeyboardButton(text="🗑️ Удалить позицию", callback_data=f"delete_item:{item_id}")],
+        [InlineKeyboardButton(text="◀️ К позициям", callback_data=f"edit_estimate:{estimate_id}")]
+    ]
+    return InlineKeyboardMarkup(inline_keyboard=keyboard_buttons)
+
+
+def get_settings_keyboard(has_rate: bool):
+    """Клавиатура настроек"""
+    keyboard_buttons = [[InlineKeyboardButton(
+        text="💵 Почасовая ставка",
+        callback_data="set_hourly_rate"
+    )]]
+    if has_rate:
+        keyboard_buttons.append([InlineKeyboardButton(
+            text="🔄 Пересчитать черновики по ставке",
+            callback_data="reprice_drafts"
+        )])
+        keyboard_buttons.append([InlineKeyboardButton(
+            text="🗑️ Сбросить ставку",
+            callback_data="clear_hourly_rate"
+        )])
+    keyboard_buttons.append([InlineKeyboardButton(text="◀️ Назад", callback_data="main_menu")])
+    return InlineKeyboardMarkup(inline_keyboard=keyboard_buttons)
+
+
+def get_search_results_keyboard(results: list, page: int, has_more: bool):
+    """Клавиатура результатов поиска"""
+    keyboard_buttons = [
+        [InlineKeyboardButton(
+            text=f"📄 {result.title[:35]}",
+            callback_data=f"show_estimate:{result.id}"
+        )]
+        for result in results
+    ]
+    if has_more:
+        last = results[-1]
+        keyboard_buttons.append([InlineKeyboardButton(
+            text="➡️ Еще",
+            callback_data=f"search_more:{page + 1}:{last.score!r}:{last.id}"
+        )])
+    keyboard_buttons.append([
+        InlineKeyboardButton(text="🔍 Новый поиск", callback_data="search_estimates"),
+        InlineKeyboardButton(text="◀️ Меню", callback_data="main_menu")
+    ])
+    return InlineKeyboardMarkup(inline_keyboard=keyboard_buttons)
+
+
 def get_ai_keyboard():
     """Клавиатура ИИ-помощника"""
     keyboard_buttons = [
@@ -3,6 +3,11 @@ Reply клавиатуры
 """
 from aiogram.types import ReplyKeyboardMarkup, KeyboardButton
 
+from bot.utils.helpers import format_minor
+
+# Начало текста кнопки подстановки стоимости по ставке
+RATE_COST_BUTTON_PREFIX = "💡 По ставке:"
+
 
 def get_cancel_keyboard():
     """Клавиатура отмены действия"""
@@ -27,6 +32,19 @@ def get_skip_keyboard():
     return keyboard
 
 
+def get_rate_cost_keyboard(cost: int):
+    """Клавиатура ввода стоимости с расчетом по ставке"""
+    keyboard = ReplyKeyboardMarkup(
+        keyboard=[
+            [KeyboardButton(text=f"{RATE_COST_BUTTON_PREFIX} {format_minor(cost)} ₽")],
+            [KeyboardButton(text="🚫 Отмена")]
+        ],
+        resize_keyboard=True,
+        one_time_keyboard=True
+    )
+    return keyboard
+
+
 def get_category_keyboard():
     """Клавиатура выбора категории шаблона"""
     categories = [
@@ -3,22 +3,85 @@
 """
 import asyncio
 import logging
+from typing import Any, AsyncIterator, Dict, Optional
 
 from aiogram import Bot, Dispatcher
 from aiogram.fsm.storage.memory import MemoryStorage
+from aiogram.types import Update
 
 from bot.config import Config
 from bot.database.database import Database
-from bot.handlers import messages, callbacks, inline
+from bot.handlers import admin, messages, callbacks, inline
 from bot.handlers.commands import setup_commands_router
 from bot.middlewares.logging import LoggingMiddleware
 from bot.middlewares.auth import AuthMiddleware
+from bot.middlewares.recorder import UpdateRecorderMiddleware
+from bot.services import RetrievalIndex, GigaChatClient, TemplateSearch, UserOrderedDispatcher, LoopLagMonitor
+from bot.services.scheduler import PeriodicTask
+from bot.utils.metrics import log_metrics
 
 logger = logging.getLogger(__name__)
 
 
-async def main():
-    """Главная функция запуска бота"""
+def setup_routers(dp: Dispatcher) -> None:
+    """Регистрация роутеров"""
+    dp.include_router(admin.router)
+    dp.include_router(setup_commands_router(logger))
+    dp.include_router(callbacks.setup_callbacks_router())
+    dp.include_router(messages.router)
+    dp.include_router(inline.router)
+
+
+async def setup_dispatcher(dp: Dispatcher, config: Config, db: Database) -> None:
+    """Подключение middleware, роутеров и зависимостей обработчиков"""
+    # Индекс подсказок для ИИ по шаблонам и истории позиций
+    retrieval_index = RetrievalIndex()
+    retrieval_index.rebuild(
+        await db.get_indexable_templates(),
+        await db.get_items_history()
+    )
+    
+    # Запись входящих обновлений для нагрузочного воспроизведения (benchmarks/replay.py)
+    if config.update_record_path:
+        dp.update.outer_middleware(UpdateRecorderMiddleware(config.update_record_path, config.update_record_salt))
+        logger.info(f"Обновления записываются в {config.update_record_path}")
+    
+    # Подключение middleware
+    dp.message.middleware(LoggingMiddleware(logger))
+    dp.callback_query.middleware(LoggingMiddleware(logger))
+    dp.message.middleware(AuthMiddleware(db))
+    dp.callback_query.middleware(AuthMiddleware(db))
+    dp.inline_query.middleware(AuthMiddleware(db))
+    
+    # Регистрация роутеров
+    setup_routers(dp)
+    
+    # Передаем зависимости в контекст
+    dp["config"] = config
+    dp["db"] = db
+    dp["retrieval_index"] = retrieval_index
+    dp["template_search"] = TemplateSearch(db)
+    dp["ai_client"] = GigaChatClient(
+        config.gigachat_credentials,
+        config.gigachat_scope,
+        config.gigachat_model
+    ) if config.is_ai_available else None
+
+
+def split_pool_size(size: int, workers: int) -> int:
+    """Доля пула подключений одного процесса, чтобы сумма по процессам не превышала size"""
+    return max(1, size // workers)
+
+
+async def main(updates: Optional[AsyncIterator[Dict[str, Any]]] = None,
+               worker_index: int = 0, workers: int = 1):
+    """
+    Главная функция запуска бота
+
+    Без updates бот сам получает обновления. В многопроцессном режиме
+    (см. bot/workers.py) обновления приходят от процесса-распределителя,
+    а пулы подключений к БД делятся между процессами.
+    """
     try:
         # Инициализация конфигурации
         config = Config.from_env()
@@ -29,35 +92,97 @@ async def main():
         dp = Dispatcher(storage=MemoryStorage())
         
         # Инициализация базы данных
-        db = Database(config.database_url, logger)
+        pool_max_size = split_pool_size(config.db_pool_max_size, workers)
+        read_pool_max_size = split_pool_size(config.db_read_pool_max_size, workers)
+        db = Database(
+            config.database_url,
+            logger,
+            read_database_url=config.database_read_url,
+            pool_min_size=min(config.db_pool_min_size, pool_max_size),
+            pool_max_size=pool_max_size,
+            read_pool_min_size=min(config.db_read_pool_min_size, read_pool_max_size),
+            read_pool_max_size=read_pool_max_size,
+            read_after_write_window=config.read_after_write_window
+        )
         await db.init_db()
         logger.info("База данных инициализирована")
         
-        # Подключение middleware
-        dp.message.middleware(LoggingMiddleware(logger))
-        dp.callback_query.middleware(LoggingMiddleware(logger))
-        dp.message.middleware(AuthMiddleware(db))
-        dp.callback_query.middleware(AuthMiddleware(db))
+        await setup_dispatcher(dp, config, db)
+        
+        # Фоновые задачи: запись использований шаблонов в каждом процессе,
+        # затухание популярности, очистка удаленных смет и архивация - в первом
+        background_tasks = [
+            PeriodicTask(
+                "template-usage-flush",
+                config.usage_flush_interval,
+                db.flush_template_usage
+            ),
+        ]
+        if config.metrics_log_interval > 0:
+            # Метрики каждого процесса пишутся в лог отдельно
+            background_tasks.append(PeriodicTask(
+                "metrics-log",
+                config.metrics_log_interval,
+                lambda: log_metrics(logger, worker_index)
+            ))
+        if worker_index == 0:
+            background_tasks += [
+                PeriodicTask(
+                    "template-popularity-decay",
+                    config.popularity_decay_interval,
+                    db.decay_template_popularity
+                ),
+                PeriodicTask(
+                    "deleted-estimates-purge",
+                    config.estimate_purge_interval,
+                    lambda: db.purge_deleted_estimates(config.estimate_purge_delay)
+                ),
+                PeriodicTask(
+                    "inactive-estimates-archive",
+                    config.archive_interval,
+                    lambda: db.archive_inactive_estimates(config.archive_after_months)
+                ),
+            ]
+        for task in background_tasks:
+            task.start()
         
-        # Регистрация роутеров
-        dp.include_router(setup_commands_router(logger))
-        dp.include_router(callbacks.router)
-        dp.include_router(messages.router)
-        dp.include_router(inline.router)
+        # Задержки событийного цикла и стеки блокирующего его кода
+        if config.loop_lag_threshold > 0:
+            loop_monitor = LoopLagMonitor(config.loop_lag_interval, config.loop_lag_threshold)
+            loop_monitor.start()
         
-        # Передаем зависимости в контекст
-        dp["config"] = config
-        dp["db"] = db
+        # Обновления одного пользователя обрабатываются по порядку, разных - параллельно
+        dispatcher = UserOrderedDispatcher(
+            dp,
+            bot,
+            logger,
+            shards=config.dispatch_shards,
+            workers_per_shard=config.dispatch_workers_per_shard,
+            max_pending=config.dispatch_max_pending,
+            idle_timeout=config.dispatch_idle_timeout
+        )
         
-        logger.info("Бот запущен!")
-        await dp.start_polling(bot)
+        logger.info(f"Бот запущен! Процесс {worker_index + 1} из {workers}")
+        if updates is None:
+            await dispatcher.run()
+        else:
+            await dispatcher.run(
+                Update.model_validate(update, context={"bot": bot}) async for update in updates
+            )
         
     except Exception as e:
         logger.error(f"Критическая ошибка при запуске бота: {e}")
         raise
     finally:
+        if 'background_tasks' in locals():
+            for task in background_tasks:
+                await task.stop()
+        if 'loop_monitor' in locals():
+            await loop_monitor.stop()
         if 'db' in locals():
             await db.close()
+        if 'bot' in locals():
+            await bot.session.close()
         logger.info("Бот остановлен")
 
 
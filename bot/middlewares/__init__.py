@@ -4,5 +4,6 @@
 
 from .auth import AuthMiddleware
 from .logging import LoggingMiddleware
+from .recorder import UpdateRecorderMiddleware
 
-__all__ = ['AuthMiddleware', 'LoggingMiddleware'] 
\ No newline at end of file
+__all__ = ['AuthMiddleware', 'LoggingMiddleware', 'UpdateRecorderMiddleware'] 
\ No newline at end of file
@@ -5,9 +5,10 @@ import logging
 from typing import Callable, Dict, Any, Awaitable
 
 from aiogram import BaseMiddleware
-from aiogram.types import TelegramObject, Message, CallbackQuery
+from aiogram.types import TelegramObject, Message, CallbackQuery, InlineQuery
 
 from bot.database.database import Database
+from bot.database.routing import current_user
 
 logger = logging.getLogger(__name__)
 
@@ -29,10 +30,12 @@ class AuthMiddleware(BaseMiddleware):
         user = None
         
         # Извлекаем пользователя из события
-        if isinstance(event, (Message, CallbackQuery)):
+        if isinstance(event, (Message, CallbackQuery, InlineQuery)):
             user = event.from_user
         
         if user:
+            # По Telegram ID запросы пользователя закрепляются за основной базой после записи
+            current_user.set(user.id)
             try:
                 # Пытаемся найти пользователя в базе
                 db_user = await self.db.get_user_by_telegram_id(user.id)
@@ -51,9 +54,9 @@ class AuthMiddleware(BaseMiddleware):
                     db_user = await self.db.get_user_by_telegram_id(user.id)
                 else:
                     # Обновляем информацию о пользователе если она изменилась
-                    if (db_user['username'] != user.username or 
-                        db_user['first_name'] != user.first_name or 
-                        db_user['last_name'] != user.last_name):
+                    if (db_user.username != user.username or 
+                        db_user.first_name != user.first_name or 
+                        db_user.last_name != user.last_name):
                         
                         await self.db.create_user(
                             telegram_id=user.id,
@@ -65,7 +68,7 @@ class AuthMiddleware(BaseMiddleware):
                 
                 # Добавляем пользователя в данные для хендлера
                 data['user'] = db_user
-                data['user_id'] = db_user['id']
+                data['user_id'] = db_user.id
                 
             except Exception as e:
                 logger.error(f"Error in auth middleware for user {user.id}: {e}")
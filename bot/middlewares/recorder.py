@@ -0,0 +1,87 @@
+"""
+Middleware для записи входящих обновлений
+"""
+import hashlib
+import hmac
+import json
+import time
+from typing import Callable, Dict, Any, Awaitable
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, Update
+
+# Объекты Bot API, у которых id - это Telegram ID пользователя или чата
+IDENTITY_KEYS = ('from', 'chat', 'user', 'sender_chat')
+
+# Поля, которые не попадают в запись
+PRIVATE_FIELDS = ('username', 'last_name', 'phone_number', 'bio', 'photo')
+
+
+def anonymize_id(value: int, salt: bytes) -> int:
+    """Стабильная замена Telegram ID: один и тот же ID дает одно и то же число"""
+    digest = hmac.new(salt, str(abs(value)).encode(), hashlib.sha256).digest()
+    anonymous = int.from_bytes(digest[:5], 'big') + 1
+    # Знак сохраняет тип чата: у групп и каналов ID отрицательные
+    return -anonymous if value < 0 else anonymous
+
+
+def anonymize_update(value: Any, salt: bytes) -> Any:
+    """
+    Копия обновления без персональных данных
+
+    Telegram ID заменяются ключевым хешем, имена - заглушкой,
+    юзернеймы и телефоны удаляются. Тексты сообщений и данные кнопок
+    сохраняются: без них обновление нельзя воспроизвести.
+    """
+    if isinstance(value, list):
+        return [anonymize_update(item, salt) for item in value]
+    if not isinstance(value, dict):
+        return value
+
+    result = {}
+    for key, item in value.items():
+        if key in PRIVATE_FIELDS:
+            continue
+        item = anonymize_update(item, salt)
+        if key in IDENTITY_KEYS and isinstance(item, dict):
+            if 'id' in item:
+                item['id'] = anonymize_id(item['id'], salt)
+            if 'first_name' in item:
+                item['first_name'] = "User"
+            if 'title' in item:
+                item['title'] = "Chat"
+        result[key] = item
+    return result
+
+
+class UpdateRecorderMiddleware(BaseMiddleware):
+    """
+    Middleware для записи обновлений в файл JSON Lines
+
+    Каждая строка - {"t": секунды от начала записи, "update": обновление}.
+    Файл воспроизводится нагрузочным стендом: python -m benchmarks.replay --updates FILE
+    """
+    
+    def __init__(self, path: str, salt: str):
+        self.salt = salt.encode()
+        self.started_at = time.monotonic()
+        # Построчная буферизация: запись не теряется при остановке процесса
+        self.file = open(path, 'a', encoding='utf-8', buffering=1)
+        super().__init__()
+    
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        """Обработка события"""
+        if isinstance(event, Update):
+            raw = event.model_dump(mode='json', by_alias=True, exclude_none=True)
+            record = {
+                't': round(time.monotonic() - self.started_at, 3),
+                'update': anonymize_update(raw, self.salt)
+            }
+            self.file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        
+        return await handler(event, data)
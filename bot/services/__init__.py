@@ -0,0 +1,16 @@
+"""
+Сервисы бота, работающие в памяти процесса
+"""
+
+from .retrieval import RetrievalIndex, RetrievedItem
+from .gigachat import GigaChatClient, build_estimate_prompt
+from .template_search import TemplateSearch
+from .dispatch import UserOrderedDispatcher
+from .profiling import SamplingProfiler, MemorySnapshots
+from .loop_monitor import LoopLagMonitor
+
+__all__ = [
+    'RetrievalIndex', 'RetrievedItem', 'GigaChatClient', 'build_estimate_prompt',
+    'TemplateSearch', 'UserOrderedDispatcher', 'SamplingProfiler', 'MemorySnapshots',
+    'LoopLagMonitor'
+]
@@ -0,0 +1,226 @@
+"""
+Упорядоченная по пользователям обработка обновлений
+"""
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Deque, Dict, Hashable, List, Optional
+
+from aiogram import Bot, Dispatcher
+from aiogram.types import Update
+
+from bot.utils.metrics import metrics
+
+# Типы обновлений, у которых есть отправитель
+USER_EVENTS = (
+    'message', 'edited_message', 'callback_query', 'inline_query', 'chosen_inline_result',
+    'shipping_query', 'pre_checkout_query', 'poll_answer', 'my_chat_member', 'chat_member',
+    'chat_join_request'
+)
+
+# Пауза перед повтором getUpdates после ошибки (секунды)
+POLLING_RETRY_DELAY = 5.0
+
+
+def get_update_user(update: Update) -> Optional[int]:
+    """Telegram ID отправителя обновления"""
+    for name in USER_EVENTS:
+        event = getattr(update, name, None)
+        if event is not None:
+            user = getattr(event, 'from_user', None) or getattr(event, 'user', None)
+            return user.id if user else None
+    return None
+
+
+def get_raw_update_user(update: Dict[str, Any]) -> Optional[int]:
+    """Telegram ID отправителя обновления в виде JSON от Bot API"""
+    for name in USER_EVENTS:
+        event = update.get(name)
+        if event is not None:
+            user = event.get('from') or event.get('user')
+            return user['id'] if user else None
+    return None
+
+
+class UserQueue:
+    """Очередь обновлений одного пользователя"""
+    __slots__ = ('updates', 'scheduled', 'last_active')
+
+    def __init__(self):
+        self.updates: Deque = deque()
+        # Очередь стоит в очереди готовых или обрабатывается
+        self.scheduled = False
+        self.last_active = time.monotonic()
+
+
+class Shard:
+    """Группа пользователей с общей очередью готовых и своими обработчиками"""
+
+    def __init__(self, index: int):
+        self.index = index
+        self.ready: asyncio.Queue = asyncio.Queue()
+        self.lag = metrics.histogram(
+            f"dispatch_shard_{index}_lag_seconds", "Ожидание обновления до начала обработки"
+        )
+        self.pending = metrics.gauge(
+            f"dispatch_shard_{index}_pending", "Необработанных обновлений"
+        )
+
+
+class UserOrderedDispatcher:
+    """
+    Обработка обновлений: по порядку для каждого пользователя, параллельно между пользователями.
+
+    Обновления получаются собственным циклом getUpdates или от процесса-
+    распределителя (см. bot/workers.py) и раскладываются по очередям
+    пользователей. Очередь пользователя обрабатывается не более
+    чем одним обработчиком одновременно, поэтому шаги FSM не перемешиваются.
+    Пользователи распределены по шардам; у каждого шарда фиксированное
+    число обработчиков, так что общее число задач ограничено.
+    """
+
+    def __init__(self, dp: Dispatcher, bot: Bot, logger: logging.Logger,
+                 shards: int = 4, workers_per_shard: int = 4,
+                 max_pending: int = 1000, idle_timeout: float = 300.0,
+                 polling_timeout: int = 30):
+        self.dp = dp
+        self.bot = bot
+        self.logger = logger
+        self.shards = [Shard(index) for index in range(shards)]
+        self.workers_per_shard = workers_per_shard
+        self.idle_timeout = idle_timeout
+        self.polling_timeout = polling_timeout
+        self._queues: Dict[Hashable, UserQueue] = {}
+        # Пока обработчики не догонят, новые обновления не запрашиваются
+        self._capacity = asyncio.Semaphore(max_pending)
+        self._pending = 0
+        self._drained = asyncio.Event()
+        self._drained.set()
+        self._tasks: List[asyncio.Task] = []
+        self._queues_gauge = metrics.gauge("dispatch_user_queues", "Очередей пользователей в памяти")
+
+    def submit(self, update: Update) -> None:
+        """Постановка обновления в очередь его пользователя"""
+        user = get_update_user(update)
+        # Обновления без отправителя не упорядочиваются
+        key = user if user is not None else ('update', update.update_id)
+
+        queue = self._queues.get(key)
+        if queue is None:
+            queue = self._queues[key] = UserQueue()
+            self._queues_gauge.set(len(self._queues))
+        queue.updates.append((update, time.monotonic()))
+        queue.last_active = time.monotonic()
+
+        shard = self._get_shard(key)
+        shard.pending.set(shard.pending.value + 1)
+        self._pending += 1
+        self._drained.clear()
+
+        if not queue.scheduled:
+            queue.scheduled = True
+            shard.ready.put_nowait(key)
+
+    def _get_shard(self, key: Hashable) -> Shard:
+        return self.shards[hash(key) % len(self.shards)]
+
+    async def _worker(self, shard: Shard) -> None:
+        while True:
+            key = await shard.ready.get()
+            queue = self._queues[key]
+            update, received_at = queue.updates.popleft()
+            shard.lag.observe(time.monotonic() - received_at)
+
+            try:
+                await self.dp.feed_update(self.bot, update)
+            except Exception as e:
+                self.logger.error(f"Ошибка обработки обновления {update.update_id}: {e}", exc_info=True)
+            finally:
+                queue.last_active = time.monotonic()
+                shard.pending.set(shard.pending.value - 1)
+                self._pending -= 1
+                if self._pending == 0:
+                    self._drained.set()
+                self._capacity.release()
+
+                # Следующее обновление пользователя встает в конец очереди готовых,
+                # чтобы активный пользователь не занимал обработчик целиком
+                if queue.updates:
+                    shard.ready.put_nowait(key)
+                else:
+                    queue.scheduled = False
+
+    async def _collect_idle(self) -> None:
+        """Удаление давно пустых очередей пользователей"""
+        while True:
+            await asyncio.sleep(self.idle_timeout)
+            deadline = time.monotonic() - self.idle_timeout
+            idle = [
+                key for key, queue in self._queues.items()
+                if not queue.scheduled and queue.last_active < deadline
+            ]
+            for key in idle:
+                del self._queues[key]
+            self._queues_gauge.set(len(self._queues))
+            if idle:
+                self.logger.debug(f"Удалено простаивающих очередей пользователей: {len(idle)}")
+
+    async def _poll(self) -> AsyncIterator[Update]:
+        """Получение обновлений через getUpdates"""
+        allowed_updates = self.dp.resolve_used_update_types()
+        offset = None
+        while True:
+            try:
+                updates = await self.bot.get_updates(
+                    offset=offset,
+                    timeout=self.polling_timeout,
+                    allowed_updates=allowed_updates
+                )
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.logger.error(f"Ошибка получения обновлений: {e}")
+                await asyncio.sleep(POLLING_RETRY_DELAY)
+                continue
+
+            for update in updates:
+                yield update
+                # Следующий запрос подтверждает получение всех обновлений до offset
+                offset = update.update_id + 1
+
+    async def run(self, updates: Optional[AsyncIterator[Update]] = None) -> None:
+        """
+        Запуск обработчиков до отмены или конца потока обновлений
+
+        Без updates обновления получаются собственным циклом getUpdates.
+        """
+        await self.dp.emit_startup(bot=self.bot, **self.dp.workflow_data)
+        for shard in self.shards:
+            for _ in range(self.workers_per_shard):
+                self._tasks.append(asyncio.create_task(self._worker(shard)))
+        self._tasks.append(asyncio.create_task(self._collect_idle()))
+
+        self.logger.info(
+            f"Обработка обновлений: {len(self.shards)} шардов "
+            f"по {self.workers_per_shard} обработчиков"
+        )
+        try:
+            async for update in (updates if updates is not None else self._poll()):
+                await self._capacity.acquire()
+                self.submit(update)
+        finally:
+            await self._shutdown()
+
+    async def _shutdown(self, timeout: float = 10.0) -> None:
+        """Дообработка принятых обновлений и остановка обработчиков"""
+        try:
+            await asyncio.wait_for(self._drained.wait(), timeout)
+        except asyncio.TimeoutError:
+            self.logger.warning(f"Не обработано обновлений при остановке: {self._pending}")
+
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+        await self.dp.emit_shutdown(bot=self.bot, **self.dp.workflow_data)
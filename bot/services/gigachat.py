@@ -0,0 +1,64 @@
+"""
+Клиент GigaChat для генерации смет
+"""
+import logging
+from typing import List
+
+from bot.services.retrieval import RetrievedItem
+from bot.utils.helpers import format_minor
+
+logger = logging.getLogger(__name__)
+
+PROJECT_TYPES = {
+    'web_app': 'Веб-приложение',
+    'mobile_app': 'Мобильное приложение',
+    'desktop_app': 'Десктоп приложение',
+    'api': 'API/Сервис',
+    'landing': 'Лендинг',
+    'ecommerce': 'Интернет-магазин',
+    'crm': 'CRM/ERP система',
+    'other': 'Другое'
+}
+
+
+def build_estimate_prompt(description: str, project_type: str, reference_items: List[RetrievedItem]) -> str:
+    """Формирование промпта для генерации сметы"""
+    prompt = (
+        "Ты опытный руководитель IT-проектов. Составь смету работ по описанию проекта.\n"
+        f"Тип проекта: {PROJECT_TYPES.get(project_type, project_type)}\n"
+        f"Описание: {description}\n"
+    )
+
+    if reference_items:
+        # Передаем только релевантные позиции, а не весь каталог шаблонов
+        prompt += "\nОриентируйся на цены пользователя по похожим работам:\n"
+        for item in reference_items:
+            prompt += f"- {item.name}: {format_minor(item.duration)} ч, {format_minor(item.cost)} ₽\n"
+
+    prompt += (
+        "\nОтветь списком позиций в формате: Название; часы; стоимость в рублях. "
+        "В конце укажи итоговое время и стоимость."
+    )
+    return prompt
+
+
+class GigaChatClient:
+    """Обертка над SDK GigaChat"""
+
+    def __init__(self, credentials: str, scope: str, model: str):
+        self.credentials = credentials
+        self.scope = scope
+        self.model = model
+
+    async def complete(self, prompt: str) -> str:
+        """Запрос к модели"""
+        from gigachat import GigaChat
+
+        async with GigaChat(
+            credentials=self.credentials,
+            scope=self.scope,
+            model=self.model,
+            verify_ssl_certs=False
+        ) as giga:
+            response = await giga.achat(prompt)
+            return response.choices[0].message.content
@@ -0,0 +1,114 @@
+"""
+Контроль задержек событийного цикла и поиск блокирующего кода
+"""
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from typing import Optional
+
+from bot.services.profiling import HANDLERS_PATH
+from bot.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Глубина стека блокирующего кода в логе
+STALL_STACK_LIMIT = 30
+
+
+class LoopLagMonitor:
+    """
+    Измерение задержки событийного цикла и поиск блокирующего кода
+
+    Задача в цикле засыпает на interval и измеряет, насколько позже
+    проснулась: это задержка, с которой цикл берет любую готовую задачу.
+    Сторожевой поток следит за отметками задачи. Если их нет дольше
+    threshold, цикл занят синхронным кодом; поток снимает стек потока
+    цикла, пока код еще выполняется, и пишет его в лог вместе
+    с обработчиком, в котором код запущен.
+    """
+
+    def __init__(self, interval: float = 0.1, threshold: float = 0.25):
+        self.interval = interval
+        self.threshold = threshold
+        self.lag = metrics.histogram("event_loop_lag_seconds", "Задержка запуска задач в событийном цикле")
+        self.stalls = metrics.counter("event_loop_stalls", "Блокировок событийного цикла дольше порога")
+        self._heartbeat = 0.0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def start(self) -> None:
+        """Запуск измерения в текущем цикле и сторожевого потока"""
+        if self._task is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._stop.clear()
+        self._task = asyncio.create_task(self._measure(), name="loop-lag-monitor")
+        self._thread = threading.Thread(target=self._watch, name="loop-lag-watchdog", daemon=True)
+        self._thread.start()
+        logger.info(f"Контроль событийного цикла запущен (порог {self.threshold} с)")
+
+    async def stop(self) -> None:
+        """Остановка измерения и сторожевого потока"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        self._stop.set()
+        await asyncio.to_thread(self._thread.join)
+        self._thread = None
+        logger.info("Контроль событийного цикла остановлен")
+
+    async def _measure(self) -> None:
+        while True:
+            started = time.monotonic()
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            self.lag.observe(max(0.0, now - started - self.interval))
+            self._heartbeat = now
+
+    def _watch(self) -> None:
+        # Отметка, на которой замечена текущая блокировка: одна блокировка - один отчет
+        reported: Optional[float] = None
+        while not self._stop.wait(self.threshold / 2):
+            heartbeat = self._heartbeat
+            blocked = time.monotonic() - heartbeat - self.interval
+            if blocked > self.threshold and heartbeat != reported:
+                reported = heartbeat
+                self._report(blocked)
+
+    def _report(self, blocked: float) -> None:
+        """Стек и обработчик кода, занимающего цикл"""
+        frame = sys._current_frames().get(self._loop_thread)
+        if frame is None:
+            return
+        stack = traceback.extract_stack(frame)
+        handlers = [entry.name for entry in stack if entry.filename.startswith(HANDLERS_PATH)]
+        # Внешний кадр из обработчиков - сам обработчик
+        handler = handlers[0] if handlers else "unknown"
+
+        try:
+            task = asyncio.current_task(self._loop)
+        except RuntimeError:
+            task = None
+        task_name = task.get_name() if task is not None else "-"
+
+        self.stalls.inc()
+        metrics.counter(
+            f"event_loop_stalls_{handler}", f"Блокировок событийного цикла в {handler}"
+        ).inc()
+        logger.warning(
+            f"Событийный цикл заблокирован дольше {blocked:.3f} с: обработчик {handler}, задача {task_name}\n"
+            + "".join(traceback.format_list(stack[-STALL_STACK_LIMIT:]))
+        )
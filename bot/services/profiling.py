@@ -0,0 +1,204 @@
+"""
+Профилирование работающего процесса: выборочный профиль и снимки памяти
+"""
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from typing import List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Интервал между выборками стека (секунды)
+SAMPLE_INTERVAL = 0.005
+
+# Длительность профиля по умолчанию и наибольшая (секунды)
+DEFAULT_PROFILE_DURATION = 30
+MAX_PROFILE_DURATION = 300
+
+# Глубина стека, сохраняемая tracemalloc для каждого выделения
+TRACEMALLOC_FRAMES = 25
+
+# Строк в разделах отчетов
+REPORT_TOP = 30
+
+# Файлы обработчиков: по ним стек относится к обработчику
+HANDLERS_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "handlers")
+
+Frame = Tuple[str, str, int]
+
+
+def _frame_name(frame: Frame) -> str:
+    filename, name, _ = frame
+    return f"{os.path.basename(filename)}:{name}"
+
+
+def _frame_label(frame: Frame) -> str:
+    return f"{_frame_name(frame)}:{frame[2]}"
+
+
+class SamplingProfiler:
+    """
+    Выборочный профиль потока событийного цикла
+
+    Отдельный поток через SAMPLE_INTERVAL снимает стек потока цикла
+    через sys._current_frames. Накладные расходы не зависят от числа
+    вызовов, поэтому профиль можно снимать на рабочем процессе. Выборка
+    показывает, чем занят цикл: синхронный код обработчиков попадает в
+    стек, ожидание ввода-вывода - нет.
+    """
+
+    def __init__(self, interval: float = SAMPLE_INTERVAL):
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.started_at = 0.0
+        self.duration = 0.0
+        self._target: Optional[int] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> None:
+        """Запуск выборки стеков текущего потока"""
+        if self.running:
+            raise RuntimeError("Профиль уже снимается")
+        self.stacks.clear()
+        self.samples = 0
+        self._target = threading.get_ident()
+        self._stop.clear()
+        self.started_at = time.monotonic()
+        self._thread = threading.Thread(target=self._sample, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Остановка выборки"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.duration = time.monotonic() - self.started_at
+
+    async def profile(self, duration: float) -> str:
+        """Профиль за duration секунд в виде текстового отчета"""
+        self.start()
+        try:
+            await asyncio.sleep(duration)
+        finally:
+            self.stop()
+        return self.report()
+
+    def _sample(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._target)
+            stack: List[Frame] = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append((code.co_filename, code.co_name, frame.f_lineno))
+                frame = frame.f_back
+            # От корня к вершине, как в свернутых стеках flamegraph
+            self.stacks[tuple(reversed(stack))] += 1
+            self.samples += 1
+
+    def hottest_handlers(self) -> List[Tuple[str, int]]:
+        """Обработчики по числу выборок, в которых они выполнялись"""
+        handlers: Counter = Counter()
+        for stack, count in self.stacks.items():
+            names = [_frame_name(frame) for frame in stack if frame[0].startswith(HANDLERS_PATH)]
+            if names:
+                # Внешний кадр обработчика - сам обработчик, внутренние - его помощники
+                handlers[names[0]] += count
+        return handlers.most_common(REPORT_TOP)
+
+    def hottest_functions(self) -> List[Tuple[str, int]]:
+        """Функции на вершине стека по числу выборок"""
+        functions: Counter = Counter()
+        for stack, count in self.stacks.items():
+            if stack:
+                functions[_frame_label(stack[-1])] += count
+        return functions.most_common(REPORT_TOP)
+
+    def report(self) -> str:
+        """Отчет: обработчики, функции на вершине стека и свернутые стеки"""
+        total = self.samples or 1
+        lines = [
+            f"Выборочный профиль процесса {os.getpid()}",
+            f"Длительность: {self.duration:.1f} с, выборок: {self.samples}, интервал: {self.interval * 1000:g} мс",
+            "",
+            "== Обработчики (доля выборок, в которых обработчик занимал цикл) ==",
+        ]
+        lines += [f"{count / total:7.2%}  {count:7d}  {name}" for name, count in self.hottest_handlers()]
+        lines += ["", "== Вершина стека (включая ожидание событий в селекторе) =="]
+        lines += [f"{count / total:7.2%}  {count:7d}  {name}" for name, count in self.hottest_functions()]
+        lines += ["", "== Свернутые стеки (формат flamegraph.pl / speedscope) =="]
+        lines += [
+            ";".join(_frame_label(frame) for frame in stack) + f" {count}"
+            for stack, count in self.stacks.most_common()
+        ]
+        return "\n".join(lines) + "\n"
+
+
+class MemorySnapshots:
+    """
+    Снимки памяти tracemalloc и разница между соседними снимками
+
+    Трассировка включается первым снимком и замедляет выделения памяти,
+    поэтому после диагностики ее нужно выключить.
+    """
+
+    def __init__(self, frames: int = TRACEMALLOC_FRAMES):
+        self.frames = frames
+        self.previous: Optional[tracemalloc.Snapshot] = None
+        self.taken = 0
+
+    @property
+    def tracing(self) -> bool:
+        return tracemalloc.is_tracing()
+
+    def take(self) -> str:
+        """Новый снимок: крупнейшие места выделения и рост с прошлого снимка"""
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+            self.previous = None
+            self.taken = 0
+            logger.info(f"Трассировка выделений памяти включена (глубина {self.frames})")
+
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        ))
+        self.taken += 1
+        current, peak = tracemalloc.get_traced_memory()
+        lines = [
+            f"Снимок памяти {self.taken} процесса {os.getpid()}",
+            f"Отслеживается: {current / 1024 / 1024:.1f} МБ, пик: {peak / 1024 / 1024:.1f} МБ",
+            "",
+            "== Крупнейшие места выделения ==",
+        ]
+        lines += [str(stat) for stat in snapshot.statistics("lineno")[:REPORT_TOP]]
+
+        if self.previous is None:
+            lines += ["", "Первый снимок: разница будет в следующем"]
+        else:
+            lines += ["", "== Рост с прошлого снимка =="]
+            lines += [str(stat) for stat in snapshot.compare_to(self.previous, "lineno")[:REPORT_TOP]]
+            top = snapshot.compare_to(self.previous, "traceback")[:3]
+            for stat in top:
+                lines += ["", f"== Стек: {stat.size_diff / 1024:+.1f} КиБ, {stat.count_diff:+d} блоков =="]
+                lines += stat.traceback.format()
+        self.previous = snapshot
+        return "\n".join(lines) + "\n"
+
+    def stop(self) -> None:
+        """Выключение трассировки и сброс снимков"""
+        tracemalloc.stop()
+        self.previous = None
+        self.taken = 0
+        logger.info("Трассировка выделений памяти выключена")
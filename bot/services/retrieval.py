@@ -0,0 +1,187 @@
+"""
+Локальный TF-IDF индекс шаблонов и истории позиций для ИИ-подсказок
+"""
+import logging
+import math
+import re
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+from typing import Dict, Hashable, Iterable, List, Optional, Tuple
+
+from bot.database.models import WorkTemplate
+
+logger = logging.getLogger(__name__)
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+# Короткие и служебные слова не несут смысла для поиска похожих работ
+_STOP_WORDS = {
+    "для", "это", "как", "или", "что", "под", "над", "при", "без", "все",
+    "его", "она", "они", "так", "уже", "the", "and", "for", "with"
+}
+
+# Длина основы слова: грубый стемминг для русских словоформ
+_STEM_LENGTH = 6
+
+
+def tokenize(text: str) -> List[str]:
+    """Разбиение текста на нормализованные токены"""
+    tokens = []
+    for word in _TOKEN_RE.findall((text or "").lower().replace("ё", "е")):
+        if len(word) < 3 or word.isdigit() or word in _STOP_WORDS:
+            continue
+        tokens.append(word[:_STEM_LENGTH])
+    return tokens
+
+
+@dataclass
+class RetrievedItem:
+    """Найденная позиция с ценой"""
+    name: str
+    duration: int  # сотые доли часа
+    cost: int  # копейки
+    source: str  # template или history
+    score: float = 0.0
+
+
+@dataclass
+class _Document:
+    """Документ индекса"""
+    owner_id: Optional[int]
+    is_public: bool
+    item: RetrievedItem
+    weights: Dict[str, float]
+
+
+class RetrievalIndex:
+    """
+    Инкрементальный TF-IDF индекс.
+
+    Документы хранятся как разреженные векторы нормированных частот термов,
+    а IDF пересчитывается на лету только для термов запроса, поэтому
+    добавление и удаление документа не требуют перестройки индекса.
+    """
+
+    def __init__(self):
+        self._documents: Dict[Hashable, _Document] = {}
+        self._postings: Dict[str, Dict[Hashable, float]] = defaultdict(dict)
+        self._doc_freq: Counter = Counter()
+
+    def __len__(self) -> int:
+        return len(self._documents)
+
+    def add(self, key: Hashable, text: str, item: RetrievedItem,
+            owner_id: Optional[int] = None, is_public: bool = False) -> None:
+        """Добавление (или замена) документа"""
+        self.remove(key)
+
+        counts = Counter(tokenize(text))
+        if not counts:
+            return
+
+        norm = math.sqrt(sum(tf * tf for tf in counts.values()))
+        weights = {term: tf / norm for term, tf in counts.items()}
+
+        self._documents[key] = _Document(owner_id, is_public, item, weights)
+        for term, weight in weights.items():
+            self._postings[term][key] = weight
+            self._doc_freq[term] += 1
+
+    def remove(self, key: Hashable) -> None:
+        """Удаление документа"""
+        document = self._documents.pop(key, None)
+        if not document:
+            return
+
+        for term in document.weights:
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.pop(key, None)
+                if not postings:
+                    del self._postings[term]
+            self._doc_freq[term] -= 1
+            if self._doc_freq[term] <= 0:
+                del self._doc_freq[term]
+
+    def add_template(self, template: WorkTemplate) -> None:
+        """Добавление шаблона работы"""
+        self.add(
+            ("template", template.id),
+            f"{template.name} {template.description or ''}",
+            RetrievedItem(
+                name=template.name,
+                duration=template.default_duration or 0,
+                cost=template.default_cost or 0,
+                source="template"
+            ),
+            owner_id=template.user_id,
+            is_public=bool(template.is_public)
+        )
+
+    def remove_template(self, template_id: int) -> None:
+        """Удаление шаблона работы"""
+        self.remove(("template", template_id))
+
+    def add_history_item(self, item: Dict) -> None:
+        """Добавление позиции из истории смет пользователя"""
+        self.add(
+            ("history", item['user_id'], item['name'].lower()),
+            item['name'],
+            RetrievedItem(
+                name=item['name'],
+                duration=item.get('duration') or 0,
+                cost=item.get('cost') or 0,
+                source="history"
+            ),
+            owner_id=item['user_id']
+        )
+
+    def rebuild(self, templates: Iterable[WorkTemplate], history_items: Iterable[Dict]) -> None:
+        """Полная перестройка индекса"""
+        self._documents.clear()
+        self._postings.clear()
+        self._doc_freq.clear()
+
+        for template in templates:
+            self.add_template(template)
+        for item in history_items:
+            self.add_history_item(item)
+
+        logger.info(f"Индекс подсказок построен: {len(self._documents)} документов")
+
+    def search(self, query: str, user_id: int, top_k: int = 10) -> List[RetrievedItem]:
+        """Поиск наиболее релевантных позиций для пользователя"""
+        counts = Counter(tokenize(query))
+        if not counts or not self._documents:
+            return []
+
+        total = len(self._documents)
+        scores: Dict[Hashable, float] = defaultdict(float)
+        for term, tf in counts.items():
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            idf = math.log((1 + total) / (1 + self._doc_freq[term])) + 1
+            query_weight = tf * idf * idf
+            for key, weight in postings.items():
+                document = self._documents[key]
+                if document.is_public or document.owner_id == user_id:
+                    scores[key] += query_weight * weight
+
+        ranked: List[Tuple[Hashable, float]] = sorted(
+            scores.items(), key=lambda pair: pair[1], reverse=True
+        )
+
+        results = []
+        seen_names = set()
+        for key, score in ranked:
+            item = self._documents[key].item
+            name_key = item.name.lower()
+            if name_key in seen_names:
+                continue
+            seen_names.add(name_key)
+            results.append(RetrievedItem(item.name, item.duration, item.cost, item.source, score))
+            if len(results) >= top_k:
+                break
+
+        return results
@@ -0,0 +1,47 @@
+"""
+Периодические фоновые задачи
+"""
+import asyncio
+import logging
+from typing import Awaitable, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class PeriodicTask:
+    """Фоновая задача, запускаемая с фиксированным интервалом"""
+
+    def __init__(self, name: str, interval: float, func: Callable[[], Awaitable]):
+        self.name = name
+        self.interval = interval
+        self.func = func
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        """Запуск задачи"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name=self.name)
+            logger.info(f"Фоновая задача {self.name} запущена (интервал {self.interval} с)")
+
+    async def stop(self) -> None:
+        """Остановка задачи"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        logger.info(f"Фоновая задача {self.name} остановлена")
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.func()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Ошибка одного запуска не останавливает задачу
+                logger.error(f"Ошибка фоновой задачи {self.name}: {e}", exc_info=True)
@@ -0,0 +1,223 @@
+"""
+Поиск шаблонов по мере ввода для inline режима
+"""
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from bot.database.models import WorkTemplate
+
+logger = logging.getLogger(__name__)
+
+# Время жизни индекса личных шаблонов пользователя (секунды)
+USER_INDEX_TTL = 300
+
+# Максимальное количество пользователей с индексом в памяти
+USER_INDEX_SIZE = 1000
+
+# Минимальная доля общих триграмм для нечеткого совпадения
+TRIGRAM_THRESHOLD = 0.3
+
+# Бюджет на запрос к базе, чтобы уложиться в дедлайн inline ответа (секунды)
+COLD_LOOKUP_TIMEOUT = 0.5
+
+
+def normalize(text: str) -> str:
+    """Нормализация строки для поиска"""
+    return " ".join((text or "").lower().replace("ё", "е").split())
+
+
+def trigrams(text: str) -> Set[str]:
+    """Триграммы слова с границами, как в pg_trgm"""
+    result = set()
+    for word in normalize(text).split():
+        padded = f"  {word} "
+        result.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return result
+
+
+class _TrieNode:
+    __slots__ = ('children', 'ids')
+
+    def __init__(self):
+        self.children: Dict[str, "_TrieNode"] = {}
+        self.ids: Set[int] = set()
+
+
+class TemplateIndex:
+    """Префиксное дерево по словам названий с триграммным запасным поиском"""
+
+    def __init__(self, templates: Iterable[WorkTemplate] = ()):
+        self._root = _TrieNode()
+        self._trigrams: Dict[str, Set[int]] = {}
+        self._templates: Dict[int, WorkTemplate] = {}
+        self._rank: Dict[int, int] = {}
+
+        for position, template in enumerate(templates):
+            self._add(position, template)
+
+    def _add(self, position: int, template: WorkTemplate) -> None:
+        template_id = template.id
+        self._templates[template_id] = template
+        self._rank[template_id] = position
+
+        name = normalize(template.name)
+        for word in name.split():
+            node = self._root
+            for char in word:
+                node = node.children.setdefault(char, _TrieNode())
+                node.ids.add(template_id)
+
+        for trigram in trigrams(name):
+            self._trigrams.setdefault(trigram, set()).add(template_id)
+
+    def _prefix_ids(self, prefix: str) -> Set[int]:
+        node = self._root
+        for char in prefix:
+            node = node.children.get(char)
+            if node is None:
+                return set()
+        return node.ids
+
+    def top(self, limit: int) -> List[WorkTemplate]:
+        """Самые популярные шаблоны"""
+        ranked = sorted(self._rank.items(), key=lambda pair: pair[1])[:limit]
+        return [self._templates[template_id] for template_id, _ in ranked]
+
+    def search(self, query: str, limit: int) -> List[WorkTemplate]:
+        """Поиск: каждое слово запроса — префикс слова в названии"""
+        words = normalize(query).split()
+        if not words:
+            return self.top(limit)
+
+        ids: Optional[Set[int]] = None
+        for word in words:
+            matched = self._prefix_ids(word)
+            ids = set(matched) if ids is None else ids & matched
+            if not ids:
+                break
+
+        if ids:
+            ordered = sorted(ids, key=self._rank.__getitem__)
+            return [self._templates[template_id] for template_id in ordered[:limit]]
+
+        return self._fuzzy_search(query, limit)
+
+    def _fuzzy_search(self, query: str, limit: int) -> List[WorkTemplate]:
+        query_trigrams = trigrams(query)
+        if not query_trigrams:
+            return []
+
+        shared: Dict[int, int] = {}
+        for trigram in query_trigrams:
+            for template_id in self._trigrams.get(trigram, ()):
+                shared[template_id] = shared.get(template_id, 0) + 1
+
+        scored = []
+        for template_id, count in shared.items():
+            similarity = count / len(query_trigrams)
+            if similarity >= TRIGRAM_THRESHOLD:
+                scored.append((-similarity, self._rank[template_id], template_id))
+
+        scored.sort()
+        return [self._templates[template_id] for _, _, template_id in scored[:limit]]
+
+
+class TemplateSearch:
+    """
+    Поиск по личным и публичным шаблонам пользователя.
+
+    Публичный каталог и личные шаблоны каждого пользователя индексируются
+    в памяти, поэтому префиксы по мере ввода не ходят в базу. Индекс
+    пользователя загружается один раз и хранится в LRU; он сбрасывается при
+    изменении шаблонов пользователя и через USER_INDEX_TTL, чтобы порядок
+    следовал за популярностью. Пока индекс не загружен, личные шаблоны
+    ищутся в базе через pg_trgm.
+    """
+
+    def __init__(self, db, limit: int = 20):
+        self.db = db
+        self.limit = limit
+        self._public_source: Optional[List[WorkTemplate]] = None
+        self._public_index = TemplateIndex()
+        self._user_indexes: "OrderedDict[int, Tuple[float, TemplateIndex]]" = OrderedDict()
+        self._loading: Dict[int, asyncio.Task] = {}
+        db.template_listeners.append(self.invalidate_user)
+
+    def invalidate_user(self, user_id: int) -> None:
+        """Сброс индекса личных шаблонов пользователя"""
+        self._user_indexes.pop(user_id, None)
+        task = self._loading.pop(user_id, None)
+        if task is not None:
+            # Загрузка могла прочитать шаблоны до изменения
+            task.cancel()
+
+    async def _refresh_public_index(self) -> None:
+        templates = await self.db.public_templates.get(self.db.pool)
+        if templates is not self._public_source:
+            self._public_source = templates
+            self._public_index = TemplateIndex(templates)
+
+    def _user_index(self, user_id: int) -> Optional[TemplateIndex]:
+        entry = self._user_indexes.get(user_id)
+        if entry is None:
+            return None
+
+        loaded_at, index = entry
+        if time.monotonic() - loaded_at > USER_INDEX_TTL:
+            del self._user_indexes[user_id]
+            return None
+
+        self._user_indexes.move_to_end(user_id)
+        return index
+
+    def _load_user_index(self, user_id: int) -> None:
+        """Фоновая загрузка индекса пользователя, одна на пользователя"""
+        if user_id in self._loading:
+            return
+
+        async def load() -> None:
+            try:
+                templates = await self.db.get_personal_templates(user_id)
+                self._user_indexes[user_id] = (time.monotonic(), TemplateIndex(templates))
+                self._user_indexes.move_to_end(user_id)
+                while len(self._user_indexes) > USER_INDEX_SIZE:
+                    self._user_indexes.popitem(last=False)
+            except Exception as e:
+                logger.error(f"Ошибка загрузки шаблонов пользователя {user_id}: {e}")
+            finally:
+                if self._loading.get(user_id) is task:
+                    del self._loading[user_id]
+
+        task = asyncio.create_task(load(), name=f"template-index-{user_id}")
+        self._loading[user_id] = task
+
+    async def _cold_search(self, user_id: int, query: str) -> List[WorkTemplate]:
+        """Поиск личных шаблонов в базе, пока индекс пользователя загружается"""
+        self._load_user_index(user_id)
+        try:
+            return await asyncio.wait_for(
+                self.db.search_user_templates(user_id, query, self.limit),
+                timeout=COLD_LOOKUP_TIMEOUT
+            )
+        except asyncio.TimeoutError:
+            # Отвечаем публичными шаблонами, следующий запрос найдет индекс
+            logger.warning(f"Поиск личных шаблонов превысил {COLD_LOOKUP_TIMEOUT} с")
+            return []
+
+    async def search(self, user_id: int, query: str) -> List[WorkTemplate]:
+        """Поиск шаблонов для inline ответа"""
+        query = normalize(query)
+        await self._refresh_public_index()
+
+        public = self._public_index.search(query, self.limit)
+
+        index = self._user_index(user_id)
+        if index is not None:
+            own = index.search(query, self.limit)
+        else:
+            own = await self._cold_search(user_id, query)
+
+        return (own + public)[:self.limit]
@@ -37,13 +37,22 @@ def error_handler(func: Callable) -> Callable:
 
 
 def admin_only(func: Callable) -> Callable:
-    """Декоратор для ограничения доступа только админам"""
+    """
+    Декоратор для ограничения доступа только админам
+
+    Администраторы задаются в Config.admin_users (ADMIN_USERS). Остальным
+    обработчик не отвечает, чтобы не раскрывать служебные команды.
+    """
     @functools.wraps(func)
     async def wrapper(message_or_callback, *args, **kwargs) -> Any:
         user_id = message_or_callback.from_user.id
+        config = kwargs.get('config')
         
-        # Здесь можно добавить проверку админских прав
-        # Например, сверка с базой данных или списком админов
+        if config is None or not config.is_admin(user_id):
+            logger.warning(f"Пользователь {user_id} без прав администратора вызвал {func.__name__}")
+            if isinstance(message_or_callback, CallbackQuery):
+                await message_or_callback.answer()
+            return None
         
         return await func(message_or_callback, *args, **kwargs)
     
@@ -1,30 +1,49 @@
 """
 Вспомогательные функции для форматирования и обработки данных
 """
-from typing import Dict
+from html import escape
 
+# Деньги хранятся в копейках, время - в сотых долях часа
+MINOR_UNITS = 100
 
-def format_currency(amount: float) -> str:
-    """Красивое форматирование валюты"""
-    if amount >= 1000000:
-        return f"{amount/1000000:.1f}М ₽"
-    elif amount >= 1000:
-        return f"{amount/1000:.1f}К ₽"
+# Количество смет на странице результатов поиска
+SEARCH_PAGE_SIZE = 8
+
+
+def format_minor(value: int) -> str:
+    """Точное представление значения в сотых долях: 750050 -> '7 500.5'"""
+    whole, fraction = divmod(abs(value), MINOR_UNITS)
+    text = f"{whole:,}".replace(',', ' ')
+    if fraction:
+        text += f".{fraction:02d}".rstrip('0')
+    return f"-{text}" if value < 0 else text
+
+
+def cost_by_rate(duration: int, hourly_rate: int) -> int:
+    """Стоимость в копейках по времени в сотых часа и ставке в копейках за час"""
+    return (duration * hourly_rate + MINOR_UNITS // 2) // MINOR_UNITS
+
+
+def format_currency(amount: int) -> str:
+    """Красивое форматирование валюты (сумма в копейках)"""
+    if amount >= 1000000 * MINOR_UNITS:
+        return f"{amount / (1000000 * MINOR_UNITS):.1f}М ₽"
+    elif amount >= 1000 * MINOR_UNITS:
+        return f"{amount / (1000 * MINOR_UNITS):.1f}К ₽"
     else:
-        return f"{amount:,.0f} ₽".replace(',', ' ')
+        return f"{(amount + MINOR_UNITS // 2) // MINOR_UNITS:,} ₽".replace(',', ' ')
 
 
-def format_duration(hours: float) -> str:
-    """Красивое форматирование времени"""
-    if hours >= 24:
-        days = int(hours // 24)
-        remaining_hours = hours % 24
+def format_duration(hours: int) -> str:
+    """Красивое форматирование времени (в сотых долях часа)"""
+    if hours >= 24 * MINOR_UNITS:
+        days, remaining_hours = divmod(hours, 24 * MINOR_UNITS)
         if remaining_hours == 0:
             return f"{days} дн."
         else:
-            return f"{days} дн. {remaining_hours:.1f} ч"
+            return f"{days} дн. {remaining_hours / MINOR_UNITS:.1f} ч"
     else:
-        return f"{hours:.1f} ч"
+        return f"{hours / MINOR_UNITS:.1f} ч"
 
 
 def create_progress_bar(current: float, total: float, length: int = 10) -> str:
@@ -39,10 +58,13 @@ def create_progress_bar(current: float, total: float, length: int = 10) -> str:
     return "▰" * filled + "▱" * empty
 
 
-def format_estimate_card(estimate: Dict, items_count: int = 0, total_cost: float = 0, total_duration: float = 0) -> str:
+def format_estimate_card(estimate, items_count: int = 0, total_cost: int = 0, total_duration: int = 0) -> str:
     """Красивое форматирование карточки сметы"""
     # Определяем статус
-    if items_count == 0:
+    if estimate.status == "archived":
+        status = "🗄 В архиве"
+        status_color = "⚪"
+    elif items_count == 0:
         status = "🔄 Черновик"
         status_color = "🟡"
     elif total_cost > 0:
@@ -55,11 +77,11 @@ def format_estimate_card(estimate: Dict, items_count: int = 0, total_cost: float
     # Формируем карточку
     card = f"""
 ╭─────────────────────────────╮
-│ {status_color} <b>{estimate['title'][:20]}{'...' if len(estimate['title']) > 20 else ''}</b>
+│ {status_color} <b>{estimate.title[:20]}{'...' if len(estimate.title) > 20 else ''}</b>
 ├─────────────────────────────┤"""
     
-    if estimate.get('description'):
-        desc = estimate['description'][:40] + '...' if len(estimate['description']) > 40 else estimate['description']
+    if estimate.description:
+        desc = estimate.description[:40] + '...' if len(estimate.description) > 40 else estimate.description
         card += f"\n│ 📝 {desc}"
     
     card += f"""
@@ -74,7 +96,7 @@ def format_estimate_card(estimate: Dict, items_count: int = 0, total_cost: float
     return card
 
 
-def format_template_card(template: Dict) -> str:
+def format_template_card(template) -> str:
     """Красивое форматирование карточки шаблона"""
     category_emoji = {
         'Frontend': '🎨',
@@ -85,28 +107,63 @@ def format_template_card(template: Dict) -> str:
         'Testing': '🧪',
         'Mobile': '📱',
         'Database': '🗄️'
-    }.get(template.get('category', ''), '📋')
+    }.get(template.category or '', '📋')
     
     usage_text = ""
-    if template.get('usage_count', 0) > 0:
-        usage_text = f"│ 🔥 Использований: {template['usage_count']}\n"
+    if template.usage_count > 0:
+        usage_text = f"│ 🔥 Использований: {template.usage_count}\n"
     
     card = f"""
 ╭─────────────────────────────╮
-│ {category_emoji} <b>{template['name'][:20]}{'...' if len(template['name']) > 20 else ''}</b>
+│ {category_emoji} <b>{template.name[:20]}{'...' if len(template.name) > 20 else ''}</b>
 ├─────────────────────────────┤
-│ ⏱️ {format_duration(template['default_duration'])}
-│ 💰 {format_currency(template['default_cost'])}
-{usage_text}│ 📂 {template.get('category', 'Без категории')}
+│ ⏱️ {format_duration(template.default_duration)}
+│ 💰 {format_currency(template.default_cost)}
+{usage_text}│ 📂 {template.category or 'Без категории'}
 ╰─────────────────────────────╯"""
     
     return card
 
 
-def format_stats_block(estimates: list, templates: list) -> str:
+def format_item_card(item, position: int = 0, items_count: int = 0) -> str:
+    """Карточка позиции сметы для редактирования"""
+    position_text = f"\n📍 Позиция {position} из {items_count}" if position else ""
+
+    return f"""
+✏️ <b>Редактирование позиции</b>
+
+📝 <b>Название:</b> {item.name}
+⏱️ <b>Время:</b> {format_minor(item.duration)} ч
+💰 <b>Стоимость:</b> {format_minor(item.cost)} ₽{position_text}
+"""
+
+
+def format_search_results(query: str, results: list, page: int = 1) -> str:
+    """Список найденных смет"""
+    query = escape(query)
+    if not results:
+        return f"🔍 По запросу «{query}» ничего не найдено"
+    
+    text = f"🔍 <b>Поиск:</b> «{query}»"
+    if page > 1:
+        text += f" (стр. {page})"
+    text += "\n\n"
+    
+    for i, result in enumerate(results, (page - 1) * SEARCH_PAGE_SIZE + 1):
+        date = result.updated_at.strftime('%d.%m.%Y') if result.updated_at else ""
+        text += (
+            f"┣ {i}. <b>{result.title}</b>\n"
+            f"   ⏱️ {format_duration(result.total_duration)}  💰 {format_currency(result.total_cost)}  📅 {date}\n"
+        )
+        if result.matched_item:
+            text += f"   ↳ в позиции: {result.matched_item}\n"
+    
+    return text
+
+
+def format_stats_block(stats) -> str:
     """Красивая статистика пользователя"""
-    total_estimates = len(estimates)
-    total_templates = len(templates)
+    total_estimates = stats.estimates_count
     
     if total_estimates == 0:
         return """
@@ -115,22 +172,22 @@ def format_stats_block(estimates: list, templates: list) -> str:
 📊 Пока нет данных для анализа
 Создайте первую смету!"""
     
-    # Подсчет статистики
-    total_cost = sum(est.get('total_cost', 0) for est in estimates)
-    total_duration = sum(est.get('total_duration', 0) for est in estimates)
-    avg_estimate_cost = total_cost / total_estimates if total_estimates > 0 else 0
+    total_cost = stats.total_cost
+    total_duration = stats.total_duration
+    avg_estimate_cost = total_cost // total_estimates
+    avg_hourly_rate = total_cost * MINOR_UNITS // total_duration if total_duration > 0 else 0
     
-    stats = f"""
+    text = f"""
 🏗️ <b>Ваша статистика</b>
 
 📈 <b>Общие показатели:</b>
 ┣ 📄 Смет создано: {total_estimates}
-┣ 🔧 Шаблонов: {total_templates}
+┣ 🔧 Шаблонов: {stats.templates_count}
 ┣ 💰 Общая сумма: {format_currency(total_cost)}
 ┗ ⏱️ Общее время: {format_duration(total_duration)}
 
 📊 <b>Средние значения:</b>
 ┣ 💵 Средняя смета: {format_currency(avg_estimate_cost)}
-┗ 📏 Ставка/час: {format_currency(total_cost/total_duration if total_duration > 0 else 0).replace(' ₽', '₽/ч')}"""
+┗ 📏 Ставка/час: {format_currency(avg_hourly_rate).replace(' ₽', '₽/ч')}"""
     
-    return stats 
\ No newline at end of file
+    return text 
\ No newline at end of file
@@ -0,0 +1,200 @@
+"""
+Потоковый разбор CSV/XLSX файлов с позициями смет
+"""
+import asyncio
+import codecs
+import csv
+import itertools
+import os
+from typing import AsyncIterator, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from .validators import (
+    validate_cost, validate_duration, validate_quantity, validate_text_length, sanitize_text,
+    MAX_ITEM_DURATION, MAX_ITEM_COST
+)
+
+# Максимальное количество строк в одном файле
+MAX_IMPORT_ROWS = 20000
+
+# Строк, разбираемых в рабочем потоке за один раз
+IMPORT_BATCH_ROWS = 1000
+
+# Объем начала файла, по которому определяется кодировка CSV
+ENCODING_SNIFF_SIZE = 65536
+
+SUPPORTED_EXTENSIONS = ('.csv', '.xlsx')
+
+# Варианты заголовков столбцов
+COLUMN_ALIASES = {
+    'name': ('название', 'наименование', 'позиция', 'работа', 'name', 'title'),
+    'description': ('описание', 'комментарий', 'description'),
+    'duration': ('часы', 'время', 'длительность', 'трудоемкость', 'duration', 'hours'),
+    'cost': ('стоимость', 'цена', 'сумма', 'cost', 'price'),
+    'quantity': ('количество', 'кол-во', 'quantity', 'qty'),
+    'unit': ('ед', 'ед.', 'ед. изм.', 'единица', 'unit'),
+    'category': ('категория', 'category'),
+}
+
+REQUIRED_COLUMNS = ('name', 'duration', 'cost')
+
+# Порядок столбцов во временной таблице импорта
+# (время, стоимость и количество - целые сотые доли)
+IMPORT_COLUMNS = ('line_no', 'name', 'description', 'duration', 'cost', 'quantity', 'unit', 'category')
+
+
+class ImportFormatError(ValueError):
+    """Файл не удается разобрать"""
+
+
+def detect_encoding(path: str, sniff_size: int = ENCODING_SNIFF_SIZE) -> str:
+    """Определение кодировки CSV по началу файла: UTF-8 или, если оно не декодируется, CP1251"""
+    with open(path, 'rb') as file:
+        chunk = file.read(sniff_size)
+    try:
+        # Не окончательное декодирование: символ может быть разрезан границей блока
+        codecs.getincrementaldecoder('utf-8-sig')().decode(chunk)
+    except UnicodeDecodeError:
+        return 'cp1251'
+    return 'utf-8-sig'
+
+
+def iter_csv_rows(path: str) -> Iterator[List[str]]:
+    """Построчное чтение CSV с определением кодировки и разделителя"""
+    # Кодировка определена по началу файла: редкие ошибочные байты дальше
+    # заменяются, а не обрывают импорт
+    with open(path, newline='', encoding=detect_encoding(path), errors='replace') as file:
+        # Разделитель определяем по строке заголовка: в числах бывают запятые
+        header = file.readline()
+        file.seek(0)
+        delimiter = max(';\t,', key=header.count)
+        yield from csv.reader(file, delimiter=delimiter)
+
+
+def iter_xlsx_rows(path: str) -> Iterator[List[str]]:
+    """Построчное чтение первого листа XLSX без загрузки книги в память"""
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        for row in workbook.worksheets[0].iter_rows(values_only=True):
+            yield ["" if value is None else str(value) for value in row]
+    finally:
+        workbook.close()
+
+
+def iter_file_rows(path: str, filename: str) -> Iterator[List[str]]:
+    """Чтение строк файла в зависимости от расширения"""
+    extension = os.path.splitext(filename.lower())[1]
+    if extension == '.csv':
+        return iter_csv_rows(path)
+    if extension == '.xlsx':
+        return iter_xlsx_rows(path)
+    raise ImportFormatError("Поддерживаются только файлы CSV и XLSX")
+
+
+def map_columns(header: Sequence[str]) -> Dict[str, int]:
+    """Сопоставление столбцов файла полям позиции"""
+    mapping = {}
+    for index, title in enumerate(header):
+        title = (title or "").strip().lower()
+        for field, aliases in COLUMN_ALIASES.items():
+            if field not in mapping and title in aliases:
+                mapping[field] = index
+                break
+
+    missing = [field for field in REQUIRED_COLUMNS if field not in mapping]
+    if missing:
+        raise ImportFormatError(
+            "Не найдены столбцы: " + ", ".join(COLUMN_ALIASES[field][0] for field in missing)
+        )
+    return mapping
+
+
+def iter_import_records(rows: Iterable[Sequence[str]], errors: List[str]) -> Iterator[Tuple]:
+    """
+    Преобразование строк файла в записи для COPY
+
+    Первая непустая строка считается заголовком. Ошибочные строки
+    пропускаются, описание ошибки добавляется в errors.
+    """
+    mapping: Optional[Dict[str, int]] = None
+    imported = 0
+
+    for line_number, row in enumerate(rows, 1):
+        if not any((cell or "").strip() for cell in row):
+            continue
+
+        if mapping is None:
+            mapping = map_columns(row)
+            continue
+
+        def cell(field: str, default: str = "") -> str:
+            index = mapping.get(field)
+            if index is None or index >= len(row):
+                return default
+            return (row[index] or "").strip() or default
+
+        name = sanitize_text(cell('name'))
+        is_valid, error_msg = validate_text_length(name, min_length=3, max_length=200)
+        if not is_valid:
+            errors.append(f"Строка {line_number}: {error_msg}")
+            continue
+
+        is_valid, duration, error_msg = validate_duration(cell('duration'))
+        if not is_valid:
+            errors.append(f"Строка {line_number}: {error_msg}")
+            continue
+
+        is_valid, cost, error_msg = validate_cost(cell('cost'))
+        if not is_valid:
+            errors.append(f"Строка {line_number}: {error_msg}")
+            continue
+
+        is_valid, quantity, error_msg = validate_quantity(cell('quantity', '1'))
+        if not is_valid:
+            errors.append(f"Строка {line_number}: {error_msg}")
+            continue
+
+        # Количество входит во время и стоимость позиции: итог должен
+        # поместиться в столбцы estimate_items
+        if duration * quantity > MAX_ITEM_DURATION * 100:
+            errors.append(f"Строка {line_number}: ⚠️ Слишком большое время с учетом количества")
+            continue
+        if cost * quantity > MAX_ITEM_COST * 100:
+            errors.append(f"Строка {line_number}: ⚠️ Слишком большая стоимость с учетом количества")
+            continue
+
+        yield (
+            line_number,
+            name,
+            sanitize_text(cell('description'))[:1000],
+            duration,
+            cost,
+            quantity,
+            sanitize_text(cell('unit', 'шт'))[:50],
+            sanitize_text(cell('category'))[:100] or None
+        )
+
+        imported += 1
+        if imported >= MAX_IMPORT_ROWS:
+            errors.append(f"⚠️ Импортированы только первые {MAX_IMPORT_ROWS} строк")
+            return
+
+    if mapping is None:
+        raise ImportFormatError("Файл пустой")
+
+
+async def aiter_import_records(path: str, filename: str, errors: List[str],
+                               batch_size: int = IMPORT_BATCH_ROWS) -> AsyncIterator[Tuple]:
+    """
+    Записи файла для COPY с разбором в рабочем потоке
+
+    Чтение файла, openpyxl и проверка строк занимают процессор, поэтому
+    пачки по batch_size строк разбираются через asyncio.to_thread и не
+    задерживают событийный цикл. Пачки разбираются по очереди, генератор
+    не используется из двух потоков одновременно.
+    """
+    records = iter_import_records(iter_file_rows(path, filename), errors)
+    while batch := await asyncio.to_thread(list, itertools.islice(records, batch_size)):
+        for record in batch:
+            yield record
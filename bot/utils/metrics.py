@@ -0,0 +1,154 @@
+"""
+Простые метрики процесса: счетчики, значения и гистограммы
+"""
+import bisect
+import json
+import logging
+import threading
+from typing import Dict, List, Optional, Sequence
+
+# Границы корзин по умолчанию (секунды)
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+class Counter:
+    """Монотонно растущий счетчик"""
+
+    def __init__(self, name: str, description: str = ""):
+        self.name = name
+        self.description = description
+        self.value = 0.0
+
+    def inc(self, amount: float = 1) -> None:
+        self.value += amount
+
+    def snapshot(self) -> Dict:
+        return {'type': 'counter', 'value': self.value}
+
+
+class Gauge:
+    """Текущее значение"""
+
+    def __init__(self, name: str, description: str = ""):
+        self.name = name
+        self.description = description
+        self.value = 0.0
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+    def snapshot(self) -> Dict:
+        return {'type': 'gauge', 'value': self.value}
+
+
+class Histogram:
+    """Гистограмма с фиксированными корзинами"""
+
+    def __init__(self, name: str, description: str = "", buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.description = description
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        # Наблюдения могут приходить из сторожевых потоков
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        with self._lock:
+            self.counts[bisect.bisect_left(self.buckets, value)] += 1
+            self.count += 1
+            self.sum += value
+            if value > self.max:
+                self.max = value
+
+    def quantile(self, q: float) -> float:
+        """Оценка квантиля по верхней границе корзины"""
+        if self.count == 0:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= rank:
+                return self.buckets[index] if index < len(self.buckets) else self.max
+        return self.max
+
+    def snapshot(self) -> Dict:
+        return {
+            'type': 'histogram',
+            'count': self.count,
+            'sum': self.sum,
+            'max': self.max,
+            'p50': self.quantile(0.5),
+            'p95': self.quantile(0.95),
+            'p99': self.quantile(0.99)
+        }
+
+
+class MetricsRegistry:
+    """Реестр метрик процесса"""
+
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+        # Метрики регистрируются и из сторожевых потоков
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name: str, *args, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = cls(name, *args, **kwargs)
+                self._metrics[name] = metric
+            return metric
+
+    def counter(self, name: str, description: str = "") -> Counter:
+        return self._get_or_create(Counter, name, description)
+
+    def gauge(self, name: str, description: str = "") -> Gauge:
+        return self._get_or_create(Gauge, name, description)
+
+    def histogram(self, name: str, description: str = "",
+                  buckets: Optional[Sequence[float]] = None) -> Histogram:
+        return self._get_or_create(Histogram, name, description, buckets or DEFAULT_BUCKETS)
+
+    def snapshot(self, prefix: str = "") -> Dict[str, Dict]:
+        """Снимок значений всех метрик"""
+        with self._lock:
+            items = sorted(self._metrics.items())
+        return {
+            name: metric.snapshot()
+            for name, metric in items
+            if name.startswith(prefix)
+        }
+
+    def render(self, prefix: str = "") -> str:
+        """Текстовое представление метрик"""
+        lines: List[str] = []
+        for name, values in self.snapshot(prefix).items():
+            if values['type'] == 'histogram':
+                lines.append(
+                    f"{name}: count={values['count']} p50={values['p50']:g} "
+                    f"p95={values['p95']:g} p99={values['p99']:g} max={values['max']:g}"
+                )
+            else:
+                lines.append(f"{name}: {values['value']:g}")
+        return "\n".join(lines)
+
+
+# Общий реестр процесса
+metrics = MetricsRegistry()
+
+
+async def log_metrics(logger: logging.Logger, worker_index: int = 0) -> None:
+    """
+    Запись снимка метрик процесса в лог одной JSON строкой
+
+    Каждый процесс-обработчик пишет свои метрики с номером процесса,
+    сводятся они уже при разборе логов.
+    """
+    logger.info("metrics " + json.dumps(
+        {'worker': worker_index, 'metrics': metrics.snapshot()},
+        ensure_ascii=False
+    ))
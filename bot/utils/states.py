@@ -11,6 +11,7 @@ class EstimateStates(StatesGroup):
     waiting_item_name = State()
     waiting_item_duration = State()
     waiting_item_cost = State()
+    waiting_bulk_items = State()
     editing_estimate = State()
     editing_item = State()
 
@@ -25,6 +26,27 @@ class TemplateStates(StatesGroup):
     editing_template = State()
 
 
+class BundleStates(StatesGroup):
+    """Состояния для работы с наборами шаблонов"""
+    waiting_bundle_name = State()
+    selecting_templates = State()
+
+
+class ImportStates(StatesGroup):
+    """Состояния для импорта из файлов"""
+    waiting_import_file = State()
+
+
+class SearchStates(StatesGroup):
+    """Состояния для поиска по сметам"""
+    waiting_query = State()
+
+
+class SettingsStates(StatesGroup):
+    """Состояния для изменения настроек"""
+    waiting_hourly_rate = State()
+
+
 class AIStates(StatesGroup):
     """Состояния для ИИ-помощника"""
     waiting_ai_description = State()
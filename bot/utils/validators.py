@@ -2,45 +2,102 @@
 Функции валидации данных
 """
 import re
-from typing import Tuple, Optional
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+from typing import Dict, Iterator, Tuple, Optional
 
+from .helpers import MINOR_UNITS, cost_by_rate
 
-def validate_duration(duration_str: str) -> Tuple[bool, Optional[float], str]:
+# Наибольшее количество в импортируемой строке
+MAX_QUANTITY = 100000 * MINOR_UNITS
+
+# Пределы столбцов estimate_items в сотых долях: DECIMAL(10,2) и DECIMAL(15,2)
+MAX_ITEM_DURATION = 10 ** 10 - 1
+MAX_ITEM_COST = 10 ** 15 - 1
+
+
+def parse_minor_units(value: str) -> int:
+    """Разбор десятичного числа в целые сотые доли: '7500,5' -> 750050"""
+    try:
+        number = Decimal(value.replace(',', '.').replace(' ', '').strip())
+    except InvalidOperation:
+        raise ValueError(f"Некорректное число: {value!r}")
+    if not number.is_finite():
+        raise ValueError(f"Некорректное число: {value!r}")
+    return int((number * MINOR_UNITS).to_integral_value(rounding=ROUND_HALF_UP))
+
+
+def validate_duration(duration_str: str) -> Tuple[bool, Optional[int], str]:
     """
     Валидация продолжительности работы
     
     Returns:
-        Tuple[bool, Optional[float], str]: (success, duration, error_message)
+        Tuple[bool, Optional[int], str]: (success, duration в сотых часа, error_message)
     """
     try:
-        duration = float(duration_str.replace(',', '.'))
+        duration = parse_minor_units(duration_str)
         if duration <= 0:
             return False, None, "⚠️ Продолжительность должна быть больше 0"
-        if duration > 1000:
+        if duration > 1000 * MINOR_UNITS:
             return False, None, "⚠️ Продолжительность не может превышать 1000 часов"
         return True, duration, ""
     except ValueError:
         return False, None, "⚠️ Введите корректное число"
 
 
-def validate_cost(cost_str: str) -> Tuple[bool, Optional[float], str]:
+def validate_cost(cost_str: str) -> Tuple[bool, Optional[int], str]:
     """
     Валидация стоимости
     
     Returns:
-        Tuple[bool, Optional[float], str]: (success, cost, error_message)
+        Tuple[bool, Optional[int], str]: (success, cost в копейках, error_message)
     """
     try:
-        cost = float(cost_str.replace(',', '.'))
+        cost = parse_minor_units(cost_str)
         if cost < 0:
             return False, None, "⚠️ Стоимость не может быть отрицательной"
-        if cost > 10000000:
+        if cost > 10000000 * MINOR_UNITS:
             return False, None, "⚠️ Стоимость не может превышать 10 млн"
         return True, cost, ""
     except ValueError:
         return False, None, "⚠️ Введите корректное число"
 
 
+def validate_quantity(quantity_str: str) -> Tuple[bool, Optional[int], str]:
+    """
+    Валидация количества
+    
+    Returns:
+        Tuple[bool, Optional[int], str]: (success, количество в сотых долях, error_message)
+    """
+    try:
+        quantity = parse_minor_units(quantity_str)
+        if quantity <= 0:
+            return False, None, "⚠️ Количество должно быть больше 0"
+        if quantity > MAX_QUANTITY:
+            return False, None, "⚠️ Количество не может превышать 100 000"
+        return True, quantity, ""
+    except ValueError:
+        return False, None, "⚠️ Некорректное количество"
+
+
+def validate_hourly_rate(rate_str: str) -> Tuple[bool, Optional[int], str]:
+    """
+    Валидация почасовой ставки
+    
+    Returns:
+        Tuple[bool, Optional[int], str]: (success, ставка в копейках за час, error_message)
+    """
+    try:
+        rate = parse_minor_units(rate_str)
+        if rate <= 0:
+            return False, None, "⚠️ Ставка должна быть больше нуля"
+        if rate > 1000000 * MINOR_UNITS:
+            return False, None, "⚠️ Ставка не может превышать 1 млн"
+        return True, rate, ""
+    except ValueError:
+        return False, None, "⚠️ Введите корректное число"
+
+
 def validate_text_length(text: str, min_length: int = 1, max_length: int = 255) -> Tuple[bool, str]:
     """
     Валидация длины текста
@@ -56,6 +113,55 @@ def validate_text_length(text: str, min_length: int = 1, max_length: int = 255)
     return True, ""
 
 
+# Максимальное количество позиций в одном сообщении
+MAX_BULK_ITEMS = 200
+
+_BULK_SEPARATOR_RE = re.compile(r"\s*[;|\t]\s*")
+
+
+def parse_bulk_items(text: str, hourly_rate: Optional[int] = None) -> Iterator[Tuple[int, Optional[Dict], str]]:
+    """
+    Потоковый разбор позиций, по одной на строку: "Название; часы; стоимость"
+    
+    Если задана почасовая ставка, стоимость можно не указывать.
+    
+    Yields:
+        Tuple[int, Optional[Dict], str]: (line_number, item, error_message)
+    """
+    for line_number, line in enumerate(text.splitlines(), 1):
+        line = line.strip()
+        if not line:
+            continue
+        
+        parts = _BULK_SEPARATOR_RE.split(line)
+        if len(parts) == 2 and hourly_rate:
+            parts.append("")
+        if len(parts) != 3:
+            yield line_number, None, "⚠️ Ожидается формат: Название; часы; стоимость"
+            continue
+        
+        name = sanitize_text(parts[0])
+        is_valid, error_msg = validate_text_length(name, min_length=3, max_length=200)
+        if not is_valid:
+            yield line_number, None, error_msg
+            continue
+        
+        is_valid, duration, error_msg = validate_duration(parts[1])
+        if not is_valid:
+            yield line_number, None, error_msg
+            continue
+        
+        if hourly_rate and not parts[2].strip():
+            cost = cost_by_rate(duration, hourly_rate)
+        else:
+            is_valid, cost, error_msg = validate_cost(parts[2])
+            if not is_valid:
+                yield line_number, None, error_msg
+                continue
+        
+        yield line_number, {'name': name, 'duration': duration, 'cost': cost}, ""
+
+
 def sanitize_text(text: str) -> str:
     """Очистка текста от опасных символов"""
     # Удаляем потенциально опасные символы
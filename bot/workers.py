@@ -0,0 +1,201 @@
+"""
+Многопроцессный режим: распределитель обновлений и процессы-обработчики
+"""
+import asyncio
+import json
+import logging
+import multiprocessing
+import signal
+from multiprocessing.connection import Connection
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import aiohttp
+
+from bot.config import Config
+from bot.services.dispatch import get_raw_update_user, POLLING_RETRY_DELAY
+
+logger = logging.getLogger(__name__)
+
+TELEGRAM_API_URL = "https://api.telegram.org"
+
+# Ожидание getUpdates на стороне Telegram (секунды)
+POLLING_TIMEOUT = 30
+
+# Сколько обновлений может ждать отправки в один процесс
+WORKER_QUEUE_SIZE = 1000
+
+# Время на дообработку принятых обновлений при остановке (секунды)
+WORKER_STOP_TIMEOUT = 30
+
+
+async def _receive_updates(conn: Connection) -> AsyncIterator[Dict[str, Any]]:
+    """Обновления от распределителя; None или закрытый канал означают остановку"""
+    while True:
+        try:
+            update = await asyncio.to_thread(conn.recv)
+        except EOFError:
+            logger.warning("Канал распределителя закрыт")
+            return
+        if update is None:
+            return
+        yield update
+
+
+def _run_worker(worker_index: int, workers: int, conn: Connection) -> None:
+    """Точка входа процесса-обработчика"""
+    from bot.main import main
+
+    # Остановку процессу сообщает распределитель, Ctrl+C обрабатывает он же
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    asyncio.run(main(_receive_updates(conn), worker_index, workers))
+
+
+def _get_worker_index(update: Dict[str, Any], workers: int) -> int:
+    """Процесс для обновления: все обновления пользователя идут в один процесс"""
+    user = get_raw_update_user(update)
+    return (user if user is not None else update['update_id']) % workers
+
+
+def _get_allowed_updates() -> List[str]:
+    """Типы обновлений, на которые подписаны роутеры бота"""
+    from aiogram import Dispatcher
+    from bot.main import setup_routers
+
+    dp = Dispatcher()
+    setup_routers(dp)
+    return dp.resolve_used_update_types()
+
+
+class UpdateRouter:
+    """
+    Распределитель обновлений по процессам-обработчикам.
+
+    Получает обновления через getUpdates без разбора в модели aiogram
+    и передает каждое в процесс по Telegram ID отправителя. Так все
+    обновления пользователя и его состояние FSM живут в одном процессе.
+    """
+
+    def __init__(self, config: Config, workers: int):
+        self.config = config
+        self.workers = workers
+        self.processes: List[multiprocessing.Process] = []
+        self.connections: List[Connection] = []
+        self.queues: List[asyncio.Queue] = []
+
+    def start_workers(self) -> None:
+        """Запуск процессов-обработчиков"""
+        context = multiprocessing.get_context("spawn")
+        for worker_index in range(self.workers):
+            receiver, sender = context.Pipe(duplex=False)
+            process = context.Process(
+                target=_run_worker,
+                args=(worker_index, self.workers, receiver),
+                name=f"bot-worker-{worker_index}",
+                daemon=False
+            )
+            process.start()
+            receiver.close()
+            self.processes.append(process)
+            self.connections.append(sender)
+            self.queues.append(asyncio.Queue(maxsize=WORKER_QUEUE_SIZE))
+        logger.info(f"Запущено процессов-обработчиков: {self.workers}")
+
+    async def _send(self, worker_index: int) -> None:
+        """Передача обновлений в процесс-обработчик"""
+        queue = self.queues[worker_index]
+        conn = self.connections[worker_index]
+        while True:
+            update = await queue.get()
+            # Запись в канал может ждать, пока процесс не разберет предыдущие
+            await asyncio.to_thread(conn.send, update)
+            if update is None:
+                return
+
+    async def _watch_workers(self) -> None:
+        """Остановка распределителя при падении любого процесса"""
+        while True:
+            await asyncio.sleep(1)
+            for process in self.processes:
+                if not process.is_alive():
+                    raise RuntimeError(f"Процесс {process.name} завершился с кодом {process.exitcode}")
+
+    async def _poll(self, session: aiohttp.ClientSession) -> None:
+        """Получение обновлений и распределение по процессам"""
+        url = f"{TELEGRAM_API_URL}/bot{self.config.bot_token}/getUpdates"
+        allowed_updates = json.dumps(_get_allowed_updates())
+        offset: Optional[int] = None
+        while True:
+            params = {'timeout': POLLING_TIMEOUT, 'allowed_updates': allowed_updates}
+            if offset is not None:
+                params['offset'] = offset
+            try:
+                async with session.get(url, params=params) as response:
+                    payload = await response.json()
+                if not payload.get('ok'):
+                    raise RuntimeError(payload.get('description'))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Ошибка получения обновлений: {e}")
+                await asyncio.sleep(POLLING_RETRY_DELAY)
+                continue
+
+            for update in payload['result']:
+                await self.queues[_get_worker_index(update, self.workers)].put(update)
+                # Следующий запрос подтверждает получение всех обновлений до offset
+                offset = update['update_id'] + 1
+
+    async def run(self) -> None:
+        """Работа распределителя до отмены или падения процесса-обработчика"""
+        self.start_workers()
+        senders = [asyncio.create_task(self._send(index)) for index in range(self.workers)]
+        timeout = aiohttp.ClientTimeout(total=POLLING_TIMEOUT + 10)
+        try:
+            async with aiohttp.ClientSession(timeout=timeout) as session:
+                tasks = [
+                    asyncio.create_task(self._poll(session)),
+                    asyncio.create_task(self._watch_workers())
+                ]
+                try:
+                    done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+                    for task in done:
+                        task.result()
+                finally:
+                    for task in tasks:
+                        task.cancel()
+        finally:
+            await self._stop(senders)
+
+    async def _stop(self, senders: List[asyncio.Task]) -> None:
+        """Остановка процессов после передачи уже полученных обновлений"""
+        for queue, process in zip(self.queues, self.processes):
+            if process.is_alive():
+                try:
+                    await asyncio.wait_for(queue.put(None), WORKER_STOP_TIMEOUT)
+                except asyncio.TimeoutError:
+                    logger.warning(f"Процесс {process.name} не принимает обновления")
+        await asyncio.wait(senders, timeout=WORKER_STOP_TIMEOUT)
+        for sender in senders:
+            sender.cancel()
+        for process in self.processes:
+            await asyncio.to_thread(process.join, WORKER_STOP_TIMEOUT)
+            if process.is_alive():
+                logger.warning(f"Процесс {process.name} не остановился, завершаем принудительно")
+                process.terminate()
+        for conn in self.connections:
+            conn.close()
+        logger.info("Процессы-обработчики остановлены")
+
+
+async def run_workers(workers: int) -> None:
+    """Запуск бота в workers процессах"""
+    config = Config.from_env()
+    router = UpdateRouter(config, workers)
+
+    # SIGTERM от docker останавливает распределитель так же, как Ctrl+C
+    task = asyncio.current_task()
+    asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, task.cancel)
+    try:
+        await router.run()
+    except asyncio.CancelledError:
+        logger.info("Распределитель остановлен")
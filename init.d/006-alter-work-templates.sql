@@ -0,0 +1,20 @@
+-- ===============================================
+-- Публичные шаблоны работ
+-- ===============================================
+
+-- Установка схемы
+SET search_path TO estimates_app, public;
+
+-- Флаг публичности используется в выборках шаблонов и в ИИ-подсказках
+ALTER TABLE work_templates ADD COLUMN IF NOT EXISTS is_public BOOLEAN DEFAULT false;
+
+COMMENT ON COLUMN work_templates.is_public IS 'Доступен ли шаблон всем пользователям';
+
+-- Индексы для выборки шаблонов пользователя и публичного каталога
+CREATE INDEX IF NOT EXISTS idx_work_templates_user_id ON work_templates (user_id);
+CREATE INDEX IF NOT EXISTS idx_work_templates_public ON work_templates (is_public) WHERE is_public;
+
+-- Индекс для выборки истории позиций по сметам
+CREATE INDEX IF NOT EXISTS idx_estimate_items_estimate_id ON estimate_items (estimate_id);
+
+\echo 'Публичные шаблоны настроены успешно';
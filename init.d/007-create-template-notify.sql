@@ -0,0 +1,52 @@
+-- ===============================================
+-- Уведомления об изменении публичного каталога шаблонов
+-- ===============================================
+
+-- Установка схемы
+SET search_path TO estimates_app, public;
+
+-- Функция оповещения экземпляров бота через LISTEN/NOTIFY.
+-- Триггеры уровня оператора: массовое обновление шлет одно уведомление
+CREATE OR REPLACE FUNCTION notify_work_templates_changed()
+RETURNS TRIGGER AS $$
+DECLARE
+    public_changed BOOLEAN := false;
+BEGIN
+    -- Личные шаблоны в общий кэш не попадают
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        SELECT EXISTS (SELECT 1 FROM new_rows WHERE is_public) INTO public_changed;
+    END IF;
+    IF NOT public_changed AND TG_OP IN ('UPDATE', 'DELETE') THEN
+        SELECT EXISTS (SELECT 1 FROM old_rows WHERE is_public) INTO public_changed;
+    END IF;
+
+    IF public_changed THEN
+        PERFORM pg_notify('work_templates_changed', TG_OP);
+    END IF;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS work_templates_inserted_notify ON work_templates;
+CREATE TRIGGER work_templates_inserted_notify
+    AFTER INSERT ON work_templates
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT
+    EXECUTE PROCEDURE notify_work_templates_changed();
+
+DROP TRIGGER IF EXISTS work_templates_updated_notify ON work_templates;
+CREATE TRIGGER work_templates_updated_notify
+    AFTER UPDATE ON work_templates
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT
+    EXECUTE PROCEDURE notify_work_templates_changed();
+
+DROP TRIGGER IF EXISTS work_templates_deleted_notify ON work_templates;
+CREATE TRIGGER work_templates_deleted_notify
+    AFTER DELETE ON work_templates
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT
+    EXECUTE PROCEDURE notify_work_templates_changed();
+
+\echo 'Уведомления каталога шаблонов настроены успешно';
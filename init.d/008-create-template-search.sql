@@ -0,0 +1,14 @@
+-- ===============================================
+-- Индексы для поиска шаблонов по мере ввода
+-- ===============================================
+
+-- Установка схемы
+SET search_path TO estimates_app, public;
+
+-- Триграммы для поиска по подстроке и с опечатками
+CREATE EXTENSION IF NOT EXISTS pg_trgm SCHEMA public;
+
+CREATE INDEX IF NOT EXISTS idx_work_templates_name_trgm
+    ON work_templates USING gin (name gin_trgm_ops);
+
+\echo 'Индексы поиска шаблонов созданы успешно';
@@ -0,0 +1,35 @@
+-- ===============================================
+-- Популярность шаблонов с затуханием во времени
+-- ===============================================
+
+-- Установка схемы
+SET search_path TO estimates_app, public;
+
+ALTER TABLE work_templates ADD COLUMN IF NOT EXISTS popularity DOUBLE PRECISION NOT NULL DEFAULT 0;
+ALTER TABLE work_templates ADD COLUMN IF NOT EXISTS popularity_updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP;
+
+COMMENT ON COLUMN work_templates.popularity IS 'Популярность с экспоненциальным затуханием на момент popularity_updated_at';
+COMMENT ON COLUMN work_templates.popularity_updated_at IS 'Момент последнего пересчета популярности';
+
+-- Начальное значение для уже существующих шаблонов
+UPDATE work_templates SET popularity = COALESCE(usage_count, 0) WHERE popularity = 0;
+
+-- Затухание популярности: период полураспада 30 дней
+CREATE OR REPLACE FUNCTION decayed_popularity(
+    score DOUBLE PRECISION,
+    updated_at TIMESTAMP WITH TIME ZONE
+)
+RETURNS DOUBLE PRECISION AS $$
+    SELECT score * exp(
+        -ln(2) * GREATEST(EXTRACT(EPOCH FROM (CURRENT_TIMESTAMP - updated_at)), 0)
+        / EXTRACT(EPOCH FROM INTERVAL '30 days')
+    );
+$$ LANGUAGE sql STABLE;
+
+-- Индексы для чтения заранее ранжированных шаблонов
+CREATE INDEX IF NOT EXISTS idx_work_templates_user_popularity
+    ON work_templates (user_id, popularity DESC, created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_work_templates_public_popularity
+    ON work_templates (popularity DESC, created_at DESC) WHERE is_public;
+
+\echo 'Популярность шаблонов настроена успешно';
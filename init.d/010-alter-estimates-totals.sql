@@ -0,0 +1,32 @@
+-- ===============================================
+-- Итоги смет и порядок позиций
+-- ===============================================
+
+-- Установка схемы
+SET search_path TO estimates_app, public;
+
+-- Итоги хранятся в смете и обновляются при изменении позиций
+ALTER TABLE estimates ADD COLUMN IF NOT EXISTS total_cost DECIMAL(15,2) NOT NULL DEFAULT 0;
+ALTER TABLE estimates ADD COLUMN IF NOT EXISTS total_duration DECIMAL(10,2) NOT NULL DEFAULT 0;
+
+COMMENT ON COLUMN estimates.total_cost IS 'Итоговая стоимость позиций сметы';
+COMMENT ON COLUMN estimates.total_duration IS 'Итоговое время позиций сметы';
+
+UPDATE estimates e
+SET total_cost = t.total_cost,
+    total_duration = t.total_duration
+FROM (
+    SELECT estimate_id, SUM(cost) AS total_cost, SUM(duration) AS total_duration
+    FROM estimate_items
+    GROUP BY estimate_id
+) t
+WHERE t.estimate_id = e.id;
+
+-- Выборка позиций сметы в порядке сортировки
+CREATE INDEX IF NOT EXISTS idx_estimate_items_estimate_sort
+    ON estimate_items (estimate_id, sort_order, created_at);
+
+CREATE INDEX IF NOT EXISTS idx_estimates_user_created
+    ON estimates (user_id, created_at DESC);
+
+\echo 'Итоги смет настроены успешно';
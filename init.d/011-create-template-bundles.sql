@@ -0,0 +1,53 @@
+-- ===============================================
+-- Наборы шаблонов работ
+-- ===============================================
+
+-- Установка схемы
+SET search_path TO estimates_app, public;
+
+-- Именованный набор шаблонов, добавляемый в смету одним действием
+CREATE TABLE IF NOT EXISTS template_bundles (
+    id SERIAL PRIMARY KEY,
+    user_id BIGINT NOT NULL,
+    name VARCHAR(255) NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+
+    -- Ограничения
+    CONSTRAINT template_bundles_name_length CHECK (LENGTH(name) >= 1 AND LENGTH(name) <= 255)
+);
+
+COMMENT ON TABLE template_bundles IS 'Наборы шаблонов работ';
+COMMENT ON COLUMN template_bundles.user_id IS 'ID пользователя-владельца набора';
+
+-- Упорядоченный состав набора
+CREATE TABLE IF NOT EXISTS template_bundle_items (
+    bundle_id INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    template_id INTEGER NOT NULL,
+    quantity DECIMAL(10,2) NOT NULL DEFAULT 1,
+
+    PRIMARY KEY (bundle_id, position),
+
+    -- Внешние ключи
+    FOREIGN KEY (bundle_id) REFERENCES template_bundles (id) ON DELETE CASCADE,
+    FOREIGN KEY (template_id) REFERENCES work_templates (id) ON DELETE CASCADE,
+
+    -- Ограничения
+    CONSTRAINT template_bundle_items_quantity_positive CHECK (quantity > 0)
+);
+
+COMMENT ON TABLE template_bundle_items IS 'Шаблоны в составе набора';
+COMMENT ON COLUMN template_bundle_items.position IS 'Порядок шаблона в наборе';
+COMMENT ON COLUMN template_bundle_items.quantity IS 'Множитель времени и стоимости шаблона';
+
+CREATE INDEX IF NOT EXISTS idx_template_bundles_user_id ON template_bundles (user_id);
+CREATE INDEX IF NOT EXISTS idx_template_bundle_items_template_id ON template_bundle_items (template_id);
+
+DROP TRIGGER IF EXISTS update_template_bundles_updated_at ON template_bundles;
+CREATE TRIGGER update_template_bundles_updated_at
+    BEFORE UPDATE ON template_bundles
+    FOR EACH ROW
+    EXECUTE PROCEDURE update_updated_at_column();
+
+\echo 'Наборы шаблонов созданы успешно';
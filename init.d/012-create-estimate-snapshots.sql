@@ -0,0 +1,30 @@
+-- ===============================================
+-- Версии (снимки) смет
+-- ===============================================
+
+-- Установка схемы
+SET search_path TO estimates_app, public;
+
+-- Снимок сметы: позиции хранятся одним JSONB документом на версию
+CREATE TABLE IF NOT EXISTS estimate_snapshots (
+    id SERIAL PRIMARY KEY,
+    estimate_id INTEGER NOT NULL,
+    version INTEGER NOT NULL,
+    title VARCHAR(255) NOT NULL,
+    total_cost DECIMAL(15,2) NOT NULL DEFAULT 0,
+    total_duration DECIMAL(10,2) NOT NULL DEFAULT 0,
+    items JSONB NOT NULL DEFAULT '[]',
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+
+    -- Внешний ключ
+    FOREIGN KEY (estimate_id) REFERENCES estimates (id) ON DELETE CASCADE,
+
+    -- Ограничения
+    CONSTRAINT estimate_snapshots_version_unique UNIQUE (estimate_id, version)
+);
+
+COMMENT ON TABLE estimate_snapshots IS 'Зафиксированные версии смет';
+COMMENT ON COLUMN estimate_snapshots.version IS 'Номер версии в пределах сметы';
+COMMENT ON COLUMN estimate_snapshots.items IS 'Позиции сметы: [{n: название, h: часы, c: стоимость, q: количество, u: единица}]';
+
+\echo 'Версии смет созданы успешно';
@@ -0,0 +1,154 @@
+-- ===============================================
+-- Сводная статистика пользователей
+-- ===============================================
+
+-- Установка схемы
+SET search_path TO estimates_app, public;
+
+-- Одна строка на пользователя, поддерживается триггерами
+CREATE TABLE IF NOT EXISTS user_stats (
+    user_id BIGINT PRIMARY KEY,
+    estimates_count INTEGER NOT NULL DEFAULT 0,
+    total_cost DECIMAL(15,2) NOT NULL DEFAULT 0,
+    total_duration DECIMAL(10,2) NOT NULL DEFAULT 0,
+    templates_count INTEGER NOT NULL DEFAULT 0,
+    top_templates JSONB NOT NULL DEFAULT '[]'::jsonb,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+COMMENT ON TABLE user_stats IS 'Сводная статистика пользователей для экрана статистики';
+COMMENT ON COLUMN user_stats.estimates_count IS 'Количество смет';
+COMMENT ON COLUMN user_stats.total_cost IS 'Сумма итогов всех смет';
+COMMENT ON COLUMN user_stats.total_duration IS 'Сумма времени всех смет';
+COMMENT ON COLUMN user_stats.templates_count IS 'Количество личных шаблонов';
+COMMENT ON COLUMN user_stats.top_templates IS 'Три самых популярных личных шаблона';
+
+-- Сметы: итоги меняются на разницу старой и новой строки
+CREATE OR REPLACE FUNCTION apply_estimate_stats()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'UPDATE' AND OLD.user_id = NEW.user_id THEN
+        UPDATE user_stats
+        SET total_cost = total_cost + NEW.total_cost - OLD.total_cost,
+            total_duration = total_duration + NEW.total_duration - OLD.total_duration,
+            updated_at = CURRENT_TIMESTAMP
+        WHERE user_id = NEW.user_id;
+        RETURN NULL;
+    END IF;
+
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        UPDATE user_stats
+        SET estimates_count = estimates_count - 1,
+            total_cost = total_cost - OLD.total_cost,
+            total_duration = total_duration - OLD.total_duration,
+            updated_at = CURRENT_TIMESTAMP
+        WHERE user_id = OLD.user_id;
+    END IF;
+
+    IF TG_OP IN ('UPDATE', 'INSERT') THEN
+        INSERT INTO user_stats (user_id, estimates_count, total_cost, total_duration)
+        VALUES (NEW.user_id, 1, NEW.total_cost, NEW.total_duration)
+        ON CONFLICT (user_id) DO UPDATE SET
+            estimates_count = user_stats.estimates_count + 1,
+            total_cost = user_stats.total_cost + EXCLUDED.total_cost,
+            total_duration = user_stats.total_duration + EXCLUDED.total_duration,
+            updated_at = CURRENT_TIMESTAMP;
+    END IF;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS estimates_stats_changed ON estimates;
+CREATE TRIGGER estimates_stats_changed
+    AFTER INSERT OR DELETE ON estimates
+    FOR EACH ROW
+    EXECUTE PROCEDURE apply_estimate_stats();
+
+DROP TRIGGER IF EXISTS estimates_stats_updated ON estimates;
+CREATE TRIGGER estimates_stats_updated
+    AFTER UPDATE OF user_id, total_cost, total_duration ON estimates
+    FOR EACH ROW
+    WHEN (OLD.user_id IS DISTINCT FROM NEW.user_id
+          OR OLD.total_cost IS DISTINCT FROM NEW.total_cost
+          OR OLD.total_duration IS DISTINCT FROM NEW.total_duration)
+    EXECUTE PROCEDURE apply_estimate_stats();
+
+-- Шаблоны: количество и топ пересчитываются для переданных пользователей
+-- по индексу (user_id, popularity)
+CREATE OR REPLACE FUNCTION refresh_template_stats(user_ids BIGINT[])
+RETURNS VOID AS $$
+    INSERT INTO user_stats (user_id, templates_count, top_templates)
+    SELECT u.user_id,
+           (
+               SELECT COUNT(*) FROM work_templates t
+               WHERE t.user_id = u.user_id AND t.is_public IS NOT TRUE
+           ),
+           COALESCE((
+               SELECT jsonb_agg(jsonb_build_object(
+                          'id', top.id,
+                          'name', top.name,
+                          'usage_count', top.usage_count,
+                          'popularity', top.popularity,
+                          'created_at', top.created_at
+                      ) ORDER BY top.popularity DESC, top.created_at DESC)
+               FROM (
+                   SELECT t.id, t.name, t.usage_count, t.popularity, t.created_at
+                   FROM work_templates t
+                   WHERE t.user_id = u.user_id AND t.is_public IS NOT TRUE
+                   ORDER BY t.popularity DESC, t.created_at DESC
+                   LIMIT 3
+               ) top
+           ), '[]'::jsonb)
+    FROM (SELECT DISTINCT unnest(user_ids) AS user_id) u
+    -- Единый порядок блокировок строк статистики между параллельными операторами
+    ORDER BY u.user_id
+    ON CONFLICT (user_id) DO UPDATE SET
+        templates_count = EXCLUDED.templates_count,
+        top_templates = EXCLUDED.top_templates,
+        updated_at = CURRENT_TIMESTAMP;
+$$ LANGUAGE sql;
+
+-- Пересчет выполняется один раз на оператор, а не на каждую строку
+CREATE OR REPLACE FUNCTION refresh_user_template_stats()
+RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM refresh_template_stats(ARRAY(SELECT DISTINCT user_id FROM changed_rows));
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS work_templates_stats_inserted ON work_templates;
+CREATE TRIGGER work_templates_stats_inserted
+    AFTER INSERT ON work_templates
+    REFERENCING NEW TABLE AS changed_rows
+    FOR EACH STATEMENT
+    EXECUTE PROCEDURE refresh_user_template_stats();
+
+DROP TRIGGER IF EXISTS work_templates_stats_updated ON work_templates;
+CREATE TRIGGER work_templates_stats_updated
+    AFTER UPDATE ON work_templates
+    REFERENCING NEW TABLE AS changed_rows
+    FOR EACH STATEMENT
+    EXECUTE PROCEDURE refresh_user_template_stats();
+
+DROP TRIGGER IF EXISTS work_templates_stats_deleted ON work_templates;
+CREATE TRIGGER work_templates_stats_deleted
+    AFTER DELETE ON work_templates
+    REFERENCING OLD TABLE AS changed_rows
+    FOR EACH STATEMENT
+    EXECUTE PROCEDURE refresh_user_template_stats();
+
+-- Начальное заполнение по уже существующим данным
+INSERT INTO user_stats (user_id, estimates_count, total_cost, total_duration)
+SELECT user_id, COUNT(*), SUM(total_cost), SUM(total_duration)
+FROM estimates
+GROUP BY user_id
+ON CONFLICT (user_id) DO UPDATE SET
+    estimates_count = EXCLUDED.estimates_count,
+    total_cost = EXCLUDED.total_cost,
+    total_duration = EXCLUDED.total_duration;
+
+SELECT refresh_template_stats(ARRAY(SELECT DISTINCT user_id FROM work_templates));
+
+\echo 'Сводная статистика пользователей настроена успешно';
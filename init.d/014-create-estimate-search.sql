@@ -0,0 +1,40 @@
+-- ===============================================
+-- Полнотекстовый и триграммный поиск по сметам
+-- ===============================================
+
+-- Установка схемы
+SET search_path TO estimates_app, public;
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm SCHEMA public;
+
+-- Слова названия весят больше слов описания; латиница разбирается английским стеммером
+ALTER TABLE estimates ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('russian', COALESCE(title, '')), 'A') ||
+        setweight(to_tsvector('russian', COALESCE(description, '')), 'B')
+    ) STORED;
+
+ALTER TABLE estimate_items ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (to_tsvector('russian', COALESCE(name, ''))) STORED;
+
+COMMENT ON COLUMN estimates.search_vector IS 'Поисковый вектор названия и описания сметы';
+COMMENT ON COLUMN estimate_items.search_vector IS 'Поисковый вектор названия позиции';
+
+-- Поиск по словам
+CREATE INDEX IF NOT EXISTS idx_estimates_search_vector
+    ON estimates USING gin (search_vector);
+CREATE INDEX IF NOT EXISTS idx_estimate_items_search_vector
+    ON estimate_items USING gin (search_vector);
+
+-- Поиск по подстроке
+CREATE INDEX IF NOT EXISTS idx_estimates_title_trgm
+    ON estimates USING gin (title gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_estimates_description_trgm
+    ON estimates USING gin (description gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_estimate_items_name_trgm
+    ON estimate_items USING gin (name gin_trgm_ops);
+
+-- Функция с ILIKE без индекса заменена поиском Database.search_estimates
+DROP FUNCTION IF EXISTS search_user_estimates(BIGINT, TEXT, VARCHAR, INTEGER, INTEGER);
+
+\echo 'Поиск по сметам настроен успешно';
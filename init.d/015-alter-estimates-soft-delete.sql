@@ -0,0 +1,72 @@
+-- ===============================================
+-- Мягкое удаление смет
+-- ===============================================
+
+-- Установка схемы
+SET search_path TO estimates_app, public;
+
+-- Удаление только помечает смету, строки удаляются фоновой очисткой
+ALTER TABLE estimates ADD COLUMN IF NOT EXISTS deleted_at TIMESTAMP WITH TIME ZONE;
+
+COMMENT ON COLUMN estimates.deleted_at IS 'Время удаления сметы; NULL - смета не удалена';
+
+-- Списки смет читают только неудаленные строки
+DROP INDEX IF EXISTS idx_estimates_user_created;
+CREATE INDEX IF NOT EXISTS idx_estimates_user_created
+    ON estimates (user_id, created_at DESC)
+    WHERE deleted_at IS NULL;
+
+-- Очистка находит удаленные сметы, не просматривая всю таблицу
+CREATE INDEX IF NOT EXISTS idx_estimates_deleted_at
+    ON estimates (deleted_at)
+    WHERE deleted_at IS NOT NULL;
+
+-- Статистика учитывает только неудаленные сметы: пометка удаления вычитает
+-- смету, восстановление - добавляет обратно, очистка статистику не меняет
+CREATE OR REPLACE FUNCTION apply_estimate_stats()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'UPDATE' AND OLD.user_id = NEW.user_id
+       AND OLD.deleted_at IS NULL AND NEW.deleted_at IS NULL THEN
+        UPDATE user_stats
+        SET total_cost = total_cost + NEW.total_cost - OLD.total_cost,
+            total_duration = total_duration + NEW.total_duration - OLD.total_duration,
+            updated_at = CURRENT_TIMESTAMP
+        WHERE user_id = NEW.user_id;
+        RETURN NULL;
+    END IF;
+
+    IF TG_OP IN ('UPDATE', 'DELETE') AND OLD.deleted_at IS NULL THEN
+        UPDATE user_stats
+        SET estimates_count = estimates_count - 1,
+            total_cost = total_cost - OLD.total_cost,
+            total_duration = total_duration - OLD.total_duration,
+            updated_at = CURRENT_TIMESTAMP
+        WHERE user_id = OLD.user_id;
+    END IF;
+
+    IF TG_OP IN ('UPDATE', 'INSERT') AND NEW.deleted_at IS NULL THEN
+        INSERT INTO user_stats (user_id, estimates_count, total_cost, total_duration)
+        VALUES (NEW.user_id, 1, NEW.total_cost, NEW.total_duration)
+        ON CONFLICT (user_id) DO UPDATE SET
+            estimates_count = user_stats.estimates_count + 1,
+            total_cost = user_stats.total_cost + EXCLUDED.total_cost,
+            total_duration = user_stats.total_duration + EXCLUDED.total_duration,
+            updated_at = CURRENT_TIMESTAMP;
+    END IF;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS estimates_stats_updated ON estimates;
+CREATE TRIGGER estimates_stats_updated
+    AFTER UPDATE OF user_id, total_cost, total_duration, deleted_at ON estimates
+    FOR EACH ROW
+    WHEN (OLD.user_id IS DISTINCT FROM NEW.user_id
+          OR OLD.total_cost IS DISTINCT FROM NEW.total_cost
+          OR OLD.total_duration IS DISTINCT FROM NEW.total_duration
+          OR OLD.deleted_at IS DISTINCT FROM NEW.deleted_at)
+    EXECUTE PROCEDURE apply_estimate_stats();
+
+\echo 'Мягкое удаление смет настроено успешно';
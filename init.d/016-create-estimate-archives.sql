@@ -0,0 +1,32 @@
+-- ===============================================
+-- Архив давно не изменявшихся смет
+-- ===============================================
+
+-- Установка схемы
+SET search_path TO estimates_app, public;
+
+-- Смета в архиве остается в estimates со статусом archived и итогами,
+-- а ее позиции хранятся здесь одним сжатым JSONB документом
+CREATE TABLE IF NOT EXISTS estimate_archives (
+    estimate_id INTEGER PRIMARY KEY,
+    status VARCHAR(50) NOT NULL,
+    items JSONB COMPRESSION lz4 NOT NULL DEFAULT '[]',
+    archived_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+
+    -- Внешний ключ
+    FOREIGN KEY (estimate_id) REFERENCES estimates (id) ON DELETE CASCADE
+);
+
+-- Документ позиций почти всегда больше порога TOAST и сжимается
+ALTER TABLE estimate_archives SET (toast_tuple_target = 256);
+
+COMMENT ON TABLE estimate_archives IS 'Позиции архивных смет';
+COMMENT ON COLUMN estimate_archives.status IS 'Статус сметы до архивации';
+COMMENT ON COLUMN estimate_archives.items IS 'Позиции сметы: [{n: название, d: описание, h: часы, c: стоимость, q: количество, u: единица}]';
+
+-- Поиск кандидатов в архив среди рабочих смет
+CREATE INDEX IF NOT EXISTS idx_estimates_updated_live
+    ON estimates (updated_at)
+    WHERE deleted_at IS NULL AND status <> 'archived';
+
+\echo 'Архив смет создан успешно';
@@ -0,0 +1,14 @@
+-- ===============================================
+-- Версия строки сметы для оптимистичной блокировки
+-- ===============================================
+
+-- Установка схемы
+SET search_path TO estimates_app, public;
+
+-- Каждая запись в смету увеличивает версию; пересчет итогов применяется,
+-- только если версия не изменилась с момента чтения
+ALTER TABLE estimates ADD COLUMN IF NOT EXISTS version INTEGER NOT NULL DEFAULT 0;
+
+COMMENT ON COLUMN estimates.version IS 'Счетчик изменений сметы для сравнения с обменом';
+
+\echo 'Версии строк смет настроены успешно';
@@ -0,0 +1,59 @@
+-- ===============================================
+-- Фоновое затухание популярности без побочных триггеров
+-- ===============================================
+
+-- Установка схемы
+SET search_path TO estimates_app, public;
+
+-- Фоновое затухание выставляет estimates_app.popularity_decay = 'on' в своей
+-- транзакции. Затухание только приводит популярность к текущему моменту
+-- и почти не меняет порядок шаблонов, поэтому оповещать кэши и пересчитывать
+-- топ статистики для него не нужно
+CREATE OR REPLACE FUNCTION is_popularity_decay()
+RETURNS BOOLEAN AS $$
+    SELECT COALESCE(current_setting('estimates_app.popularity_decay', true), '') = 'on';
+$$ LANGUAGE sql STABLE;
+
+CREATE OR REPLACE FUNCTION notify_work_templates_changed()
+RETURNS TRIGGER AS $$
+DECLARE
+    public_changed BOOLEAN := false;
+BEGIN
+    IF is_popularity_decay() THEN
+        RETURN NULL;
+    END IF;
+
+    -- Личные шаблоны в общий кэш не попадают
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        SELECT EXISTS (SELECT 1 FROM new_rows WHERE is_public) INTO public_changed;
+    END IF;
+    IF NOT public_changed AND TG_OP IN ('UPDATE', 'DELETE') THEN
+        SELECT EXISTS (SELECT 1 FROM old_rows WHERE is_public) INTO public_changed;
+    END IF;
+
+    IF public_changed THEN
+        PERFORM pg_notify('work_templates_changed', TG_OP);
+    END IF;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION refresh_user_template_stats()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF is_popularity_decay() THEN
+        RETURN NULL;
+    END IF;
+
+    PERFORM refresh_template_stats(ARRAY(SELECT DISTINCT user_id FROM changed_rows));
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Кандидаты на затухание: шаблоны с ненулевой популярностью по давности пересчета
+CREATE INDEX IF NOT EXISTS idx_work_templates_popularity_decay
+    ON work_templates (popularity_updated_at)
+    WHERE popularity > 0;
+
+\echo 'Затухание популярности шаблонов настроено успешно';
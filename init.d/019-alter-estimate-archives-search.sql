@@ -0,0 +1,29 @@
+-- ===============================================
+-- Поиск по позициям архивных смет
+-- ===============================================
+
+-- Установка схемы
+SET search_path TO estimates_app, public;
+
+-- Позиции архивной сметы лежат в JSONB, а не в estimate_items, поэтому
+-- поиск по ним идет по названиям позиций, собранным из документа
+ALTER TABLE estimate_archives ADD COLUMN IF NOT EXISTS item_names TEXT
+    GENERATED ALWAYS AS (jsonb_path_query_array(items, '$[*].n')::text) STORED;
+
+ALTER TABLE estimate_archives ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (
+        jsonb_to_tsvector('russian', jsonb_path_query_array(items, '$[*].n'), '["string"]')
+    ) STORED;
+
+COMMENT ON COLUMN estimate_archives.item_names IS 'Названия позиций архивной сметы для поиска по подстроке';
+COMMENT ON COLUMN estimate_archives.search_vector IS 'Поисковый вектор названий позиций архивной сметы';
+
+-- Поиск по словам
+CREATE INDEX IF NOT EXISTS idx_estimate_archives_search_vector
+    ON estimate_archives USING gin (search_vector);
+
+-- Поиск по подстроке
+CREATE INDEX IF NOT EXISTS idx_estimate_archives_item_names_trgm
+    ON estimate_archives USING gin (item_names gin_trgm_ops);
+
+\echo 'Поиск по архивным сметам настроен успешно';